@@ -1,19 +1,27 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Form, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import mysql.connector
 import json
 import os
 from datetime import datetime, timedelta
-import uuid
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import atexit
+from compression import CompressionMiddleware
+import metrics
+import request_log
+from metrics import MetricsMiddleware, ORJSONResponse
+import profiler
+from profiler import ProfilerMiddleware
+from ingest import UploadLimitMiddleware
 
 # Initialize app
-app = FastAPI(title="Lost&Found API")
+app = FastAPI(title="Lost&Found API", default_response_class=ORJSONResponse)
+
+# Innermost: cap upload request bodies before multipart parsing spools them
+app.add_middleware(UploadLimitMiddleware, paths=r"/upload|/upload-profile-image|/users/[^/]+/profile-image")
 
 # CORS setup
 app.add_middleware(
@@ -24,8 +32,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for large JSON bodies
+app.add_middleware(CompressionMiddleware)
+
+# Per-request query counts, N+1 shapes and slow-query plans (QUERY_PROFILER=1)
+if profiler.ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+# Outermost: latency, status and bytes on the wire for /metrics, plus the sampled request log
+app.add_middleware(MetricsMiddleware)
+
 # Import database functions
-from database import get_db, init_database
+from database import db_connection, connection, transaction, savepoint, get_pool, pool_stats, DB_BACKEND, DB_ERRORS, POOL_WARM
+from migrations import check_schema
+from loaders import (attach_authors, attach_images, columns, load_post, load_post_etag, load_srcsets, load_user_card,
+                     load_user_etag, FEED_AUTHOR_COLUMNS, POST_SUMMARY_COLUMNS)
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, page
+from search_index import search_index, index_writes, INDEX_QUERY, INDEX_POST_QUERY, INDEX_POSTS_QUERY, AUTHORS_QUERY
+from facets import facet_index, bucket_range, DATE_BUCKETS, PLACES_QUERY
+from matching import match_engine, MAX_MATCHES
+from cache import feed_cache, feed_key, post_details, session_cache, user_cards
+from etags import etag_matches, feed_etag, make_etag, not_modified, set_etag
+import assets
+import blobs
+import changes
+import images
+import passwords
+import places
+import sessions
+import writers
+from sessions import current_student, require_self
+from feed_events import feed_hub, HubFull
+from expiry import expiry_engine, INTERVAL_MINUTES as EXPIRY_INTERVAL_MINUTES
+from ingest import UploadRejected
 
 # Create necessary directories
 os.makedirs("uploads", exist_ok=True)
@@ -34,8 +73,13 @@ os.makedirs("static", exist_ok=True)
 # Mount static files - serve uploaded images
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
-# Mount static files - serve frontend HTML files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Frontend files are served from the fingerprinted, precompressed manifest built at startup
+@app.get("/static/{path:path}")
+async def serve_static(path: str, request: Request):
+    asset = assets.manifest.assets.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return assets.respond(asset, request)
 
 # Data models
 class SocialLink(BaseModel):
@@ -81,156 +125,332 @@ class PostUpdate(BaseModel):
     place: Optional[str] = None
     images: Optional[List[str]] = None
 
-# Initialize database on startup
+# Schema version seen by this process; /api/status is not ready until it is current
+schema_state = {"current": None, "latest": None}
+
+def refresh_schema_state():
+    with db_connection() as db:
+        schema_state["current"], schema_state["latest"] = check_schema(db)
+    if schema_state["current"] != schema_state["latest"]:
+        print(f"⚠️ Database schema is at version {schema_state['current']}, this build expects "
+              f"{schema_state['latest']}: run `python migrations.py`")
+
+# Startup only warms the pool and checks the schema version; DDL lives in migrations.py
 @app.on_event("startup")
 def startup():
-    init_database()
-    check_and_update_expired_posts()
+    assets.manifest.build()
+    try:
+        get_pool().warm(POOL_WARM)
+        refresh_schema_state()
+    except DB_ERRORS as err:
+        # Stay up and report not-ready; the probe retries the database on every call
+        print(f"Database unavailable at startup: {err}")
 
     # --- Start background scheduler ---
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(check_and_update_expired_posts, 'interval', hours=24)  # every 24 hours
+    # Coroutine jobs run on the event loop, plain functions in its thread pool
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(build_search_index, next_run_time=datetime.now())  # initial build, off the startup path
+    scheduler.add_job(expiry_engine.run, 'interval', minutes=EXPIRY_INTERVAL_MINUTES,
+                      next_run_time=datetime.now(), max_instances=1, coalesce=True)  # first run right away
+    scheduler.add_job(get_pool().report_leaks, 'interval', minutes=1)  # warn about unreturned connections
+    scheduler.add_job(build_search_index, 'interval', minutes=30)  # pick up changes made by other workers
+    scheduler.add_job(collect_upload_garbage, 'interval', hours=6)  # delete uploads nothing references
+    scheduler.add_job(sessions.purge_expired, 'interval', hours=1)  # drop expired login sessions
     scheduler.start()
 
     # Shut down the scheduler when exiting the app
     atexit.register(lambda: scheduler.shutdown())
+    atexit.register(images.shutdown)
+    atexit.register(lambda: get_pool().close_all())
 
 
-def check_and_update_expired_posts():
-    """Check for expired posts and update their status"""
-    db = get_db()
-    
-    if db is None:
-        print("❌ Could not connect to the database. Skipping expired posts update.")
-        return
+def collect_upload_garbage():
+    """Recount blob references and delete files that have been unreferenced past the grace period"""
+    try:
+        with db_connection() as db:
+            cursor = db.cursor(dictionary=True)
+            try:
+                doomed = blobs.collect_garbage(cursor)
+                # Before the commit, while the blob rows are still locked (see collect_garbage)
+                blobs.remove_files(doomed)
+                db.commit()
+            finally:
+                cursor.close()
+        if doomed:
+            print(f"🧹 Removed {len(doomed)} unreferenced upload files")
+    except DB_ERRORS as err:
+        print(f"Error collecting upload garbage: {err}")
 
-    cursor = db.cursor()
-    
+def build_search_index():
+    """Load every active post and author into the in-process search index, facet counts and matcher"""
+    # Writes from here on are replayed after the swap: the snapshot may predate them
+    index_writes.start()
     try:
-        cursor.execute('''
-            UPDATE posts 
-            SET item_status = 'expired' 
-            WHERE expires_at < CURRENT_TIMESTAMP 
-            AND item_status IN ('lost', 'found')
-        ''')
-        
-        db.commit()
-        expired_count = cursor.rowcount
-        if expired_count > 0:
-            print(f"✅ Marked {expired_count} posts as expired")
-        else:
-            print("ℹ️ No expired posts to update")
-            
-    except mysql.connector.Error as err:
-        print(f"Error updating expired posts: {err}")
+        with db_connection() as db:
+            cursor = db.cursor(dictionary=True)
+            try:
+                cursor.execute(AUTHORS_QUERY)
+                authors = cursor.fetchall()
+                cursor.execute(INDEX_QUERY)
+                posts = cursor.fetchall()
+                cursor.execute(PLACES_QUERY)
+                place_names = cursor.fetchall()
+            finally:
+                cursor.close()
+        search_index.rebuild(posts, authors)
+        facet_index.rebuild(posts, authors, place_names)
+        # Only new and changed posts are queued for matching, which runs in its own thread
+        match_engine.sync(posts)
+
+        replayed = 0
+        while True:
+            post_ids, student_ids = index_writes.take()
+            if not post_ids and not student_ids:
+                break
+            replay_index_writes(post_ids, student_ids)
+            replayed += len(post_ids)
+        print(f"✅ Search index and facet counts built with {len(search_index)} active posts"
+              f" ({replayed} written during the rebuild re-read)")
+    except DB_ERRORS as err:
+        print(f"Error building search index: {err}")
     finally:
-        cursor.close()
-        db.close()
+        index_writes.stop()
+
+def replay_index_writes(post_ids, student_ids):
+    """Re-read posts and authors written since a rebuild's snapshot into the swapped-in indexes"""
+    with db_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        try:
+            rows, authors, place_names = [], [], []
+            if post_ids:
+                cursor.execute(INDEX_POSTS_QUERY.format(", ".join(["%s"] * len(post_ids))), list(post_ids))
+                rows = cursor.fetchall()
+            student_ids = set(student_ids) | {row['student_id'] for row in rows}
+            if student_ids:
+                cursor.execute(f"{AUTHORS_QUERY} WHERE student_id IN ({', '.join(['%s'] * len(student_ids))})",
+                               list(student_ids))
+                authors = cursor.fetchall()
+            place_ids = {row['place_id'] for row in rows if row['place_id'] is not None}
+            if place_ids:
+                cursor.execute(f"{PLACES_QUERY} WHERE place_id IN ({', '.join(['%s'] * len(place_ids))})",
+                               list(place_ids))
+                place_names = cursor.fetchall()
+        finally:
+            cursor.close()
+
+    for author in authors:
+        search_index.set_author(author['student_id'], author['full_name'])
+        facet_index.set_author(author['student_id'], author['faculty'])
+    for place in place_names:
+        facet_index.set_place(place['place_id'], place['name'])
+    active = {row['post_id']: row for row in rows}
+    for post_id in post_ids:
+        row = active.get(post_id)
+        if row is None:
+            # Deleted, expired or no longer lost/found
+            search_index.remove_post(post_id)
+            facet_index.remove_post(post_id)
+            match_engine.remove_post(post_id)
+            continue
+        search_index.add_post(post_id, row['student_id'], row['item_name'],
+                              row['description'], row['item_status'], row['expires_at'])
+        facet_index.add_post(post_id, row['student_id'], row['item_status'], row['place_id'], row['created_at'])
+        match_engine.add_post(post_id, row)
+
+async def reindex_post(db, post_id):
+    """Refresh one post's search index entry, facet counts and match suggestions from the database"""
+    index_writes.post(post_id)
+    row = await db.fetch_one(INDEX_POST_QUERY, (post_id,))
+    if row is None:
+        search_index.remove_post(post_id)
+        facet_index.remove_post(post_id)
+        match_engine.remove_post(post_id)
+        return
+    if not search_index.has_author(row['student_id']) or not facet_index.has_author(row['student_id']):
+        author = await db.fetch_one("SELECT full_name, faculty FROM users WHERE student_id = %s",
+                                    (row['student_id'],))
+        search_index.set_author(row['student_id'], author['full_name'] if author else "")
+        facet_index.set_author(row['student_id'], author['faculty'] if author else None)
+    if row['place_id'] is not None and not facet_index.has_place(row['place_id']):
+        place = await db.fetch_one("SELECT name FROM places WHERE place_id = %s", (row['place_id'],))
+        facet_index.set_place(row['place_id'], place['name'] if place else None)
+    search_index.add_post(row['post_id'], row['student_id'], row['item_name'],
+                          row['description'], row['item_status'], row['expires_at'])
+    facet_index.add_post(row['post_id'], row['student_id'], row['item_status'], row['place_id'],
+                         row['created_at'])
+    # Queued: candidates are scored off the request path
+    match_engine.add_post(row['post_id'], row)
 
 # ========== AUTHENTICATION ROUTES ==========
 @app.get("/api/status")
 def api_status():
-    return {"status": "active", "service": "Lost&Found API", "database": "MySQL"}
+    """Readiness probe: 200 once the database answers, the schema is current and search is loaded"""
+    checks = {"database": False, "schema": False, "search_index": search_index.built_at is not None}
+    try:
+        with db_connection() as db:
+            db.ping(reconnect=False)
+        checks["database"] = True
+        if schema_state["current"] is None or schema_state["current"] != schema_state["latest"]:
+            refresh_schema_state()
+        checks["schema"] = schema_state["current"] == schema_state["latest"]
+    except DB_ERRORS:
+        pass
+    
+    ready = all(checks.values())
+    return ORJSONResponse({
+        "status": "active" if ready else "starting",
+        "service": "Lost&Found API",
+        "database": "SQLite" if DB_BACKEND == "sqlite" else "MySQL",
+        "ready": ready,
+        "checks": checks,
+        "schema_version": schema_state,
+    }, status_code=200 if ready else 503)
+
+@app.get("/api/db/pool")
+def api_pool_stats():
+    """Connection pool statistics for monitoring"""
+    return pool_stats()
+
+@app.get("/api/expiry/stats")
+def api_expiry_stats():
+    """Metrics of the last expiry/purge run and running totals"""
+    return expiry_engine.stats()
+
+@app.get("/api/stream/stats")
+def api_stream_stats():
+    """Live feed subscribers and event counters for this worker"""
+    return feed_hub.stats()
+
+@app.get("/api/cache/stats")
+def api_cache_stats():
+    """Hit/miss counters for the in-process caches"""
+    return {
+        "feed": feed_cache.stats(),
+        "user_cards": user_cards.stats(),
+        "post_details": post_details.stats(),
+        "sessions": session_cache.stats()
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Request, database and upload metrics plus the stats above, in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/debug/queries")
+def api_debug_queries(request: Request, flagged: bool = False):
+    """Recent per-request query profiles (newest first); needs QUERY_PROFILER_TOKEN"""
+    if not profiler.ENABLED:
+        raise HTTPException(status_code=404, detail="Query profiler is off (set QUERY_PROFILER=1)")
+    if not profiler.authorized(request.headers.get("x-profiler-token")):
+        raise HTTPException(status_code=403, detail="Missing or wrong X-Profiler-Token")
+    return {"settings": profiler.settings(), "requests": profiler.recent(flagged)}
+
+metrics.stats_collector("lostfound_db_pool", "Connection pool", pool_stats)
+metrics.stats_collector("lostfound_cache", "In-process cache", api_cache_stats, label="cache")
+metrics.stats_collector("lostfound_stream", "Live feed hub", feed_hub.stats)
+metrics.stats_collector("lostfound_expiry", "Expiry engine running totals", lambda: expiry_engine.totals)
+metrics.stats_collector("lostfound_matching", "Lost/found match engine", match_engine.stats)
+
+async def get_user_card(student_id):
+    """(contact card, etag) for a user, shared by login, profile and post detail; None if missing"""
+    async def load():
+        async with connection() as db:
+            return await load_user_card(db, student_id)
+    return await user_cards.get_or_load(student_id, load)
+
+async def get_post_detail(post_id):
+    """(post row with its images, etag), without author details; None if missing"""
+    async def load():
+        async with connection() as db:
+            return await load_post(db, post_id)
+    return await post_details.get_or_load(post_id, load)
 
 @app.get("/")
-async def serve_index():
+async def serve_index(request: Request):
     """Serve the main application HTML file"""
-    return FileResponse("static/index.html")
+    return assets.respond(assets.manifest.pages["index.html"], request)
 
 @app.get("/signin")
-async def serve_signin():
+async def serve_signin(request: Request):
     """Serve the signin page"""
-    return FileResponse("static/signin.html")
+    return assets.respond(assets.manifest.pages["signin.html"], request)
 
 @app.get("/signup")
-async def serve_signup():
+async def serve_signup(request: Request):
     """Serve the signup page"""
-    return FileResponse("static/signup.html")
+    return assets.respond(assets.manifest.pages["signup.html"], request)
 
 @app.get("/profile")
-async def serve_profile():
+async def serve_profile(request: Request):
     """Serve the profile page"""
-    return FileResponse("static/profile.html")
+    return assets.respond(assets.manifest.pages["profile.html"], request)
 
 @app.get("/item_details")
-async def serve_item_details():
+async def serve_item_details(request: Request):
     """Serve the item details page"""
-    return FileResponse("static/item_details.html")
+    return assets.respond(assets.manifest.pages["item_details.html"], request)
 
 @app.get("/edit_post")
-async def serve_edit_post():
+async def serve_edit_post(request: Request):
     """Serve the edit post page"""
-    return FileResponse("static/edit_post.html")
+    return assets.respond(assets.manifest.pages["edit_post.html"], request)
 
 @app.get("/post_created")
-async def serve_post_created():
+async def serve_post_created(request: Request):
     """Serve the post created page"""
-    return FileResponse("static/post_created.html")
+    return assets.respond(assets.manifest.pages["post_created.html"], request)
 
 @app.post("/auth/register")
 async def register_user(user: UserCreate):
     if user.password != user.confirm_password:
         raise HTTPException(status_code=400, detail="Password confirmation does not match")
     
-    # ✅ DEBUGGING ADDED HERE
-    print("🟡 REGISTER DEBUG ==================================")
-    print("🔗 Social profiles received:", user.social_profiles)
-    print("📦 Full user data:", user.dict())
-    print("🟡 END DEBUG ======================================")
-    
-    db = get_db()
-    cursor = db.cursor()
+    # Hashed in the password worker pool, before a connection is checked out
+    password_hash = await passwords.hash_password(user.password)
     
     try:
-        # Check if email already exists
-        cursor.execute("SELECT student_id FROM users WHERE email = %s", (user.email,))
-        if cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Email address already registered")
-        
-        # Insert user
-        cursor.execute('''
-            INSERT INTO users (full_name, faculty, class_year, phone, email, password, profile_photo_url)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ''', (
-            user.full_name,
-            user.faculty,
-            user.class_year,
-            user.phone,
-            user.email,
-            user.password,
-            "/static/pic/profile.png"
-        ))
-        
-        student_id = cursor.lastrowid
-        
-        # ✅ REPLACED SOCIAL PROFILES SECTION WITH DEBUG VERSION
-        if user.social_profiles:
-            print(f"🟡 Inserting {len(user.social_profiles)} social profiles...")
-            for i, social in enumerate(user.social_profiles):
-                try:
-                    print(f"🟡 Inserting social profile {i+1}: {social.platform} - {social.profile_url}")
-                    
-                    cursor.execute('''
-                        INSERT INTO social_profiles (platform, profile_url)
-                        VALUES (%s, %s)
-                    ''', (social.platform, social.profile_url))
-                    
-                    contact_id = cursor.lastrowid
-                    print(f"✅ Social profile inserted with contact_id: {contact_id}")
-                    
-                    cursor.execute('''
-                        INSERT INTO user_social_profiles (student_id, contact_id)
-                        VALUES (%s, %s)
-                    ''', (student_id, contact_id))
-                    print(f"✅ Linked to user {student_id}")
-                    
-                except mysql.connector.Error as err:
-                    print(f"❌ ERROR inserting social profile: {err}")
-                    print(f"❌ Failed data - Platform: '{social.platform}', URL: '{social.profile_url}'")
-                    continue
-
-        print(f"✅ Completed social profiles insertion")
-        db.commit()
+        async with transaction() as db:
+            # Check if email already exists
+            if await db.fetch_one("SELECT student_id FROM users WHERE email = %s", (user.email,)):
+                raise HTTPException(status_code=400, detail="Email address already registered")
+            
+            # Insert user; only the salted hash of the password is stored
+            result = await db.execute('''
+                INSERT INTO users (full_name, faculty, class_year, phone, email, password, profile_photo_url)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ''', (
+                user.full_name,
+                user.faculty,
+                user.class_year,
+                user.phone,
+                user.email,
+                password_hash,
+                "/static/pic/profile.png"
+            ))
+            
+            student_id = result.lastrowid
+            
+            # All social profiles in one multi-row insert per table. Bad links do not fail the
+            # registration: if the batch fails, none of it is kept and each link is tried on its own,
+            # so only the bad ones are lost
+            links = [(social.platform, social.profile_url) for social in user.social_profiles]
+            try:
+                async with savepoint(db, "social_profiles"):
+                    await writers.insert_social_profiles(db, [(student_id, links)])
+            except DB_ERRORS:
+                for platform, profile_url in links:
+                    try:
+                        async with savepoint(db, "social_profile"):
+                            await writers.insert_social_profiles(db, [(student_id, [(platform, profile_url)])])
+                    except DB_ERRORS as err:
+                        request_log.event("register.social_profile_failed", student_id=student_id,
+                                          platform=platform, error=str(err))
+        
+        index_writes.author(student_id)
+        search_index.set_author(student_id, user.full_name)
+        facet_index.set_author(student_id, user.faculty)
+        if request_log.sampled():
+            request_log.event("register", student_id=student_id, social_profiles=len(user.social_profiles))
         
         return {
             "success": True, 
@@ -239,203 +459,176 @@ async def register_user(user: UserCreate):
             "user_email": user.email
         }
         
-    except mysql.connector.Error as err:
-        db.rollback()
+    except DB_ERRORS as err:
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        db.close()
+
 @app.post("/auth/login")
-async def login_user(credentials: UserLogin):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
+async def login_user(credentials: UserLogin, response: Response):
+    async with connection() as db:
+        match = await db.fetch_one(
+            "SELECT student_id, password FROM users WHERE email = %s", (credentials.email,)
+        )
     
-    try:
-        cursor.execute('''
-            SELECT student_id, full_name, email, faculty, class_year, phone, profile_photo_url
-            FROM users WHERE email = %s AND password = %s
-        ''', (credentials.email, credentials.password))
-        
-        user = cursor.fetchone()
-        
-        if user:
-            # Get social profiles
-            cursor.execute('''
-                SELECT sp.platform, sp.profile_url
-                FROM social_profiles sp
-                JOIN user_social_profiles usp ON sp.contact_id = usp.contact_id
-                WHERE usp.student_id = %s
-            ''', (user['student_id'],))
-            
-            social_profiles = cursor.fetchall()
-            
-            return {
-                "success": True,
-                "message": "Login successful",
-                "user_data": {
-                    "student_id": user['student_id'],
-                    "name": user['full_name'],
-                    "email": user['email'],
-                    "faculty": user['faculty'],
-                    "class_year": user['class_year'],
-                    "phone": user['phone'],
-                    "profile_photo_url": user['profile_photo_url'],
-                    "social_profiles": social_profiles
-                }
-            }
-        
+    # The slow hash runs in the password worker pool, never on the event loop
+    stored = match['password'] if match else None
+    if not await passwords.verify_password(credentials.password, stored):
         raise HTTPException(status_code=401, detail="Invalid email or password")
-        
-    finally:
-        cursor.close()
-        db.close()
+    
+    student_id = match['student_id']
+    upgraded = await passwords.hash_password(credentials.password) if passwords.needs_rehash(stored) else None
+    async with transaction() as db:
+        if upgraded:
+            # Plaintext (or weaker) password from before hashing; replaced now that we know it
+            await db.execute(
+                "UPDATE users SET password = %s WHERE student_id = %s AND password = %s",
+                (upgraded, student_id, stored)
+            )
+        token, expires_at = await sessions.create(db, student_id)
+    sessions.set_cookie(response, token, expires_at)
+    
+    # Profile and social profiles come from the shared user card cache
+    card = await get_user_card(student_id)
+    if card is None:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    user, _etag = card
+    return {
+        "success": True,
+        "message": "Login successful",
+        "token": token,
+        "expires_at": expires_at.isoformat(),
+        "user_data": {
+            "student_id": user['student_id'],
+            "name": user['full_name'],
+            "email": user['email'],
+            "faculty": user['faculty'],
+            "class_year": user['class_year'],
+            "phone": user['phone'],
+            "profile_photo_url": user['profile_photo_url'],
+            "social_profiles": user['social_profiles']
+        }
+    }
+
+@app.post("/auth/logout")
+async def logout_user(request: Request, response: Response):
+    await sessions.revoke(sessions.token_from(request))
+    sessions.clear_cookie(response)
+    return {"success": True, "message": "Logged out"}
+
+@app.get("/auth/me")
+async def current_user(student_id: int = Depends(current_student)):
+    """The signed-in user's card, resolved from the session without trusting client state"""
+    card = await get_user_card(student_id)
+    if card is None:
+        raise HTTPException(status_code=401, detail="Not signed in or session expired")
+    user, _etag = card
+    return user
 
 # ========== PROFILE ROUTES ==========
 @app.get("/users/{student_id}")
-async def get_user_profile(student_id: int):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
+async def get_user_profile(student_id: int, request: Request, response: Response):
+    if_none_match = request.headers.get("if-none-match")
     
-    try:
-        cursor.execute('''
-            SELECT student_id, full_name, email, faculty, class_year, phone, profile_photo_url
-            FROM users WHERE student_id = %s
-        ''', (student_id,))
-        
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Get social profiles
-        cursor.execute('''
-            SELECT sp.platform, sp.profile_url
-            FROM social_profiles sp
-            JOIN user_social_profiles usp ON sp.contact_id = usp.contact_id
-            WHERE usp.student_id = %s
-        ''', (student_id,))
-        
-        user['social_profiles'] = cursor.fetchall()
-        
-        return user
-        
-    finally:
-        cursor.close()
-        db.close()
+    # Not cached here but the client has a copy: a version query is enough to answer 304
+    if if_none_match and user_cards.get(student_id) is None:
+        async with connection() as db:
+            etag = await load_user_etag(db, student_id)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    
+    card = await get_user_card(student_id)
+    if not card:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user, etag = card
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return user
 
 # ========== POSTS ROUTES ==========
 @app.post("/posts")
-async def create_post(post: PostCreate):
-    db = get_db()
-    cursor = db.cursor()
-    
-    try:
-        # Insert post (do NOT provide expires_at; it's generated by MySQL)
-        cursor.execute('''
-            INSERT INTO posts (student_id, item_name, description, item_status, place)
-            VALUES (%s, %s, %s, %s, %s)
-        ''', (post.student_id, post.item_name, post.description, post.item_status, post.place))
-        
-        post_id = cursor.lastrowid
-        
-        # Insert images if any
-        if post.images:
-            for order, image_url in enumerate(post.images):
-                cursor.execute('''
-                    INSERT INTO post_images (post_id, image_url, image_order)
-                    VALUES (%s, %s, %s)
-                ''', (post_id, image_url, order))
-        
-        db.commit()
-        
-        # Fetch the generated expires_at
-        cursor.execute('SELECT expires_at FROM posts WHERE post_id = %s', (post_id,))
-        expires_at = cursor.fetchone()[0]
-        
-        return {
-            "success": True, 
-            "message": "Post created successfully",
-            "post_id": post_id,
-            "expires_at": expires_at.isoformat()
-        }
-        
-    except mysql.connector.Error as err:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        db.close()
-
-    db = get_db()
-    cursor = db.cursor()
-    
+async def create_post(post: PostCreate, session_student: int = Depends(current_student)):
+    require_self(post.student_id, session_student)
     try:
-        # Calculate expiration date (30 days from now)
-        expires_at = datetime.now() + timedelta(days=30)
-        
-        # Insert post
-        cursor.execute('''
-            INSERT INTO posts (student_id, item_name, description, item_status, place)
-            VALUES (%s, %s, %s, %s, %s)
-        ''', (post.student_id, post.item_name, post.description, post.item_status, post.place))
-        
-        post_id = cursor.lastrowid
-        
-        # Insert images if any
-        if post.images:
-            for order, image_url in enumerate(post.images):
-                cursor.execute('''
-                    INSERT INTO post_images (post_id, image_url, image_order)
-                    VALUES (%s, %s, %s)
-                ''', (post_id, image_url, order))
+        async with transaction() as db:
+            # The place's catalog entry, added if this is the first post there
+            place_id = (await places.resolve(db, [post.place]))[post.place]
+            
+            # Insert post (do NOT provide expires_at; it's generated by MySQL)
+            result = await db.execute('''
+                INSERT INTO posts (student_id, item_name, description, item_status, place, place_id)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            ''', (post.student_id, post.item_name, post.description, post.item_status, post.place, place_id))
+            
+            post_id = result.lastrowid
+            
+            # Insert images if any, in one statement
+            await writers.insert_post_images(db, [(post_id, post.images)])
+            
+            # Fetch the generated expires_at
+            row = await db.fetch_one('SELECT expires_at FROM posts WHERE post_id = %s', (post_id,))
         
-        db.commit()
+        # Re-index before invalidating so a reload right after sees the new post in search too
+        async with connection() as db:
+            await reindex_post(db, post_id)
+            feed_cache.post_created(post.item_status)
+            await publish_post(db, post_id)
         
         return {
             "success": True, 
             "message": "Post created successfully",
             "post_id": post_id,
-            "expires_at": expires_at.isoformat()
+            "expires_at": row['expires_at'].isoformat()
         }
         
-    except mysql.connector.Error as err:
-        db.rollback()
+    except DB_ERRORS as err:
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        db.close()
 
 @app.get("/posts/user/{student_id}")
-async def get_user_posts(student_id: int):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    
-    try:
-        cursor.execute('''
-            SELECT p.*, u.full_name, u.phone, u.email, u.profile_photo_url
-            FROM posts p 
-            JOIN users u ON p.student_id = u.student_id 
-            WHERE p.student_id = %s
-            ORDER BY 
+async def get_user_posts(
+    student_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    # Active posts first, then newest first; the cursor carries all three sort keys
+    query = f'''
+        SELECT * FROM (
+            SELECT {columns("p", POST_SUMMARY_COLUMNS)},
                 CASE 
                     WHEN p.item_status IN ('lost', 'found') AND p.expires_at > CURRENT_TIMESTAMP THEN 1
                     ELSE 2
-                END,
-                p.created_at DESC
-        ''', (student_id,))
+                END AS sort_group
+            FROM posts p 
+            WHERE p.student_id = %s
+        ) t
+    '''
+    params = [student_id]
+    
+    if cursor:
+        try:
+            group, created_at, post_id = decode_cursor(cursor, int, datetime, int)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query += '''
+            WHERE sort_group > %s
+            OR (sort_group = %s AND (created_at < %s OR (created_at = %s AND post_id < %s)))
+        '''
+        params.extend([group, group, created_at, created_at, post_id])
+    
+    query += " ORDER BY sort_group, created_at DESC, post_id DESC LIMIT %s"
+    params.append(limit + 1)
+    
+    async with connection() as db:
+        posts, next_cursor = page(
+            await db.fetch_all(query, params), limit,
+            key=lambda p: (p['sort_group'], p['created_at'], p['post_id'])
+        )
         
-        posts = cursor.fetchall()
+        # Every post has the same author, whose contact details come from GET /users/{id}
+        await attach_authors(db, posts, ("full_name",))
+        await attach_images(db, posts)
         
-        # Get images for each post
         for post in posts:
-            cursor.execute('''
-                SELECT image_url, image_order
-                FROM post_images 
-                WHERE post_id = %s 
-                ORDER BY image_order
-            ''', (post['post_id'],))
-            
-            post['images'] = [img['image_url'] for img in cursor.fetchall()]
-            
             # Add expiration info
             if post['item_status'] in ['lost', 'found'] and post['expires_at']:
                 expires_date = post['expires_at']
@@ -444,194 +637,399 @@ async def get_user_posts(student_id: int):
                 days_left = (expires_date - datetime.now()).days
                 post['days_until_expiration'] = max(0, days_left)
                 post['is_expiring_soon'] = days_left <= 7
+            del post['sort_group']
         
-        return {"posts": posts}
-        
-    finally:
-        cursor.close()
-        db.close()
+        return ORJSONResponse({"posts": posts, "next_cursor": next_cursor})
+
+# Declared before /posts/{post_id}, which would otherwise try to parse "changes"/"stream" as an id
+@app.get("/posts/changes")
+async def get_post_changes(
+    since: Optional[str] = None,
+    limit: int = Query(changes.MAX_CHANGES, ge=1, le=changes.MAX_CHANGES)
+):
+    """Posts changed and ids deleted since a sync token (see changes.py)"""
+    try:
+        async with connection() as db:
+            delta = await changes.load_changes(db, since, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except changes.TokenExpired:
+        raise HTTPException(status_code=410, detail="Sync token expired, reload all posts")
+    return ORJSONResponse(delta)
+
+@app.get("/posts/stream")
+async def stream_posts(request: Request):
+    """Server-sent events for the live board (see feed_events.py)"""
+    last_event_id = request.headers.get("last-event-id", "")
+    try:
+        subscriber = feed_hub.subscribe(int(last_event_id) if last_event_id.isdigit() else None)
+    except HubFull:
+        raise HTTPException(status_code=503, detail="Too many live feed connections, try again later")
+    return StreamingResponse(
+        feed_hub.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def publish_post(db, post_id):
+    """Send a created or edited post to live board subscribers, as a GET /posts item"""
+    if len(feed_hub) == 0:
+        feed_hub.skip()
+        return
+    post = await db.fetch_one(f'''
+        SELECT {columns("p", POST_SUMMARY_COLUMNS)}
+        FROM posts p
+        WHERE p.post_id = %s AND p.item_status IN ('lost', 'found') AND p.expires_at > CURRENT_TIMESTAMP
+    ''', (post_id,))
+    if post is None:
+        # Marked returned/claimed/expired: it leaves the board
+        feed_hub.posts_removed([post_id])
+        return
+    await attach_authors(db, [post], FEED_AUTHOR_COLUMNS)
+    await attach_images(db, [post])
+    feed_hub.post_changed(post)
 
 @app.get("/posts/{post_id}")
-async def get_post_details(post_id: int):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
+async def get_post_details(post_id: int, request: Request, response: Response):
+    if_none_match = request.headers.get("if-none-match")
     
-    try:
-        cursor.execute('''
-            SELECT p.*, u.full_name, u.phone, u.email, u.faculty, u.profile_photo_url
-            FROM posts p 
-            JOIN users u ON p.student_id = u.student_id 
-            WHERE p.post_id = %s
-        ''', (post_id,))
-        
-        post = cursor.fetchone()
-        if not post:
+    # The client has a copy: check versions (from cache, else version queries) before loading anything
+    if if_none_match:
+        etag = await post_details_etag(post_id)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    
+    cached = await get_post_detail(post_id)
+    if not cached:
+        raise HTTPException(status_code=404, detail="Post not found")
+    post, etag = cached
+    
+    # Author contact details and social profiles from the user card cache
+    author, author_etag = await get_user_card(post['student_id']) or ({}, None)
+    set_etag(response, make_etag(etag, author_etag))
+    return {
+        **post,
+        "full_name": author.get('full_name'),
+        "phone": author.get('phone'),
+        "email": author.get('email'),
+        "faculty": author.get('faculty'),
+        "profile_photo_url": author.get('profile_photo_url'),
+        "social_profiles": author.get('social_profiles', [])
+    }
+
+async def post_details_etag(post_id):
+    """ETag of GET /posts/{post_id}: the post's version combined with its author's"""
+    cached = post_details.get(post_id)
+    if cached:
+        post, etag = cached
+        student_id = post['student_id']
+    else:
+        async with connection() as db:
+            version = await load_post_etag(db, post_id)
+        if version is None:
+            return None
+        student_id, etag = version
+    
+    card = user_cards.get(student_id)
+    if card:
+        author_etag = card[1]
+    else:
+        async with connection() as db:
+            author_etag = await load_user_etag(db, student_id)
+    return make_etag(etag, author_etag)
+
+@app.get("/posts/{post_id}/matches")
+async def get_post_matches(post_id: int, limit: int = Query(10, ge=1, le=MAX_MATCHES)):
+    """Active posts of the opposite status that may be the same item, best first (see matching.py)"""
+    if not match_engine.has_post(post_id):
+        # Missing, or no longer on the board (returned, claimed, expired)
+        if await get_post_detail(post_id) is None:
             raise HTTPException(status_code=404, detail="Post not found")
-        
-        # Get images
-        cursor.execute('''
-            SELECT image_url, image_order
-            FROM post_images 
-            WHERE post_id = %s 
-            ORDER BY image_order
-        ''', (post_id,))
-        
-        post['images'] = [img['image_url'] for img in cursor.fetchall()]
-        
-        # Get social profiles
-        cursor.execute('''
-            SELECT sp.platform, sp.profile_url
-            FROM social_profiles sp
-            JOIN user_social_profiles usp ON sp.contact_id = usp.contact_id
-            WHERE usp.student_id = %s
-        ''', (post['student_id'],))
-        
-        post['social_profiles'] = cursor.fetchall()
-        
-        return post
-        
-    finally:
-        cursor.close()
-        db.close()
+        return {"post_id": post_id, "matches": [], "pending": False}
+    
+    ranked = match_engine.matches(post_id, limit)
+    posts = []
+    if ranked:
+        post_ids = [other_id for _, other_id in ranked]
+        async with connection() as db:
+            rows = await db.fetch_all(f'''
+                SELECT {columns("p", POST_SUMMARY_COLUMNS)}
+                FROM posts p
+                WHERE p.post_id IN ({', '.join(['%s'] * len(post_ids))})
+                AND p.item_status IN ('lost', 'found')
+                AND p.expires_at > CURRENT_TIMESTAMP
+            ''', post_ids)
+            
+            # Keep the engine's order
+            by_id = {row['post_id']: row for row in rows}
+            posts = [dict(by_id[other_id], match_score=score) for score, other_id in ranked if other_id in by_id]
+            
+            await attach_authors(db, posts, FEED_AUTHOR_COLUMNS)
+            await attach_images(db, posts)
+    
+    # pending: the post was just written and its candidates are still being scored
+    return {"post_id": post_id, "matches": posts, "pending": match_engine.pending(post_id)}
 
 # ========== POST UPDATE & DELETE ROUTES ==========
+async def require_post_owner(db, post_id, student_id):
+    """404 for a missing post, 403 for someone else's"""
+    row = await db.fetch_one("SELECT student_id FROM posts WHERE post_id = %s", (post_id,))
+    if row is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    require_self(row['student_id'], student_id)
+
 @app.put("/posts/{post_id}")
-async def update_post(post_id: int, post_update: PostUpdate):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
+async def update_post(post_id: int, post_update: PostUpdate, session_student: int = Depends(current_student)):
+    # Build update query dynamically based on provided fields
+    update_fields = []
+    update_values = []
+    
+    if post_update.item_name is not None:
+        update_fields.append("item_name = %s")
+        update_values.append(post_update.item_name)
+    
+    if post_update.description is not None:
+        update_fields.append("description = %s")
+        update_values.append(post_update.description)
+    
+    if post_update.item_status is not None:
+        update_fields.append("item_status = %s")
+        update_values.append(post_update.item_status)
+    
+    if post_update.place is not None:
+        update_fields.append("place = %s")
+        update_values.append(post_update.place)
+    
+    if not update_fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
     
     try:
-        # Build update query dynamically based on provided fields
-        update_fields = []
-        update_values = []
-        
-        if post_update.item_name is not None:
-            update_fields.append("item_name = %s")
-            update_values.append(post_update.item_name)
-        
-        if post_update.description is not None:
-            update_fields.append("description = %s")
-            update_values.append(post_update.description)
-        
-        if post_update.item_status is not None:
-            update_fields.append("item_status = %s")
-            update_values.append(post_update.item_status)
-        
-        if post_update.place is not None:
-            update_fields.append("place = %s")
-            update_values.append(post_update.place)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No fields to update")
-        
-        update_values.append(post_id)
-        
-        query = f"UPDATE posts SET {', '.join(update_fields)}, updated_at = CURRENT_TIMESTAMP WHERE post_id = %s"
-        cursor.execute(query, update_values)
-        db.commit()
+        async with transaction() as db:
+            await require_post_owner(db, post_id, session_student)
+            if post_update.place is not None:
+                update_fields.append("place_id = %s")
+                update_values.append((await places.resolve(db, [post_update.place]))[post_update.place])
+            update_values.append(post_id)
+            query = f"UPDATE posts SET {', '.join(update_fields)}, updated_at = CURRENT_TIMESTAMP WHERE post_id = %s"
+            await db.execute(query, update_values)
+        
+        async with connection() as db:
+            await reindex_post(db, post_id)
+            post_details.invalidate(post_id)
+            feed_cache.post_updated(
+                post_id,
+                new_status=post_update.item_status,
+                text_changed=post_update.item_name is not None or post_update.description is not None,
+                place_changed=post_update.place is not None
+            )
+            await publish_post(db, post_id)
         
         return {"success": True, "message": "Post updated successfully"}
         
-    except mysql.connector.Error as err:
-        db.rollback()
+    except DB_ERRORS as err:
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        db.close()
 
 @app.delete("/posts/{post_id}")
-async def delete_post(post_id: int):
-    db = get_db()
-    cursor = db.cursor()
-    
+async def delete_post(post_id: int, session_student: int = Depends(current_student)):
     try:
-        # Delete post images first (due to foreign key constraint)
-        cursor.execute("DELETE FROM post_images WHERE post_id = %s", (post_id,))
-        
-        # Delete the post
-        cursor.execute("DELETE FROM posts WHERE post_id = %s", (post_id,))
-        db.commit()
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Post not found")
+        async with transaction() as db:
+            await require_post_owner(db, post_id, session_student)
+            
+            # Delete post images first (due to foreign key constraint)
+            rows = await db.fetch_all("SELECT image_url FROM post_images WHERE post_id = %s", (post_id,))
+            await db.execute("DELETE FROM post_images WHERE post_id = %s", (post_id,))
+            await blobs.release(db, [row['image_url'] for row in rows])
+            
+            # Delete the post
+            result = await db.execute("DELETE FROM posts WHERE post_id = %s", (post_id,))
+            
+            if result.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Post not found")
+            await changes.record_tombstones(db, [post_id])
+        
+        index_writes.post(post_id)
+        search_index.remove_post(post_id)
+        facet_index.remove_post(post_id)
+        match_engine.remove_post(post_id)
+        post_details.invalidate(post_id)
+        feed_cache.posts_changed([post_id])
+        feed_hub.posts_removed([post_id])
         
         return {"success": True, "message": "Post deleted successfully"}
         
-    except mysql.connector.Error as err:
-        db.rollback()
+    except DB_ERRORS as err:
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        db.close()
 
 # ========== FILE UPLOAD ROUTE ==========
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), session_student: int = Depends(current_student)):
     try:
-        # Generate unique filename
-        file_extension = file.filename.split('.')[-1]
-        filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = f"uploads/{filename}"
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Streamed in chunks, checked to be an image and stored under its content hash
+        url, created = await blobs.store(file)
+        
+        if created:
+            # Resized WebP copies for the feed and detail page, rendered in the image process pool
+            srcset = images.srcset_entry(url, [])
+            variants = await images.create_derivatives(blobs.blob_path(url))
+            if variants:
+                async with transaction() as db:
+                    srcset = await images.record_derivatives(db, url, variants)
+        else:
+            async with connection() as db:
+                srcset = (await load_srcsets(db, [url])).get(url) or images.srcset_entry(url, [])
         
         return {
             "success": True,
-            "filename": filename,
-            "url": f"/uploads/{filename}"
+            "filename": os.path.basename(url),
+            "url": url,
+            "srcset": srcset
         }
         
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
 # ========== PUBLIC POSTS ROUTES ==========
 @app.get("/posts")
-async def get_all_posts(item_status: Optional[str] = None, search: Optional[str] = None):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
+async def get_all_posts(
+    request: Request,
+    item_status: Optional[str] = None,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    place: Optional[int] = None,
+    faculty: Optional[str] = None,
+    date: Optional[str] = None,
+    facets: bool = False
+):
+    if date is not None and date not in DATE_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"date must be one of {', '.join(DATE_BUCKETS)}")
     
-    try:
-        query = '''
-            SELECT p.*, u.full_name, u.faculty, u.profile_photo_url
-            FROM posts p 
-            JOIN users u ON p.student_id = u.student_id 
-            WHERE p.item_status IN ('lost', 'found')
-            AND p.expires_at > CURRENT_TIMESTAMP
-        '''
-        params = []
-        
-        if item_status:
-            query += " AND p.item_status = %s"
-            params.append(item_status)
-        
-        if search:
-            query += " AND (p.item_name LIKE %s OR p.description LIKE %s OR u.full_name LIKE %s)"
-            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
+    # Served from the feed cache; concurrent misses on one key share a single query
+    key = feed_key(item_status, search, cursor, limit, place, faculty, date)
+    page, etag = await feed_cache.get_or_load(key, lambda: load_feed_page(*key))
+    
+    if facets:
+        # Counted from the in-process facet index on every request; the tag follows its version
+        page = dict(page, facets=facet_counts(*key))
+        etag = make_etag(etag, facet_index.version)
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    # Encoded straight from the cached dict by orjson, skipping jsonable_encoder
+    response = ORJSONResponse(page)
+    set_etag(response, etag)
+    return response
+
+def facet_counts(item_status, search, cursor, limit, place, faculty, date):
+    """Posts per status, place, faculty and date bucket for the board as filtered"""
+    filters = {"item_status": item_status, "place": place, "faculty": faculty, "date": date}
+    post_ids = None
+    if search:
+        post_ids = [post_id for _, post_id in search_index.search(search)]
+    return facet_index.counts(filters, post_ids)
+
+async def load_feed_page(item_status, search, cursor, limit, place, faculty, date):
+    """(page, etag) for one page of the public board, straight from the database"""
+    if search:
+        page = await search_posts(search, item_status, cursor, limit, place, faculty, date)
+    else:
+        page = await recent_posts(item_status, cursor, limit, place, faculty, date)
+    return page, feed_etag(page)
+
+async def recent_posts(item_status, cursor, limit, place=None, faculty=None, date=None):
+    """Active posts, newest first"""
+    
+    query = f'''
+        SELECT {columns("p", POST_SUMMARY_COLUMNS)}
+        FROM posts p 
+        WHERE p.item_status IN ('lost', 'found')
+        AND p.expires_at > CURRENT_TIMESTAMP
+    '''
+    params = []
+    
+    if item_status:
+        query += " AND p.item_status = %s"
+        params.append(item_status)
+    
+    # Facet filters (see facets.py); the catalog place and the author's faculty are both indexed
+    if place is not None:
+        query += " AND p.place_id = %s"
+        params.append(place)
+    
+    if faculty:
+        query += " AND p.student_id IN (SELECT student_id FROM users WHERE faculty = %s)"
+        params.append(faculty)
+    
+    if date:
+        start, end = bucket_range(date)
+        if start is not None:
+            query += " AND p.created_at >= %s"
+            params.append(start)
+        if end is not None:
+            query += " AND p.created_at < %s"
+            params.append(end)
+    
+    # Keyset pagination: continue strictly after the last (created_at, post_id) seen
+    if cursor:
+        try:
+            created_at, post_id = decode_cursor(cursor, datetime, int)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query += " AND (p.created_at < %s OR (p.created_at = %s AND p.post_id < %s))"
+        params.extend([created_at, created_at, post_id])
+    
+    query += " ORDER BY p.created_at DESC, p.post_id DESC LIMIT %s"
+    params.append(limit + 1)
+    
+    async with connection() as db:
+        posts, next_cursor = page(
+            await db.fetch_all(query, params), limit,
+            key=lambda p: (p['created_at'], p['post_id'])
+        )
         
-        query += " ORDER BY p.created_at DESC"
+        # Author columns and images for the whole page, one query each
+        await attach_authors(db, posts, FEED_AUTHOR_COLUMNS)
+        await attach_images(db, posts)
         
-        cursor.execute(query, params)
-        posts = cursor.fetchall()
+        return {"posts": posts, "next_cursor": next_cursor}
+
+async def search_posts(search, item_status, cursor, limit, place=None, faculty=None, date=None):
+    """Rank matches with the in-process search index, then load just that page of rows"""
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, float, int)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    ranked, next_cursor = page(
+        search_index.search(search, item_status=item_status, limit=limit + 1, after=after,
+                            where=facet_index.matcher({"place": place, "faculty": faculty, "date": date})), limit,
+        key=lambda r: r
+    )
+    if not ranked:
+        return {"posts": [], "next_cursor": None}
+    
+    post_ids = [post_id for _, post_id in ranked]
+    async with connection() as db:
+        rows = await db.fetch_all(f'''
+            SELECT {columns("p", POST_SUMMARY_COLUMNS)}
+            FROM posts p 
+            WHERE p.post_id IN ({', '.join(['%s'] * len(post_ids))})
+            AND p.item_status IN ('lost', 'found')
+            AND p.expires_at > CURRENT_TIMESTAMP
+        ''', post_ids)
         
-        # Get images for each post
-        for post in posts:
-            cursor.execute('''
-                SELECT image_url, image_order
-                FROM post_images 
-                WHERE post_id = %s 
-                ORDER BY image_order
-            ''', (post['post_id'],))
-            
-            post['images'] = [img['image_url'] for img in cursor.fetchall()]
+        # Keep the index's relevance order
+        by_id = {row['post_id']: row for row in rows}
+        posts = [by_id[post_id] for post_id in post_ids if post_id in by_id]
         
-        return {"posts": posts}
+        await attach_authors(db, posts, FEED_AUTHOR_COLUMNS)
+        await attach_images(db, posts)
         
-    finally:
-        cursor.close()
-        db.close()
+        return {"posts": posts, "next_cursor": next_cursor}
 
 # ========== (Your existing routes are here) ==========
 
@@ -639,37 +1037,19 @@ async def get_all_posts(item_status: Optional[str] = None, search: Optional[str]
 @app.post("/upload-profile-image")
 async def upload_profile_image(
     profile_image: UploadFile = File(...),
-    student_id: str = Form(...)
+    student_id: str = Form(...),
+    session_student: int = Depends(current_student)
 ):
+    require_self(student_id, session_student)
     try:
-        # Check if file is an image
-        if not profile_image.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Generate unique filename
-        file_extension = profile_image.filename.split('.')[-1]
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"profile_{student_id}_{timestamp}.{file_extension}"
-        file_path = f"uploads/profiles/{filename}"
-        
-        # Create profiles directory if it doesn't exist
-        os.makedirs("uploads/profiles", exist_ok=True)
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            content = await profile_image.read()
-            buffer.write(content)
-        
-        # Update database with profile photo URL
-        profile_photo_url = f"/uploads/profiles/{filename}"
-        
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute(
-            "UPDATE users SET profile_photo_url = %s WHERE student_id = %s",
-            (profile_photo_url, student_id)
-        )
-        db.commit()
+        # Stored under its content hash, so re-uploading the same photo costs no disk write
+        profile_photo_url, _created = await blobs.store(profile_image)
+        
+        async with transaction() as db:
+            await set_profile_photo(db, student_id, profile_photo_url)
+        if student_id.isdigit():
+            user_cards.invalidate(int(student_id))
+            feed_cache.author_changed(int(student_id))
         
         return {
             "success": True,
@@ -677,121 +1057,121 @@ async def upload_profile_image(
             "message": "Profile image uploaded successfully"
         }
         
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
 
 @app.put("/users/{student_id}/profile-image")
-async def update_profile_image(student_id: str, image: UploadFile = File(...)):
+async def update_profile_image(student_id: str, image: UploadFile = File(...),
+                               session_student: int = Depends(current_student)):
+    require_self(student_id, session_student)
     try:
-        # Check if file is an image
-        if not image.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Generate unique filename
-        file_extension = image.filename.split('.')[-1]
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"profile_{student_id}_{timestamp}.{file_extension}"
-        file_path = f"uploads/profiles/{filename}"
-        
-        # Create profiles directory if it doesn't exist
-        os.makedirs("uploads/profiles", exist_ok=True)
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            content = await image.read()
-            buffer.write(content)
-        
-        # Update database
-        profile_photo_url = f"/uploads/profiles/{filename}"
-        
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute(
-            "UPDATE users SET profile_photo_url = %s WHERE student_id = %s",
-            (profile_photo_url, student_id)
-        )
-        db.commit()
+        # Stored under its content hash, so re-uploading the same photo costs no disk write
+        profile_photo_url, _created = await blobs.store(image)
+        
+        async with transaction() as db:
+            await set_profile_photo(db, student_id, profile_photo_url)
+        if student_id.isdigit():
+            user_cards.invalidate(int(student_id))
+            feed_cache.author_changed(int(student_id))
         
         return {
             "success": True,
             "profile_photo_url": profile_photo_url
         }
         
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image update failed: {str(e)}")
 
+async def set_profile_photo(db, student_id, profile_photo_url):
+    """Point a user at a new photo, moving the blob reference from the old one"""
+    old = await db.fetch_one("SELECT profile_photo_url FROM users WHERE student_id = %s", (student_id,))
+    await db.execute(
+        "UPDATE users SET profile_photo_url = %s WHERE student_id = %s",
+        (profile_photo_url, student_id)
+    )
+    if old:
+        await blobs.release(db, [old['profile_photo_url']])
+        await blobs.retain(db, [profile_photo_url])
+
 # ========== UPDATE USER PROFILE ROUTE ==========
 @app.put("/users/{student_id}")
-async def update_user_profile(student_id: str, user_update: UserUpdate):
-    db = get_db()
-    cursor = db.cursor()
+async def update_user_profile(student_id: str, user_update: UserUpdate,
+                              session_student: int = Depends(current_student)):
+    require_self(student_id, session_student)
+    # Build update query dynamically
+    update_fields = []
+    update_values = []
+    
+    if user_update.full_name is not None:
+        update_fields.append("full_name = %s")
+        update_values.append(user_update.full_name)
+    
+    if user_update.faculty is not None:
+        update_fields.append("faculty = %s")
+        update_values.append(user_update.faculty)
+    
+    if user_update.class_year is not None:
+        update_fields.append("class_year = %s")
+        update_values.append(user_update.class_year)
+    
+    if user_update.phone is not None:
+        update_fields.append("phone = %s")
+        update_values.append(user_update.phone)
+    
+    if user_update.email is not None:
+        update_fields.append("email = %s")
+        update_values.append(user_update.email)
+    
+    if user_update.profile_photo_url is not None:
+        update_fields.append("profile_photo_url = %s")
+        update_values.append(user_update.profile_photo_url)
+    
+    if not update_fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    
+    update_values.append(student_id)
     
     try:
-        # Build update query dynamically
-        update_fields = []
-        update_values = []
-        
-        if user_update.full_name is not None:
-            update_fields.append("full_name = %s")
-            update_values.append(user_update.full_name)
-        
-        if user_update.faculty is not None:
-            update_fields.append("faculty = %s")
-            update_values.append(user_update.faculty)
-        
-        if user_update.class_year is not None:
-            update_fields.append("class_year = %s")
-            update_values.append(user_update.class_year)
-        
-        if user_update.phone is not None:
-            update_fields.append("phone = %s")
-            update_values.append(user_update.phone)
-        
-        if user_update.email is not None:
-            update_fields.append("email = %s")
-            update_values.append(user_update.email)
-        
-        if user_update.profile_photo_url is not None:
-            update_fields.append("profile_photo_url = %s")
-            update_values.append(user_update.profile_photo_url)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No fields to update")
-        
-        update_values.append(student_id)
-        
-        query = f"UPDATE users SET {', '.join(update_fields)} WHERE student_id = %s"
-        cursor.execute(query, update_values)
-        db.commit()
+        async with transaction() as db:
+            old = None
+            if user_update.profile_photo_url is not None:
+                old = await db.fetch_one("SELECT profile_photo_url FROM users WHERE student_id = %s", (student_id,))
+            query = f"UPDATE users SET {', '.join(update_fields)} WHERE student_id = %s"
+            await db.execute(query, update_values)
+            if old:
+                await blobs.release(db, [old['profile_photo_url']])
+                await blobs.retain(db, [user_update.profile_photo_url])
+        
+        if student_id.isdigit():
+            user_cards.invalidate(int(student_id))
+            feed_cache.author_changed(int(student_id), faculty_changed=user_update.faculty is not None,
+                                      name_changed=user_update.full_name is not None)
+            index_writes.author(int(student_id))
+            if user_update.full_name is not None:
+                search_index.set_author(int(student_id), user_update.full_name)
+            if user_update.faculty is not None:
+                facet_index.set_author(int(student_id), user_update.faculty)
         
         return {"success": True, "message": "Profile updated successfully"}
         
-    except mysql.connector.Error as err:
-        db.rollback()
+    except DB_ERRORS as err:
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        db.close()
 
 # ========== HTML PAGE ROUTES (MUST BE LAST) ==========
 @app.get("/{page_name}")
-async def serve_html_page(page_name: str):
-    """Serve specific HTML files from the static directory"""
-    import os
-    
-    # Security check: only allow .html files and prevent directory traversal
+async def serve_html_page(page_name: str, request: Request):
+    """Serve specific HTML files from the in-memory asset manifest"""
     if not page_name.endswith('.html'):
         page_name += '.html'
     
-    # Remove any path traversal attempts
-    page_name = os.path.basename(page_name)
-    
-    file_path = f"static/{page_name}"
-    
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    else:
+    page = assets.manifest.pages.get(page_name)
+    if page is None:
         raise HTTPException(status_code=404, detail=f"Page {page_name} not found")
+    return assets.respond(page, request)
 
 # ========== (Keep your existing code below) ==========
 if __name__ == "__main__":
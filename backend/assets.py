@@ -0,0 +1,137 @@
+"""Fingerprinted, precompressed frontend assets served from memory.
+
+manifest.build() runs once at startup and reads every file under static/:
+
+  * each non-HTML asset gets a content-hashed alias (api.js -> api.1a2b3c4d5e.js)
+    that is served with a year-long immutable Cache-Control;
+  * references to /static/... in HTML and CSS are rewritten to those aliases,
+    so a deploy that changes api.js changes the URL pages load it from;
+  * text assets are gzip- and (when the brotli package is installed)
+    brotli-compressed once, and the smallest encoding the client accepts is
+    sent.
+
+Requests are answered from the in-memory manifest without touching the
+filesystem. HTML pages and the original asset names (still used by URLs
+stored in the database, such as the default profile photo) are served with
+an ETag and no-cache, so browsers revalidate them cheaply. Changes to
+static/ take effect on restart.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from fastapi import Response
+
+from etags import etag_matches, make_etag
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+STATIC_DIR = "static"
+STATIC_PREFIX = "/static/"
+MIN_COMPRESS_BYTES = 512
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+REFERENCE_RE = re.compile(r"/static/([\w./-]+)")
+
+
+class Asset:
+    __slots__ = ("media_type", "bodies", "etag", "cache_control")
+
+    def __init__(self, body, media_type, cache_control):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.etag = make_etag("asset", hashlib.sha256(body).hexdigest())
+        self.bodies = {"identity": body}    # content-coding -> bytes, smallest wins
+        if len(body) >= MIN_COMPRESS_BYTES and media_type and _compressible(media_type):
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body, quality=11)
+
+    def with_cache_control(self, cache_control):
+        """The same bytes under another caching policy, without compressing them again."""
+        alias = Asset.__new__(Asset)
+        alias.media_type, alias.bodies, alias.etag = self.media_type, self.bodies, self.etag
+        alias.cache_control = cache_control
+        return alias
+
+    def encoding_for(self, accept_encoding):
+        accepted = {part.split(";")[0].strip() for part in (accept_encoding or "").split(",")}
+        options = [coding for coding in self.bodies if coding == "identity" or coding in accepted]
+        return min(options, key=lambda coding: len(self.bodies[coding]))
+
+
+def _compressible(media_type):
+    return media_type.startswith("text/") or media_type in ("application/javascript", "application/json",
+                                                            "image/svg+xml")
+
+
+def _media_type(path):
+    media_type, _ = mimetypes.guess_type(path)
+    if path.endswith(".js"):
+        return "application/javascript"
+    return media_type or "application/octet-stream"
+
+
+def _fingerprint(name, body):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:10]}{ext}"
+
+
+class Manifest:
+    def __init__(self):
+        self.assets = {}    # path below /static/ -> Asset
+        self.pages = {}     # page file name ("index.html") -> Asset
+        self.aliases = {}   # original path below /static/ -> fingerprinted path
+
+    def build(self, static_dir=STATIC_DIR):
+        sources = {}
+        for root, _dirs, files in os.walk(static_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                with open(path, "rb") as f:
+                    sources[os.path.relpath(path, static_dir).replace(os.sep, "/")] = f.read()
+
+        def rewrite(body):
+            return REFERENCE_RE.sub(
+                lambda m: STATIC_PREFIX + aliases.get(m.group(1), m.group(1)), body.decode("utf-8")
+            ).encode("utf-8")
+
+        # Leaf assets (images, JS) first, then CSS which may point at them
+        aliases = {}
+        ordered = sorted((name for name in sources if not name.endswith(".html")), key=lambda n: n.endswith(".css"))
+        assets = {}
+        for name in ordered:
+            body = rewrite(sources[name]) if name.endswith(".css") else sources[name]
+            aliases[name] = _fingerprint(name, body)
+            assets[aliases[name]] = Asset(body, _media_type(name), IMMUTABLE)
+            assets[name] = assets[aliases[name]].with_cache_control(REVALIDATE)
+
+        pages = {}
+        for name in sources:
+            if name.endswith(".html"):
+                page = Asset(rewrite(sources[name]), "text/html", REVALIDATE)
+                assets[name] = pages[os.path.basename(name)] = page
+
+        self.assets, self.pages, self.aliases = assets, pages, aliases
+        return self
+
+
+def respond(asset, request):
+    """Serve an asset in the best accepted encoding, or 304 if the client's copy is current."""
+    headers = {"ETag": asset.etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), asset.etag):
+        return Response(status_code=304, headers=headers)
+
+    coding = asset.encoding_for(request.headers.get("accept-encoding"))
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(asset.bodies[coding], media_type=asset.media_type, headers=headers)
+
+
+manifest = Manifest()
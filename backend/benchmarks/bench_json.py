@@ -0,0 +1,116 @@
+"""JSON encode cost of a large GET /posts page: old response path vs. new.
+
+Run from the backend directory:
+
+    python benchmarks/bench_json.py [--posts 5000] [--runs 20]
+
+Builds a synthetic feed of --posts posts and times:
+
+  old   `SELECT p.*` rows (with the TEXT description) through FastAPI's
+        jsonable_encoder and Starlette's JSONResponse (json.dumps)
+  new   POST_SUMMARY_COLUMNS rows encoded directly by ORJSONResponse
+
+plus the orjson encoder on the old rows, to separate the encoder speed-up from
+the smaller schema, and the compressed size and cost of the new body with the
+levels CompressionMiddleware uses.
+"""
+import argparse
+import gzip
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import ORJSONResponse  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+import compression  # noqa: E402
+from loaders import FEED_AUTHOR_COLUMNS, POST_SUMMARY_COLUMNS  # noqa: E402
+
+WORDS = ["wallet", "phone", "umbrella", "keys", "black", "blue", "near", "library", "canteen", "left",
+         "กระเป๋าสตางค์", "โทรศัพท์", "สีดำ", "หอสมุด", "โรงอาหาร", "found", "lost", "card", "bag", "hall"]
+
+
+def synthetic_feed(n, rng):
+    """A feed page as load_feed_page built it from SELECT p.* rows."""
+    now = datetime(2025, 11, 1, 12, 0, 0)
+    posts = []
+    for post_id in range(n, 0, -1):
+        created = now - timedelta(minutes=post_id * 7)
+        image = f"/uploads/{rng.getrandbits(256):064x}.png"
+        posts.append({
+            "post_id": post_id,
+            "student_id": rng.randrange(1, n // 5 + 2),
+            "item_name": " ".join(rng.choices(WORDS, k=3)),
+            "item_status": rng.choice(["lost", "found"]),
+            "place": rng.choice(["ECC building", "Library", "Canteen", "Hall 12"]),
+            "description": " ".join(rng.choices(WORDS, k=rng.randrange(20, 80))),
+            "created_at": created,
+            "updated_at": created,
+            "expires_at": created + timedelta(days=30),
+            "full_name": f"Student {rng.randrange(10_000)}",
+            "faculty": "Engineering",
+            "profile_photo_url": "/static/pic/profile.png",
+            "images": [image],
+            "image_srcsets": [{"src": image, "srcset": ", ".join(
+                f"{image[:-4]}-{w}.webp {w}w" for w in (320, 640, 1280))}],
+        })
+    return {"posts": posts, "next_cursor": "eyJhIjoxfQ"}
+
+
+def lean(page):
+    keep = set(POST_SUMMARY_COLUMNS) | set(FEED_AUTHOR_COLUMNS) | {"images", "image_srcsets"}
+    return {"posts": [{k: v for k, v in post.items() if k in keep} for post in page["posts"]],
+            "next_cursor": page["next_cursor"]}
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    full = synthetic_feed(args.posts, random.Random(args.seed))
+    summary = lean(full)
+
+    paths = [
+        ("old: p.* + jsonable_encoder + json", lambda: JSONResponse(jsonable_encoder(full)).body),
+        ("orjson on p.* rows", lambda: ORJSONResponse(full).body),
+        ("new: lean rows + orjson", lambda: ORJSONResponse(summary).body),
+    ]
+    print(f"{args.posts} posts, median of {args.runs} runs\n")
+    print(f"{'path':<36} {'encode ms':>10} {'bytes':>10}")
+    baseline = None
+    for name, fn in paths:
+        ms, body = timed(fn, args.runs)
+        baseline = baseline or ms
+        print(f"{name:<36} {ms:>10.2f} {len(body):>10}   x{baseline / ms:.1f}")
+
+    body = ORJSONResponse(summary).body
+    print(f"\n{'compression of the new body':<36} {'ms':>10} {'bytes':>10}")
+    codings = ["gzip"] + (["br"] if compression.brotli is not None else [])
+    for coding in codings:
+        ms, compressed = timed(lambda: compression.compress(body, coding), args.runs)
+        print(f"{coding:<36} {ms:>10.2f} {len(compressed):>10}")
+    if compression.brotli is None:
+        print("(brotli not installed; only gzip measured)")
+    print(f"{'gzip -9 (for reference)':<36} {timed(lambda: gzip.compress(body, 9), args.runs)[0]:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
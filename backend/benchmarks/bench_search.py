@@ -0,0 +1,118 @@
+"""Search latency as the board grows: inverted index vs. the old LIKE-style scan.
+
+Run from the backend directory:
+
+    python benchmarks/bench_search.py [--sizes 1000 10000 100000] [--queries 200]
+
+Each size builds a synthetic board (English and Thai item names, descriptions
+and author names), then times two query mixes against search_index and against
+a linear substring scan equivalent to the old
+`item_name LIKE '%term%' OR description LIKE ... OR full_name LIKE ...` query:
+
+  selective  brand/model words whose vocabulary grows with the board, so each
+             query matches roughly the same number of posts at every size
+  broad      generic words ("wallet", "กระเป๋า") that match a fixed fraction
+             of the board
+
+Index cost follows the number of matching posts, so the selective column stays
+flat while the scan grows linearly with the table.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex  # noqa: E402
+
+ITEMS = ["wallet", "phone", "umbrella", "keys", "student card", "laptop", "airpods", "water bottle",
+         "calculator", "jacket", "กระเป๋าสตางค์", "โทรศัพท์", "ร่ม", "กุญแจ", "บัตรนักศึกษา"]
+COLOURS = ["black", "blue", "red", "white", "pink", "สีดำ", "สีแดง", "สีฟ้า"]
+PLACES = ["library", "canteen", "ECC building", "hall 12", "parking lot", "โรงอาหาร", "หอสมุด"]
+NAMES = ["Somchai", "Suda", "Niran", "Alice", "Bob", "Kanya", "Prasert", "Mali", "Anan", "Ploy"]
+
+BROAD_QUERIES = ["wallet", "blue umbrella", "student card", "กระเป๋า", "กุญแจ", "lapt", "somchai", "hall 12 keys"]
+POSTS_PER_MODEL = 25
+
+
+def synthetic_board(n, rng):
+    authors = [{"student_id": i, "full_name": f"{rng.choice(NAMES)} {rng.choice(NAMES)}son"}
+               for i in range(max(1, n // 10))]
+    posts = []
+    for post_id in range(1, n + 1):
+        item = rng.choice(ITEMS)
+        posts.append({
+            "post_id": post_id,
+            "student_id": rng.randrange(len(authors)),
+            "item_name": f"{rng.choice(COLOURS)} {item} model{rng.randrange(max(1, n // POSTS_PER_MODEL))}",
+            "description": f"{item} {rng.choice(['lost', 'found'])} near {rng.choice(PLACES)} #{rng.randrange(10**6)}",
+            "item_status": rng.choice(["lost", "found"]),
+            "expires_at": None,
+        })
+    return posts, authors
+
+
+def like_scan(posts, names, query, limit):
+    """What the old SQL did: a substring test on every row, newest first."""
+    needle = query.lower()
+    hits = [p for p in posts
+            if needle in p["item_name"].lower()
+            or needle in p["description"].lower()
+            or needle in names[p["student_id"]].lower()]
+    hits.sort(key=lambda p: -p["post_id"])
+    return hits[:limit]
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200, help="timed runs per query and engine")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'posts':>9} {'build s':>8} {'mix':>10} {'matches':>8} "
+          f"{'index p50 ms':>13} {'index p99 ms':>13} {'scan p50 ms':>12} {'scan p99 ms':>12}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        posts, authors = synthetic_board(size, rng)
+        names = {a["student_id"]: a["full_name"] for a in authors}
+
+        start = time.perf_counter()
+        index = SearchIndex()
+        index.rebuild(posts, authors)
+        build_s = time.perf_counter() - start
+
+        selective = [f"model{rng.randrange(max(1, size // POSTS_PER_MODEL))}" for _ in BROAD_QUERIES]
+        for mix, queries in (("selective", selective), ("broad", BROAD_QUERIES)):
+            runs = max(1, args.queries // len(queries))
+            matches, index_p50, index_p99, scan_p50, scan_p99 = [], [], [], [], []
+            for query in queries:
+                matches.append(len(index.search(query)))
+                p50, p99 = timed(lambda: index.search(query, limit=args.limit), runs)
+                index_p50.append(p50)
+                index_p99.append(p99)
+                p50, p99 = timed(lambda: like_scan(posts, names, query, args.limit), max(1, runs // 10))
+                scan_p50.append(p50)
+                scan_p99.append(p99)
+
+            print(f"{size:>9} {build_s:>8.2f} {mix:>10} {int(statistics.median(matches)):>8} "
+                  f"{statistics.median(index_p50):>13.3f} {max(index_p99):>13.3f} "
+                  f"{statistics.median(scan_p50):>12.3f} {max(scan_p99):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
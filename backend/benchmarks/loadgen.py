@@ -0,0 +1,470 @@
+"""Async load generator for the API, with machine-readable latency histograms.
+
+Run from the backend directory against a running app (see
+docker-compose.bench.yml for a local MySQL + app stack) seeded with seed.py:
+
+    python benchmarks/loadgen.py run --url http://localhost:8000 --duration 60 \\
+        --concurrency 50 --users 50000 --out results/main.json
+    python benchmarks/loadgen.py compare results/main.json results/branch.json
+
+`run` drives --concurrency virtual users. Each one owns a keep-alive
+connection and a session cookie and draws scenarios from --mix:
+
+  browse  GET /posts, then with probability 1/2 its next page
+  search  GET /posts?search=<words from the seed vocabulary>
+  detail  GET /posts/{id} for a post seen while browsing
+  login   POST /auth/login as a random seeded user
+  post    POST /posts (logs in first if the user has no session)
+  upload  POST /upload with a small JPEG (same)
+
+By default the model is closed: each user starts its next scenario when the
+last one ends (plus --think ms). With --rate, scenarios instead arrive as a
+Poisson process at that many per second, and latency is measured from the
+scheduled arrival, so time spent waiting for a free user counts. That keeps
+an overloaded server from hiding its queueing delay (coordinated omission).
+
+Latencies are recorded per request label in log-bucketed histograms (2%
+relative error), after --warmup seconds. The output JSON has count, errors,
+status codes, throughput, mean, p50/p90/p99/p99.9/max and the non-empty
+histogram buckets for every label. `compare` prints the change per label and
+exits 1 when a p99 or the throughput got worse by more than --threshold.
+
+Only the standard library is used (a minimal HTTP/1.1 client), plus Pillow
+for the upload body.
+"""
+import argparse
+import asyncio
+import gzip
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import BENCH_PASSWORD, COLOURS, ITEMS, PLACES, START_ID  # noqa: E402
+
+DEFAULT_MIX = "browse=55,search=20,detail=20,login=3,post=1,upload=1"
+PRECISION = 0.02
+SEEN_POSTS = 10_000
+
+
+# ---------- histogram ----------
+class Histogram:
+    """Log-bucketed latency histogram: bucket i holds values up to (1 + PRECISION) ** i microseconds."""
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = max(seconds * 1e6, 1.0)
+        self.buckets[math.ceil(math.log(us) / math.log1p(PRECISION))] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @staticmethod
+    def _upper_ms(index):
+        return (1 + PRECISION) ** index / 1000
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._upper_ms(index), self.max * 1000)
+        return self.max * 1000
+
+    def summary(self, elapsed):
+        def ms(value):
+            return round(value, 3) if value is not None else None
+        return {
+            "count": self.count,
+            "rps": round(self.count / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": ms(self.total / self.count * 1000) if self.count else None,
+            **{f"p{str(q).replace('.', '')}_ms": ms(self.percentile(q)) for q in (50, 90, 99, 99.9)},
+            "max_ms": ms(self.max * 1000),
+            "histogram": [[ms(self._upper_ms(i)), n] for i, n in sorted(self.buckets.items())],
+        }
+
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(Histogram)
+        self.status = defaultdict(Counter)
+        self.errors = Counter()
+        self.recording = False
+
+    def record(self, label, status, seconds):
+        if not self.recording:
+            return
+        self.status[label][str(status)] += 1
+        if status == "error" or status >= 400:
+            self.errors[label] += 1
+        self.latency[label].record(seconds)
+
+    def report(self, elapsed):
+        endpoints = {}
+        total = Histogram()
+        for label in sorted(self.latency):
+            histogram = self.latency[label]
+            endpoints[label] = dict(histogram.summary(elapsed), errors=self.errors[label],
+                                    status=dict(self.status[label]))
+            total.buckets.update(histogram.buckets)
+            total.count += histogram.count
+            total.total += histogram.total
+            total.max = max(total.max, histogram.max)
+        return endpoints, dict(total.summary(elapsed), errors=sum(self.errors.values()))
+
+
+# ---------- HTTP ----------
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b"", headers=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Accept-Encoding: gzip",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        try:
+            self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+            await self.writer.drain()
+
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise HTTPError("connection closed")
+            status = int(status_line.split()[1])
+            response_headers = {}
+            cookies = []
+            while True:
+                line = (await self.reader.readline()).decode("latin-1").rstrip("\r\n")
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                name, value = name.strip().lower(), value.strip()
+                if name == "set-cookie":
+                    cookies.append(value)
+                response_headers[name] = value
+
+            if response_headers.get("transfer-encoding") == "chunked":
+                payload = b""
+                while True:
+                    size = int((await self.reader.readline()).split(b";")[0], 16)
+                    chunk = await self.reader.readexactly(size + 2)
+                    if size == 0:
+                        break
+                    payload += chunk[:-2]
+            else:
+                payload = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError, HTTPError):
+            await self.close()
+            raise
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        if response_headers.get("content-encoding") == "gzip":
+            payload = gzip.decompress(payload)
+        return status, cookies, payload
+
+
+def multipart(field, filename, content_type, data):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def sample_jpeg(rng):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", (640, 480), tuple(rng.randrange(256) for _ in range(3))).save(out, "JPEG", quality=80)
+    return out.getvalue()
+
+
+# ---------- scenarios ----------
+class VirtualUser:
+    def __init__(self, runner, rng):
+        self.runner = runner
+        self.rng = rng
+        self.conn = Connection(runner.host, runner.port)
+        self.cookie = None
+        self.student_id = None
+
+    async def call(self, label, method, path, body=b"", headers=None, started=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        begin = time.perf_counter() if started is None else started
+        try:
+            status, cookies, payload = await self.conn.request(method, path, body, headers)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError, HTTPError):
+            self.runner.stats.record(label, "error", time.perf_counter() - begin)
+            return None, None
+        self.runner.stats.record(label, status, time.perf_counter() - begin)
+        for cookie in cookies:
+            self.cookie = cookie.split(";")[0]
+        if status >= 400 or not payload:
+            return status, None
+        try:
+            return status, json.loads(payload)
+        except ValueError:
+            return status, None
+
+    def remember(self, posts):
+        seen = self.runner.seen_posts
+        for post in posts:
+            if len(seen) < SEEN_POSTS:
+                seen.append(post['post_id'])
+            else:
+                seen[self.rng.randrange(SEEN_POSTS)] = post['post_id']
+
+    async def browse(self, started):
+        _, data = await self.call("GET /posts", "GET", "/posts?limit=20", started=started)
+        if data:
+            self.remember(data.get('posts', []))
+            if data.get('next_cursor') and self.rng.random() < 0.5:
+                _, more = await self.call("GET /posts (next page)", "GET",
+                                          "/posts?" + urlencode({"limit": 20, "cursor": data['next_cursor']}))
+                if more:
+                    self.remember(more.get('posts', []))
+
+    async def search(self, started):
+        words = self.rng.choice([[self.rng.choice(ITEMS)],
+                                 [self.rng.choice(COLOURS), self.rng.choice(ITEMS)],
+                                 [self.rng.choice(ITEMS), self.rng.choice(PLACES)]])
+        _, data = await self.call("GET /posts?search", "GET", "/posts?" + urlencode({"search": " ".join(words)}),
+                                  started=started)
+        if data:
+            self.remember(data.get('posts', []))
+
+    async def detail(self, started):
+        seen = self.runner.seen_posts
+        post_id = self.rng.choice(seen) if seen else self.runner.args.start_id
+        await self.call("GET /posts/{id}", "GET", f"/posts/{post_id}", started=started)
+
+    async def login(self, started=None):
+        student_id = self.runner.args.start_id + self.rng.randrange(self.runner.args.users)
+        body = json.dumps({"email": f"bench{student_id}@example.test", "password": BENCH_PASSWORD}).encode()
+        status, _ = await self.call("POST /auth/login", "POST", "/auth/login", body,
+                                    {"Content-Type": "application/json"}, started=started)
+        if status == 200:
+            self.student_id = student_id
+        return status == 200
+
+    async def post(self, started):
+        if self.student_id is None and not await self.login(started):
+            return
+        body = json.dumps({
+            "student_id": self.student_id,
+            "item_name": f"{self.rng.choice(COLOURS)} {self.rng.choice(ITEMS)}",
+            "description": "load test post",
+            "item_status": self.rng.choice(["lost", "found"]),
+            "place": self.rng.choice(PLACES),
+            "images": [],
+        }).encode()
+        await self.call("POST /posts", "POST", "/posts", body, {"Content-Type": "application/json"})
+
+    async def upload(self, started):
+        if self.student_id is None and not await self.login(started):
+            return
+        body, content_type = multipart("file", "photo.jpg", "image/jpeg", self.runner.jpeg)
+        await self.call("POST /upload", "POST", "/upload", body, {"Content-Type": content_type})
+
+
+class Runner:
+    def __init__(self, args):
+        self.args = args
+        target = urlsplit(args.url)
+        self.host, self.port = target.hostname, target.port or 80
+        self.rng = random.Random(args.seed)
+        self.stats = Stats()
+        self.seen_posts = []
+        self.mix = parse_mix(args.mix)
+        self.jpeg = sample_jpeg(self.rng) if "upload" in self.mix else b""
+        self.users = [VirtualUser(self, random.Random(self.rng.random())) for _ in range(args.concurrency)]
+
+    def pick(self, rng):
+        names, weights = zip(*self.mix.items())
+        return rng.choices(names, weights)[0]
+
+    async def closed_loop(self, user, deadline):
+        while time.perf_counter() < deadline:
+            await getattr(user, self.pick(user.rng))(None)
+            if self.args.think:
+                await asyncio.sleep(user.rng.expovariate(1000 / self.args.think))
+
+    async def open_loop(self, deadline):
+        idle = asyncio.Queue()
+        for user in self.users:
+            idle.put_nowait(user)
+
+        async def arrival(scheduled):
+            user = await idle.get()
+            try:
+                await getattr(user, self.pick(user.rng))(scheduled)
+            finally:
+                idle.put_nowait(user)
+
+        tasks = set()
+        next_arrival = time.perf_counter()
+        while next_arrival < deadline:
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            task = asyncio.create_task(arrival(next_arrival))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_arrival += self.rng.expovariate(self.args.rate)
+        await asyncio.gather(*tasks)
+
+    async def run(self):
+        args = self.args
+        started = time.perf_counter()
+        deadline = started + args.warmup + args.duration
+
+        async def start_recording():
+            await asyncio.sleep(args.warmup)
+            self.stats.recording = True
+            return time.perf_counter()
+
+        recorder = asyncio.create_task(start_recording())
+        if args.rate:
+            await self.open_loop(deadline)
+        else:
+            await asyncio.gather(*(self.closed_loop(user, deadline) for user in self.users))
+        recorded_from = await recorder
+        elapsed = time.perf_counter() - recorded_from
+        for user in self.users:
+            await user.conn.close()
+
+        endpoints, total = self.stats.report(elapsed)
+        return {
+            "meta": {
+                "url": args.url, "started_at": datetime.now().isoformat(timespec="seconds"),
+                "duration_s": round(elapsed, 2), "warmup_s": args.warmup, "concurrency": args.concurrency,
+                "rate": args.rate, "think_ms": args.think, "mix": self.mix, "seed": args.seed,
+                "users": args.users, "python": platform.python_version(), "precision": PRECISION,
+            },
+            "total": total,
+            "endpoints": endpoints,
+        }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("browse", "search", "detail", "login", "post", "upload"):
+            raise SystemExit(f"unknown scenario in --mix: {name!r}")
+        mix[name.strip()] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+# ---------- output ----------
+def print_table(result):
+    print(f"{'request':<26} {'count':>8} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p90 ms':>9} "
+          f"{'p99 ms':>9} {'p99.9 ms':>9} {'max ms':>9}")
+    rows = list(result["endpoints"].items()) + [("total", result["total"])]
+    for label, s in rows:
+        print(f"{label:<26} {s['count']:>8} {s['errors']:>5} {s['rps']:>8.1f} {s['p50_ms'] or 0:>9.2f} "
+              f"{s['p90_ms'] or 0:>9.2f} {s['p99_ms'] or 0:>9.2f} {s['p999_ms'] or 0:>9.2f} {s['max_ms'] or 0:>9.2f}")
+
+
+def compare(base_path, new_path, threshold):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def change(old, current):
+        return (current - old) / old if old else 0.0
+
+    regressions = []
+    print(f"{'request':<26} {'p50 ms':>18} {'p99 ms':>18} {'rps':>18}")
+    for label in sorted(set(base["endpoints"]) | set(new["endpoints"])):
+        b, n = base["endpoints"].get(label), new["endpoints"].get(label)
+        if not b or not n:
+            print(f"{label:<26} only in {'new' if n else 'base'}")
+            continue
+        cells = []
+        for key in ("p50_ms", "p99_ms", "rps"):
+            delta = change(b[key] or 0, n[key] or 0)
+            cells.append(f"{n[key] or 0:>9.2f} {delta:>+7.1%}")
+        print(f"{label:<26} " + " ".join(f"{cell:>18}" for cell in cells))
+        if change(b["p99_ms"] or 0, n["p99_ms"] or 0) > threshold:
+            regressions.append(f"{label}: p99 {b['p99_ms']} -> {n['p99_ms']} ms")
+        if change(b["rps"], n["rps"]) < -threshold:
+            regressions.append(f"{label}: {b['rps']} -> {n['rps']} rps")
+    if regressions:
+        print("\nRegressions beyond {:.0%}:\n  ".format(threshold) + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="generate load and record latencies")
+    run.add_argument("--url", default="http://localhost:8000")
+    run.add_argument("--duration", type=float, default=60, help="measured seconds")
+    run.add_argument("--warmup", type=float, default=10, help="unmeasured seconds before that")
+    run.add_argument("--concurrency", type=int, default=50, help="virtual users (connections)")
+    run.add_argument("--rate", type=float, help="open model: scenario arrivals per second")
+    run.add_argument("--think", type=float, default=0, help="closed model: mean pause between scenarios, ms")
+    run.add_argument("--mix", default=DEFAULT_MIX)
+    run.add_argument("--users", type=int, default=1000, help="seeded users to log in as")
+    run.add_argument("--start-id", type=int, default=START_ID)
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--out", help="write the JSON result here")
+
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("base")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        sys.exit(compare(args.base, args.new, args.threshold))
+
+    result = asyncio.run(Runner(args).run())
+    print_table(result)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
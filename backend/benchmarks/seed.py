@@ -0,0 +1,120 @@
+"""Synthetic users, social profiles, posts and images for load tests.
+
+Run from the backend directory. Records are written as JSON Lines for
+bulk.py, so any scale streams through in constant memory:
+
+    python benchmarks/seed.py images --count 40
+    python benchmarks/seed.py users --count 50000 | python bulk.py import users -
+    python benchmarks/seed.py posts --count 1000000 --users 50000 | python bulk.py import posts -
+
+For a given --seed the output is the same on every run, apart from the
+password salt and the dates, which are relative to today. Ids are explicit
+and start at --start-id (default 1,000,000), clear of rows created through
+the app, so a seeded database can be topped up or compared across runs.
+Every user's email is bench<student_id>@example.test and their password
+BENCH_PASSWORD, which is what loadgen.py logs in with; the hash is computed
+once and shared.
+
+`images` writes small JPEG files into uploads/ (bench-<n>.jpg); posts pick
+their images from whatever bench-*.jpg files exist there. Post creation
+dates are spread over the last --days days, so with the default 60 about
+half of the posts are past their 30-day expiry, as on a real board.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import _hash_sync  # noqa: E402
+
+BENCH_PASSWORD = "bench-password"
+START_ID = 1_000_000
+
+FACULTIES = ["School of Engineering", "School of Science", "School of Information Technology",
+             "KMITL Business School", "School of Architecture, Art, and Design", "International College"]
+FIRST = ["Somchai", "Suda", "Niran", "Alice", "Bob", "Kanya", "Prasert", "Mali", "Anan", "Ploy", "Krit", "Nok"]
+LAST = ["Srisuk", "Wongsa", "Chaiyaporn", "Smith", "Tanaka", "Boonmee", "Rattana", "Jones"]
+PLATFORMS = ["Facebook", "Instagram", "LINE", "Twitter / X", "Discord", "Other"]
+ITEMS = ["wallet", "phone", "umbrella", "keys", "student card", "laptop", "airpods", "water bottle",
+         "calculator", "jacket", "กระเป๋าสตางค์", "โทรศัพท์", "ร่ม", "กุญแจ", "บัตรนักศึกษา"]
+COLOURS = ["black", "blue", "red", "white", "pink", "สีดำ", "สีแดง", "สีฟ้า"]
+PLACES = ["Library", "Canteen", "ECC building", "Hall 12", "Parking lot", "โรงอาหาร", "หอสมุด"]
+WORDS = ["near", "left", "on", "the", "table", "bench", "second", "floor", "morning", "after", "class",
+         "please", "contact", "me", "if", "found", "ติดต่อ", "ได้", "ที่", "ชั้น", "สอง"]
+
+
+def users(args, rng):
+    password = _hash_sync(BENCH_PASSWORD)
+    for student_id in range(args.start_id, args.start_id + args.count):
+        yield {
+            "student_id": student_id,
+            "full_name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+            "faculty": rng.choice(FACULTIES),
+            "class_year": str(rng.randint(1, 4)),
+            "phone": f"08{rng.randrange(10**8):08d}",
+            "email": f"bench{student_id}@example.test",
+            "password": password,
+            "social_profiles": [
+                {"platform": platform, "profile_url": f"https://example.test/{platform.split()[0].lower()}/{student_id}"}
+                for platform in rng.sample(PLATFORMS, rng.randint(0, args.max_social))
+            ],
+        }
+
+
+def posts(args, rng):
+    images = sorted(f"/uploads/{os.path.basename(path)}" for path in glob.glob("uploads/bench-*.jpg"))
+    now = datetime.now().replace(microsecond=0)
+    for post_id in range(args.start_id, args.start_id + args.count):
+        item = rng.choice(ITEMS)
+        yield {
+            "post_id": post_id,
+            "student_id": args.start_id + rng.randrange(args.users),
+            "item_name": f"{rng.choice(COLOURS)} {item}",
+            "item_status": rng.choice(["lost", "found"]),
+            "place": rng.choice(PLACES),
+            "description": f"{item} " + " ".join(rng.choices(WORDS, k=rng.randint(8, 40))),
+            "created_at": (now - timedelta(seconds=rng.randrange(args.days * 86400))).isoformat(sep=" "),
+            "images": rng.sample(images, min(len(images), rng.randint(0, args.max_images))),
+        }
+
+
+def make_images(args, rng):
+    from PIL import Image
+
+    os.makedirs("uploads", exist_ok=True)
+    for n in range(args.count):
+        image = Image.new("RGB", (800, 600), tuple(rng.randrange(256) for _ in range(3)))
+        path = f"uploads/bench-{n}.jpg"
+        image.save(path, "JPEG", quality=80)
+        print(f"/{path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=("users", "posts", "images"))
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=1000, help="posts: authors are drawn from this many users")
+    parser.add_argument("--start-id", type=int, default=START_ID)
+    parser.add_argument("--max-social", type=int, default=3)
+    parser.add_argument("--max-images", type=int, default=3)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.kind == "images":
+        make_images(args, rng)
+        return
+    records = users(args, rng) if args.kind == "users" else posts(args, rng)
+    out = sys.stdout
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
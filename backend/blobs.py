@@ -0,0 +1,221 @@
+"""Content-addressed storage for uploaded files.
+
+Every upload is hashed (SHA-256) while it streams in (see ingest.py) and is
+stored once as uploads/<digest>.<ext>. Uploading a file we already have never
+writes it into the store: the caller just gets the existing URL back, and a
+small duplicate never even reaches the disk. Identical files also share one URL, which lets browsers and
+proxies reuse what they already cached.
+
+The blobs table counts references from post_images.image_url and
+users.profile_photo_url. Routes adjust the count with retain() / release() in
+the same transaction as the reference itself; collect_garbage() recomputes the
+counts from those two columns (catching rows removed by ON DELETE CASCADE) and
+deletes blobs nobody has referenced for GC_GRACE. The grace period covers the
+gap between /upload and the create-post request that attaches the file;
+uploading a duplicate of an unreferenced blob starts it over (created_at).
+
+Run `python blobs.py migrate` once to fold files uploaded under random names
+into the store, repointing every reference at the surviving copy.
+"""
+import hashlib
+import os
+from collections import Counter
+from datetime import timedelta
+
+import metrics
+from database import db_connection, transaction
+from ingest import ingest
+
+UPLOAD_DIR = "uploads"
+CHUNK_SIZE = 64 * 1024
+GC_GRACE = timedelta(hours=int(os.getenv("BLOB_GC_GRACE_HOURS", "24")))
+
+# Every column that may hold a blob URL
+REFERENCES = (("post_images", "image_url"), ("users", "profile_photo_url"))
+
+
+def _extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return ext if ext.isalnum() and len(ext) <= 10 else "bin"
+
+
+def blob_url(filename):
+    return f"/{UPLOAD_DIR}/{filename}"
+
+
+def blob_path(url):
+    """Filesystem path of a blob URL, or None for anything outside the upload directory."""
+    if not url or not url.startswith(f"/{UPLOAD_DIR}/"):
+        return None
+    return url.lstrip("/")
+
+
+async def store(upload):
+    """Ingest and store an UploadFile. Returns (url, created); created is False for a duplicate.
+
+    Raises ingest.UploadRejected for non-images and oversized files. No database
+    connection is held while the body streams in.
+    """
+    received = await ingest(upload, UPLOAD_DIR)
+    try:
+        async with transaction() as db:
+            # A duplicate of an unreferenced blob restarts its grace period, so garbage collection
+            # cannot delete it before the post or profile about to reference it is saved. If the
+            # collector deleted it first, the row is gone and the upload is stored as new.
+            await db.execute(
+                "UPDATE blobs SET created_at = CURRENT_TIMESTAMP WHERE sha256 = %s AND ref_count = 0",
+                (received.sha256,)
+            )
+            existing = await db.fetch_one("SELECT url FROM blobs WHERE sha256 = %s", (received.sha256,))
+        if existing:
+            path = blob_path(existing['url'])
+            if path and not os.path.exists(path):
+                # Its file went with a garbage collection that failed to commit
+                await received.commit(path)
+            metrics.upload_blobs.labels("duplicate").inc()
+            return existing['url'], False
+
+        filename = f"{received.sha256}.{received.extension}"
+        path = os.path.join(UPLOAD_DIR, filename)
+        if not os.path.exists(path):
+            await received.commit(path)
+    finally:
+        await received.discard()
+
+    url = blob_url(filename)
+    # A concurrent upload of the same bytes may have inserted first; its row points at the same file
+    async with transaction() as db:
+        await db.execute('''
+            INSERT IGNORE INTO blobs (sha256, url, size, content_type)
+            VALUES (%s, %s, %s, %s)
+        ''', (received.sha256, url, received.size, received.content_type))
+    metrics.upload_blobs.labels("new").inc()
+    return url, True
+
+
+async def _adjust(db, urls, sign):
+    counts = Counter(url for url in urls if url)
+    if counts:
+        await db.executemany(
+            "UPDATE blobs SET ref_count = GREATEST(ref_count + %s, 0) WHERE url = %s",
+            [(sign * n, url) for url, n in counts.items()]
+        )
+
+
+async def retain(db, urls):
+    """Count new references to these URLs (non-blob URLs are ignored)."""
+    await _adjust(db, urls, 1)
+
+
+async def release(db, urls):
+    await _adjust(db, urls, -1)
+
+
+def collect_garbage(cursor, now=None):
+    """Recount references and delete blobs unreferenced for longer than GC_GRACE.
+
+    Takes a dictionary cursor on a plain (sync) connection and returns the URLs
+    whose files should be removed. Remove them before committing: until then
+    the recount keeps every blob row locked, so a duplicate upload of a doomed
+    blob (store()) waits, finds the row gone and stores the file again.
+    """
+    counted = " + ".join(
+        f"(SELECT COUNT(*) FROM {table} r WHERE r.{column} = b.url)" for table, column in REFERENCES
+    )
+    cursor.execute(f"UPDATE blobs AS b SET ref_count = {counted}")
+
+    if now is None:
+        cursor.execute('''
+            SELECT url FROM blobs
+            WHERE ref_count = 0 AND created_at < CURRENT_TIMESTAMP - INTERVAL %s SECOND
+        ''', (int(GC_GRACE.total_seconds()),))
+    else:
+        cursor.execute("SELECT url FROM blobs WHERE ref_count = 0 AND created_at < %s", (now - GC_GRACE,))
+    urls = [row['url'] for row in cursor.fetchall()]
+    if not urls:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(urls))
+    cursor.execute(f"SELECT variant_url FROM image_variants WHERE source_url IN ({placeholders})", urls)
+    variants = [row['variant_url'] for row in cursor.fetchall()]
+    cursor.execute(f"DELETE FROM image_variants WHERE source_url IN ({placeholders})", urls)
+    cursor.execute(f"DELETE FROM blobs WHERE url IN ({placeholders})", urls)
+    return urls + variants
+
+
+def remove_files(urls):
+    for url in urls:
+        path = blob_path(url)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def migrate():
+    """Move legacy uploads into the store and point their references at one copy per content."""
+    canonical = {}   # sha256 -> url of the surviving copy
+    renamed = {}     # legacy url -> content-addressed url
+    derived = os.path.abspath(os.path.join(UPLOAD_DIR, "derived"))
+    for root, _dirs, files in os.walk(UPLOAD_DIR):
+        if os.path.abspath(root).startswith(derived):
+            continue
+        for name in files:
+            path = os.path.join(root, name)
+            url = "/" + path.replace(os.sep, "/")
+            sha256 = _file_sha256(path)
+            target = blob_url(f"{sha256}.{_extension(name)}")
+            if url == target:
+                canonical.setdefault(sha256, url)
+                continue
+            if sha256 not in canonical:
+                if not os.path.exists(blob_path(target)):
+                    os.replace(path, blob_path(target))
+                canonical[sha256] = target
+            renamed[url] = canonical[sha256]
+
+    with db_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.executemany('''
+                INSERT IGNORE INTO blobs (sha256, url, size) VALUES (%s, %s, %s)
+            ''', [(sha256, url, os.path.getsize(blob_path(url))) for sha256, url in canonical.items()])
+
+            stale_variants = []
+            if renamed:
+                moves = [(new, old) for old, new in renamed.items()]
+                for table, column in REFERENCES:
+                    cursor.executemany(f"UPDATE {table} SET {column} = %s WHERE {column} = %s", moves)
+
+                # Keep one set of derivatives per blob and drop the duplicates' sets
+                cursor.executemany("UPDATE IGNORE image_variants SET source_url = %s WHERE source_url = %s", moves)
+                placeholders = ", ".join(["%s"] * len(renamed))
+                cursor.execute(f"SELECT variant_url FROM image_variants WHERE source_url IN ({placeholders})",
+                               list(renamed))
+                stale_variants = [row['variant_url'] for row in cursor.fetchall()]
+                cursor.execute(f"DELETE FROM image_variants WHERE source_url IN ({placeholders})", list(renamed))
+
+            # Refresh ref counts; every blob was created just now, so none is collected
+            collect_garbage(cursor)
+            db.commit()
+        finally:
+            cursor.close()
+
+    # Only now that nothing points at them can the duplicate copies go
+    remove_files(renamed)
+    remove_files(stale_variants)
+    print(f"{len(canonical)} blobs, {len(renamed)} legacy files folded into them")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["migrate"]:
+        sys.exit("usage: python blobs.py migrate")
+    migrate()
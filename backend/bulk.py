@@ -0,0 +1,194 @@
+"""Bulk import and export of users and posts.
+
+    python bulk.py export users users.jsonl
+    python bulk.py export posts posts.csv
+    python bulk.py import users users.jsonl
+    python bulk.py import posts - < posts.jsonl      # "-" is stdin/stdout
+
+The format follows the file extension (.csv, otherwise JSON Lines) unless
+--format is given. Both directions stream: export pages through the table by
+primary key and import reads CHUNK_SIZE records at a time, so memory use does
+not grow with the file. Each import chunk is written by the batched writers
+in writers.py (one multi-row INSERT per table) inside its own transaction.
+A failing chunk is rolled back and stops the run; the chunks before it stay
+committed and the error names the records to resume from.
+
+Records
+  users  student_id, full_name, faculty, class_year, phone, email, password,
+         profile_photo_url, created_at, social_profiles [{platform, profile_url}]
+  posts  post_id, student_id, item_name, item_status, place, description,
+         created_at, images [url, ...]
+
+student_id / post_id are optional on import: given, they are kept (moving
+data between databases), missing, they are assigned. Exported passwords are
+the stored hashes, so treat user exports as secrets; plaintext passwords in an
+import are hashed in the password worker pool. In CSV the list columns hold
+JSON arrays. Image URLs are stored as given; the files themselves are not
+copied.
+
+Imported posts get their place_id from the place catalog (see places.py).
+A running app picks imported rows up in its search index and facet counts
+on the next rebuild (every 30 minutes) or restart.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+
+import passwords
+import writers
+from database import connection, get_pool, transaction
+from loaders import load_images, load_social_profiles
+
+ENTITIES = {
+    # entity: (table, id column, scalar fields, list field)
+    "users": ("users", "student_id", ("student_id",) + writers.USER_COLUMNS, "social_profiles"),
+    "posts": ("posts", "post_id", ("post_id",) + writers.POST_COLUMNS, "images"),
+}
+
+
+class Throughput:
+    """Rows-per-second progress on stderr."""
+
+    def __init__(self, label):
+        self.label = label
+        self.rows = 0
+        self.children = 0
+        self.started = time.perf_counter()
+
+    def add(self, rows, children=0):
+        self.rows += rows
+        self.children += children
+        elapsed = time.perf_counter() - self.started
+        print(f"\r{self.label}: {self.rows} rows, {self.rows / elapsed:,.0f} rows/s", end="", file=sys.stderr)
+
+    def done(self, child_label):
+        elapsed = time.perf_counter() - self.started
+        rate = self.rows / elapsed if elapsed else 0
+        print(f"\r{self.label}: {self.rows} rows (+{self.children} {child_label}) in {elapsed:.1f} s, "
+              f"{rate:,.0f} rows/s", file=sys.stderr)
+
+
+# ---------- formats ----------
+def _format(path, explicit):
+    return explicit or ("csv" if path.lower().endswith(".csv") else "jsonl")
+
+
+def _open(path, mode):
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def read_records(f, fmt, fields, list_field):
+    """Yield one dict per record; empty CSV cells become None."""
+    if fmt == "jsonl":
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+        return
+    for row in csv.DictReader(f):
+        record = {field: (row.get(field) or None) for field in fields}
+        record[list_field] = json.loads(row[list_field]) if row.get(list_field) else []
+        yield record
+
+
+class RecordWriter:
+    def __init__(self, f, fmt, fields, list_field):
+        self.f, self.fmt, self.list_field = f, fmt, list_field
+        if fmt == "csv":
+            self.csv = csv.DictWriter(f, fieldnames=fields + (list_field,))
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.fmt == "jsonl":
+            self.f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        else:
+            self.csv.writerow(dict(record, **{self.list_field: json.dumps(record[self.list_field],
+                                                                           ensure_ascii=False)}))
+
+
+# ---------- export ----------
+async def export(entity, f, fmt, chunk_size):
+    table, id_column, fields, list_field = ENTITIES[entity]
+    out = RecordWriter(f, fmt, fields, list_field)
+    progress = Throughput(f"export {entity}")
+    last_id = 0
+    while True:
+        async with connection() as db:
+            # Keyset pagination on the primary key: each chunk is an index range scan
+            rows = await db.fetch_all(f'''
+                SELECT {", ".join(fields)} FROM {table}
+                WHERE {id_column} > %s ORDER BY {id_column} LIMIT %s
+            ''', (last_id, chunk_size))
+            if not rows:
+                break
+            ids = [row[id_column] for row in rows]
+            if entity == "users":
+                children = await load_social_profiles(db, ids)
+            else:
+                children = await load_images(db, ids)
+        for row in rows:
+            row[list_field] = children.get(row[id_column], [])
+            out.write(row)
+        last_id = ids[-1]
+        progress.add(len(rows), sum(len(c) for c in children.values()))
+    progress.done(list_field)
+
+
+# ---------- import ----------
+async def _hash_plaintext(users):
+    async def prepared(user):
+        if not passwords.is_hashed(user.get('password')):
+            user['password'] = await passwords.hash_password(user.get('password') or "")
+        return user
+    # Concurrent, but never more than HASH_WORKERS hashes at once (see passwords.py)
+    return await asyncio.gather(*(prepared(user) for user in users))
+
+
+async def import_(entity, f, fmt, chunk_size):
+    _table, _id_column, fields, list_field = ENTITIES[entity]
+    progress = Throughput(f"import {entity}")
+    first = 1
+    for chunk in writers.chunked(read_records(f, fmt, fields, list_field), chunk_size):
+        try:
+            if entity == "users":
+                chunk = await _hash_plaintext(chunk)
+            async with transaction() as db:
+                if entity == "users":
+                    await writers.insert_users(db, chunk)
+                else:
+                    await writers.insert_posts(db, chunk)
+        except Exception as e:
+            progress.done(list_field)
+            sys.exit(f"Records {first}-{first + len(chunk) - 1} failed and were rolled back: {e}\n"
+                     f"Records before {first} are committed.")
+        progress.add(len(chunk), sum(len(record.get(list_field) or []) for record in chunk))
+        first += len(chunk)
+    progress.done(list_field)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("entity", choices=tuple(ENTITIES))
+    parser.add_argument("path", help='file to read or write, "-" for stdin/stdout')
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--chunk", type=int, default=writers.CHUNK_SIZE, help="records per transaction")
+    args = parser.parse_args(argv)
+
+    fmt = _format(args.path, args.format)
+    run = export if args.command == "export" else import_
+    f = _open(args.path, "w" if args.command == "export" else "r")
+    try:
+        asyncio.run(run(args.entity, f, fmt, args.chunk))
+    finally:
+        if f not in (sys.stdin, sys.stdout):
+            f.close()
+        get_pool().close_all()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,273 @@
+"""In-process caches for hot read paths.
+
+FeedCache sits in front of GET /posts. Entries are keyed by the normalized
+(item_status, search, cursor, limit, place, faculty, date) arguments, expire after a TTL and are
+evicted least-recently-used. Writes invalidate only the entries they can
+affect.
+
+EntityCache holds single rows shared across routes (a user's contact card, a
+post's detail) under a memory budget, evicting least-recently-used entries
+once the estimated size of the cached values exceeds it.
+
+SessionCache maps session token hashes to their (student_id, expires_at), so
+authenticated requests reach the sessions table only on a miss. Its short TTL
+bounds how long a session revoked by another worker keeps working here.
+
+Both coalesce concurrent misses on the same key into one database load.
+Cached values are (body, etag) pairs so a hit can answer a conditional request
+without touching the database or serializing anything.
+"""
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", "512"))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "30"))
+ENTITY_CACHE_BYTES = int(os.getenv("ENTITY_CACHE_BYTES", str(8 * 1024 * 1024)))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "300"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))
+
+_RETRY = object()   # result handed to coalesced callers when the load they waited on was cancelled
+
+
+def feed_key(item_status=None, search=None, cursor=None, limit=None, place=None, faculty=None, date=None):
+    """Normalize GET /posts arguments so equivalent requests share an entry."""
+    search = " ".join(search.lower().split()) if search else None
+    return (item_status or None, search or None, cursor or None, limit, place, faculty or None, date or None)
+
+
+def estimate_size(value):
+    """Rough in-memory footprint of a JSON-like value, in bytes."""
+    return len(json.dumps(value, default=str)) * 2
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "size", "post_ids", "author_ids")
+
+    def __init__(self, value, expires, size=0):
+        self.value = value
+        self.expires = expires
+        self.size = size
+
+
+class _ReadThroughCache:
+    """LRU + TTL map with single-flight loading and predicate-based invalidation."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> _Entry, least recently used first
+        self._inflight = {}             # key -> asyncio.Future shared by coalesced misses
+        self._lock = threading.Lock()   # the expiry job invalidates from the scheduler thread
+        self._generation = 0            # bumped by every invalidation
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "invalidations": 0}
+
+    # ---------- storage (called with the lock held) ----------
+    def _make_entry(self, value):
+        return _Entry(value, time.monotonic() + self.ttl)
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+
+    def _remove(self, key):
+        return self._entries.pop(key)
+
+    def _over_limit(self):
+        return False
+
+    def _store(self, key, value, generation):
+        entry = self._make_entry(value)
+        with self._lock:
+            # An invalidation landed while we were loading; the value may already be stale
+            if generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, entry)
+            while self._entries and self._over_limit():
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    # ---------- reads ----------
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    async def get_or_load(self, key, load):
+        """Return the cached value for key, or await load() once for all concurrent callers.
+
+        Values are shared between callers and must not be mutated. A load that
+        returns None is not cached. load() runs in its own task, so a caller
+        that goes away (client disconnect) cancels neither the load nor the
+        callers coalesced onto it. Errors raised by load() reach every caller;
+        if the load task itself is cancelled, the waiting callers load again.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self._stats["hits"] += 1
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self._stats["coalesced"] += 1
+            value = await asyncio.shield(inflight)
+            if value is not _RETRY:
+                return value
+
+        self._stats["misses"] += 1
+        shared = asyncio.get_running_loop().create_future()
+        self._inflight[key] = shared
+        task = asyncio.ensure_future(load())
+        task.add_done_callback(functools.partial(self._loaded, key, shared, self._generation))
+        return await asyncio.shield(task)
+
+    def _loaded(self, key, shared, generation, task):
+        """Settle the future coalesced callers wait on; never with a CancelledError."""
+        if self._inflight.get(key) is shared:
+            del self._inflight[key]
+        if task.cancelled():
+            shared.set_result(_RETRY)
+            return
+        error = task.exception()
+        if error is not None:
+            shared.set_exception(error)
+            # Nobody may be waiting on the shared future; don't warn about its exception
+            shared.exception()
+            return
+        value = task.result()
+        if value is not None:
+            self._store(key, value, generation)
+        shared.set_result(value)
+
+    # ---------- invalidation ----------
+    def _drop(self, predicate):
+        with self._lock:
+            self._generation += 1
+            # Loads that started before the write must not be joined by requests that come after it
+            # (the writer's own reload included); they still answer the callers already waiting on them
+            self._inflight.clear()
+            stale = [key for key, entry in self._entries.items() if predicate(key, entry)]
+            for key in stale:
+                self._remove(key)
+            self._stats["invalidations"] += len(stale)
+
+    def invalidate(self, *keys):
+        keys = set(keys)
+        self._drop(lambda key, entry: key in keys)
+
+    def clear(self):
+        self._drop(lambda key, entry: True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), inflight=len(self._inflight), ttl=self.ttl)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class FeedCache(_ReadThroughCache):
+    def __init__(self, max_entries=FEED_CACHE_SIZE, ttl=FEED_CACHE_TTL):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+
+    def _make_entry(self, value):
+        entry = super()._make_entry(value)
+        page, _etag = value
+        entry.post_ids = {post['post_id'] for post in page['posts']}
+        entry.author_ids = {post['student_id'] for post in page['posts']}
+        return entry
+
+    def _over_limit(self):
+        return len(self._entries) > self.max_entries
+
+    def post_created(self, item_status):
+        """A new post is the newest of its status: only first pages and searches can show it."""
+        self._drop(lambda key, entry: key[0] in (None, item_status) and (key[1] is not None or key[2] is None))
+
+    def posts_changed(self, post_ids):
+        """Posts were deleted or expired. Keyset pages that did not contain them are unaffected."""
+        post_ids = set(post_ids)
+        self._drop(lambda key, entry: not entry.post_ids.isdisjoint(post_ids))
+
+    def post_updated(self, post_id, new_status=None, text_changed=False, place_changed=False):
+        """An edited post. Pages holding it are dropped; so are views it may have just joined.
+
+        Moving into lost/found can add it to any page of the unfiltered feed or of
+        that status, a text change can add it to any search result, and a new
+        place to any page filtered by place.
+        """
+        def affected(key, entry):
+            return (post_id in entry.post_ids
+                    or new_status in ("lost", "found") and key[0] in (None, new_status)
+                    or text_changed and key[1] is not None
+                    or place_changed and key[4] is not None)
+        self._drop(affected)
+
+    def author_changed(self, student_id, faculty_changed=False, name_changed=False):
+        """A changed author. With a new faculty their posts may join any page filtered by faculty;
+        with a new name (indexed as author text) they may join or leave any search result."""
+        def affected(key, entry):
+            return (student_id in entry.author_ids
+                    or faculty_changed and key[5] is not None
+                    or name_changed and key[1] is not None)
+        self._drop(affected)
+
+    def stats(self):
+        return dict(super().stats(), max_entries=self.max_entries)
+
+
+class EntityCache(_ReadThroughCache):
+    def __init__(self, max_bytes=ENTITY_CACHE_BYTES, ttl=ENTITY_CACHE_TTL):
+        super().__init__(ttl)
+        self.max_bytes = max_bytes
+        self._bytes = 0
+
+    def _make_entry(self, value):
+        return _Entry(value, time.monotonic() + self.ttl, estimate_size(value))
+
+    def _insert(self, key, entry):
+        super()._insert(key, entry)
+        self._bytes += entry.size
+
+    def _remove(self, key):
+        entry = super()._remove(key)
+        self._bytes -= entry.size
+        return entry
+
+    def _over_limit(self):
+        return self._bytes > self.max_bytes
+
+    def stats(self):
+        return dict(super().stats(), bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+class SessionCache(_ReadThroughCache):
+    def __init__(self, max_entries=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+
+    def _over_limit(self):
+        return len(self._entries) > self.max_entries
+
+    def stats(self):
+        return dict(super().stats(), max_entries=self.max_entries)
+
+
+feed_cache = FeedCache()
+user_cards = EntityCache()    # student_id -> (user row + social_profiles, etag)
+post_details = EntityCache()  # post_id -> (post row + images, etag)
+session_cache = SessionCache()  # sha256(token) -> (student_id, expires_at)
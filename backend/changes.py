@@ -0,0 +1,115 @@
+"""Delta sync for GET /posts/changes.
+
+A client that keeps a local copy of the board asks for what changed since
+its last sync token instead of downloading every active post again:
+
+  changes  posts created or updated since the token, in any status, with the
+           same fields as a GET /posts item; ones that are no longer lost or
+           found (returned, claimed, expired) should leave the board
+  deleted  ids of posts deleted since the token (tombstones)
+
+Changes are read in (updated_at, post_id) order from idx_posts_updated and
+tombstones in (deleted_at, post_id) order from post_tombstones. The token is
+the keyset position reached in both. Rows are only returned once they are
+older than SETTLE_SECONDS (the horizon), so a transaction that stamped
+updated_at but committed a moment later is not skipped by a token that has
+already moved past it. When more than `limit` rows are pending the response
+has has_more set; the client asks again with the new token.
+
+Expiry updates the post's status, so expired posts arrive as changes, and the
+engine writes tombstones for the posts it purges. Tombstones are kept for
+TOMBSTONE_DAYS; a token older than that gets 410 and the client reloads the
+whole board. Author fields (name, photo) are as of the post's last change.
+"""
+import os
+from datetime import datetime
+
+from loaders import attach_authors, attach_images, columns, FEED_AUTHOR_COLUMNS, POST_SUMMARY_COLUMNS
+from pagination import decode_cursor, encode_cursor
+
+SETTLE_SECONDS = int(os.getenv("CHANGES_SETTLE_SECONDS", "5"))
+TOMBSTONE_DAYS = int(os.getenv("TOMBSTONE_DAYS", "7"))
+MAX_CHANGES = 500
+
+
+class TokenExpired(Exception):
+    """The token predates the tombstones still kept; the client must reload everything."""
+
+
+async def record_tombstones(db, post_ids):
+    """Log deleted posts, on the deleting transaction's connection."""
+    if post_ids:
+        await db.executemany('''
+            REPLACE INTO post_tombstones (post_id, deleted_at) VALUES (%s, CURRENT_TIMESTAMP)
+        ''', [(post_id,) for post_id in post_ids])
+
+
+async def prune_tombstones(db):
+    result = await db.execute(
+        "DELETE FROM post_tombstones WHERE deleted_at < CURRENT_TIMESTAMP - INTERVAL %s DAY", (TOMBSTONE_DAYS,)
+    )
+    return result.rowcount
+
+
+def _decode(token):
+    changed_at, post_id, deleted_at, deleted_id = decode_cursor(token, datetime, int, datetime, int)
+    return (changed_at, post_id), (deleted_at, deleted_id)
+
+
+async def load_changes(db, token=None, limit=MAX_CHANGES):
+    """{"changes", "deleted", "next", "has_more"} since token (or since now, for a first sync)."""
+    if not token:
+        row = await db.fetch_one("SELECT CURRENT_TIMESTAMP - INTERVAL %s SECOND AS horizon", (SETTLE_SECONDS,))
+        # Nothing to send yet: the client has just loaded the board, and the
+        # last few seconds are picked up by its next sync
+        start = (row['horizon'], 0)
+        return {"changes": [], "deleted": [], "next": encode_cursor(*start, *start), "has_more": False}
+
+    after_change, after_delete = _decode(token)
+    # Compared in SQL: SQLite hands back computed timestamps as text
+    row = await db.fetch_one('''
+        SELECT CURRENT_TIMESTAMP - INTERVAL %s SECOND AS horizon,
+               %s < CURRENT_TIMESTAMP - INTERVAL %s DAY AS expired
+    ''', (SETTLE_SECONDS, after_delete[0], TOMBSTONE_DAYS))
+    if row['expired']:
+        raise TokenExpired()
+    horizon = row['horizon']
+
+    posts = await db.fetch_all(f'''
+        SELECT {columns("p", POST_SUMMARY_COLUMNS)}
+        FROM posts p
+        WHERE (p.updated_at > %s OR (p.updated_at = %s AND p.post_id > %s))
+        AND p.updated_at < %s
+        ORDER BY p.updated_at, p.post_id
+        LIMIT %s
+    ''', (after_change[0], after_change[0], after_change[1], horizon, limit + 1))
+    tombstones = await db.fetch_all('''
+        SELECT post_id, deleted_at FROM post_tombstones
+        WHERE (deleted_at > %s OR (deleted_at = %s AND post_id > %s))
+        AND deleted_at < %s
+        ORDER BY deleted_at, post_id
+        LIMIT %s
+    ''', (after_delete[0], after_delete[0], after_delete[1], horizon, limit + 1))
+
+    # A stream that was read to the horizon moves its position up to it, so quiet
+    # periods (no deletions for a week) never make a token look expired
+    has_more = len(posts) > limit or len(tombstones) > limit
+    if len(posts) > limit:
+        posts = posts[:limit]
+        after_change = (posts[-1]['updated_at'], posts[-1]['post_id'])
+    else:
+        after_change = (horizon, 0)
+    if len(tombstones) > limit:
+        tombstones = tombstones[:limit]
+        after_delete = (tombstones[-1]['deleted_at'], tombstones[-1]['post_id'])
+    else:
+        after_delete = (horizon, 0)
+
+    await attach_authors(db, posts, FEED_AUTHOR_COLUMNS)
+    await attach_images(db, posts)
+    return {
+        "changes": posts,
+        "deleted": [row['post_id'] for row in tombstones],
+        "next": encode_cursor(*after_change, *after_delete),
+        "has_more": has_more,
+    }
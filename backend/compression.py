@@ -0,0 +1,98 @@
+"""Negotiated gzip/brotli compression for API responses.
+
+Compresses complete response bodies of at least MINIMUM_SIZE bytes with the
+best coding the client accepts: brotli when the optional brotli package is
+installed and the client sends `br`, gzip otherwise. Levels are kept low
+(brotli 4, gzip 5): these bodies are compressed on every request, unlike the
+static assets, which are precompressed at maximum level once (see assets.py).
+
+Left untouched:
+  * responses that already carry a Content-Encoding (precompressed assets);
+  * streamed responses sent in several body messages (e.g. server-sent
+    events), which must reach the client as they are produced;
+  * media types that do not compress (images, already-compressed data).
+"""
+import gzip
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+MINIMUM_SIZE = 1024
+OFFLOAD_SIZE = 256 * 1024   # zlib/brotli release the GIL; big bodies compress off the event loop
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding):
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, coding):
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        coding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if coding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def compressing_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Hold the headers until we know whether the body is compressed
+                start = message
+                return
+            if start is None:
+                return await send(message)
+
+            held, start = start, None
+            body = message.get("body", b"")
+            response_headers = [(k.lower(), v) for k, v in held["headers"]]
+            content_type = next((v for k, v in response_headers if k == b"content-type"), b"").decode("latin-1")
+            if (message.get("more_body")
+                    or len(body) < self.minimum_size
+                    or any(k == b"content-encoding" for k, _ in response_headers)
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                await send(held)
+                return await send(message)
+
+            if len(body) >= OFFLOAD_SIZE:
+                compressed = await run_in_threadpool(compress, body, coding)
+            else:
+                compressed = compress(body, coding)
+            vary = [v for k, v in response_headers if k == b"vary"]
+            if not any(b"accept-encoding" in v.lower() for v in vary):
+                vary.append(b"Accept-Encoding")
+            response_headers = [(k, v) for k, v in response_headers if k not in (b"content-length", b"vary")]
+            response_headers += [
+                (b"content-encoding", coding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join(vary)),
+            ]
+            await send({**held, "headers": response_headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
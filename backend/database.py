@@ -1,172 +1,442 @@
 import mysql.connector
 from mysql.connector import Error
+import asyncio
 import os
+import sqlite3
+import threading
+import time
+import traceback
+import weakref
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+import profiler
+
+# ========== CONNECTION SETTINGS ==========
+# DB_BACKEND picks the storage: "mysql" (the default) or "sqlite" (see sqlite_backend.py),
+# a single file at DB_PATH for single-node installs and CI.
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+DB_PATH = os.getenv("DB_PATH", "lost_found.db")
+
+# MySQL values can be overridden with the DB_* variables set in docker-compose.yml
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "lnfdbinstance.c20rmtyx8ttq.us-east-1.rds.amazonaws.com"),
+    "user": os.getenv("DB_USER", "admin"),
+    "password": os.getenv("DB_PASSWORD", "LnF-password"),
+    "database": os.getenv("DB_NAME", "lnfdbinstance"),
+    "port": int(os.getenv("DB_PORT", "3306")),
+    # auth_plugin='mysql_native_password'
+}
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))      # seconds to wait for a free connection
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))   # recycle connections older than this
+POOL_LEAK_THRESHOLD = float(os.getenv("DB_POOL_LEAK_THRESHOLD", "60")) # report checkouts held longer than this
+POOL_WARM = int(os.getenv("DB_POOL_WARM", "2"))                           # connections opened at startup
+
+if DB_BACKEND not in ("mysql", "sqlite"):
+    raise RuntimeError(f"Unknown DB_BACKEND {DB_BACKEND!r}: use mysql or sqlite")
+
+# What either driver raises; catch this rather than mysql.connector.Error
+DB_ERRORS = (Error, sqlite3.Error)
+
+
+class PoolTimeout(Error):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class PooledConnection:
+    """A borrowed connection. close() hands it back to the pool instead of disconnecting."""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._checked_out_at = time.monotonic()
+        self._stack = traceback.format_stack(limit=8)[:-2]
+        # If a route forgets to close us, give the raw connection back when we are collected
+        self._finalizer = weakref.finalize(self, pool._reclaim, id(self), raw, created_at)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise Error("Connection has already been returned to the pool")
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        self._finalizer.detach()
+        self._pool._release(id(self), raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Fixed-size pool of database connections with checkout validation, max lifetime and leak tracking."""
+
+    def __init__(self, connect, size=POOL_SIZE, timeout=POOL_CHECKOUT_TIMEOUT,
+                 max_lifetime=POOL_MAX_LIFETIME, leak_threshold=POOL_LEAK_THRESHOLD):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.leak_threshold = leak_threshold
+
+        self._lock = threading.Condition()
+        self._idle = []        # [(raw, created_at)]
+        self._open = 0         # raw connections currently alive (idle + in use)
+        self._in_use = {}      # id(PooledConnection) -> weakref to it
+        self._waiting = 0
+
+        self._counters = {
+            "checkouts": 0,
+            "connects": 0,
+            "recycled": 0,
+            "validation_failures": 0,
+            "timeouts": 0,
+            "leaks_reclaimed": 0,
+            "wait_count": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    # ---------- checkout / return ----------
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        with self._lock:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    raw = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {timeout:.1f}s "
+                                      f"({self.size} in use)")
+                waited = True
+                self._waiting += 1
+                try:
+                    self._lock.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            wait_time = time.monotonic() - started
+            if waited:
+                self._counters["wait_count"] += 1
+                self._counters["wait_time_total"] += wait_time
+                self._counters["wait_time_max"] = max(self._counters["wait_time_max"], wait_time)
+
+        metrics.db_checkout_wait.observe(wait_time)
+
+        # Connecting and validating happen outside the lock so other threads are not held up
+        try:
+            if raw is not None and not self._usable(raw, created_at):
+                raw = None
+            if raw is None:
+                connect_started = time.monotonic()
+                raw = self._connect()
+                created_at = time.monotonic()
+                metrics.db_connect.observe(created_at - connect_started)
+                with self._lock:
+                    self._counters["connects"] += 1
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+            raise
+
+        conn = PooledConnection(self, raw, created_at)
+        with self._lock:
+            self._in_use[id(conn)] = weakref.ref(conn)
+            self._counters["checkouts"] += 1
+        return conn
+
+    def _usable(self, raw, created_at):
+        """Drop connections past their lifetime and make sure the rest still answer."""
+        if time.monotonic() - created_at > self.max_lifetime:
+            self._discard(raw)
+            with self._lock:
+                self._counters["recycled"] += 1
+            return False
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except DB_ERRORS:
+            self._discard(raw)
+            with self._lock:
+                self._counters["validation_failures"] += 1
+            return False
+
+    def _release(self, conn_id, raw, created_at):
+        # Never hand the next borrower an open transaction
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+            keep = raw.is_connected() and time.monotonic() - created_at <= self.max_lifetime
+        except DB_ERRORS:
+            keep = False
+        if not keep:
+            self._discard(raw)
+
+        with self._lock:
+            self._in_use.pop(conn_id, None)
+            if keep:
+                self._idle.append((raw, created_at))
+            else:
+                self._open -= 1
+            self._lock.notify()
+
+    def _reclaim(self, conn_id, raw, created_at):
+        print("⚠️ Pooled connection was garbage collected without close(); returning it to the pool")
+        with self._lock:
+            self._counters["leaks_reclaimed"] += 1
+        self._release(conn_id, raw, created_at)
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except DB_ERRORS:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block, rolling back on errors."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except DB_ERRORS:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    # ---------- monitoring ----------
+    def leaks(self):
+        """Connections checked out for longer than the leak threshold, with where they were taken."""
+        now = time.monotonic()
+        with self._lock:
+            borrowed = [ref() for ref in self._in_use.values()]
+        found = []
+        for conn in borrowed:
+            if conn is None:
+                continue
+            held_for = now - conn._checked_out_at
+            if held_for > self.leak_threshold:
+                found.append({"held_seconds": round(held_for, 1), "checked_out_at": "".join(conn._stack)})
+        return found
+
+    def report_leaks(self):
+        for leak in self.leaks():
+            print(f"⚠️ Database connection held for {leak['held_seconds']}s without being returned:\n"
+                  f"{leak['checked_out_at']}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+            })
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["wait_count"] if stats["wait_count"] else 0.0
+        stats["leaked"] = len(self.leaks())
+        return stats
+
+    def warm(self, count):
+        """Open up to count connections ahead of the first requests."""
+        conns = []
+        try:
+            for _ in range(min(count, self.size)):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                conn.close()
+        return len(conns)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw, _ in idle:
+            self._discard(raw)
+
+
+def _connect():
+    if DB_BACKEND == "sqlite":
+        import sqlite_backend
+        return sqlite_backend.connect(DB_PATH)
+    return mysql.connector.connect(**DB_CONFIG)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_connect)
+    return _pool
+
 
 def get_db():
-    """Create a database connection for standard API operations."""
+    """Borrow a pooled database connection for standard API operations. Call close() to return it."""
     try:
-        connection = mysql.connector.connect(
-            host="lnfdbinstance.c20rmtyx8ttq.us-east-1.rds.amazonaws.com",
-            user="admin",
-            password="LnF-password",
-            database="lnfdbinstance",
-            port=3306,
-<<<<<<< HEAD
-=======
-
->>>>>>> pim-ing
-            # auth_plugin='mysql_native_password'
-        )
-        print("✅ Database connection established.")
-        return connection
-    except Error as e:
+        return get_pool().acquire()
+    except DB_ERRORS as e:
         print(f"Database connection failed: {e}")
         return None
 
-def init_database():
-    """Initialize database and tables."""
-    # Initialize conn and cursor to None to prevent UnboundLocalError 
-    # if the initial connection fails. (FIXED PYTHON ERROR)
-    conn = None
-    cursor = None
-    
+
+@contextmanager
+def db_connection():
+    """Context-manager form of get_db(): the connection always goes back to the pool."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+# ========== ASYNC ACCESS ==========
+# mysql-connector-python 8.1 has no asyncio driver, so every blocking driver call is
+# run on a dedicated thread pool and awaited. The gate keeps at most POOL_SIZE
+# coroutines waiting inside acquire(), so the executor always has a thread free for
+# connections that are already checked out and need to run their queries. With SQLite
+# up to POOL_SIZE - 1 of those may also be blocked waiting for the writer, so the
+# one holding it needs that many more threads to be sure of getting one.
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE + 2 + (POOL_SIZE if DB_BACKEND == "sqlite" else 0),
+                               thread_name_prefix="db")
+_checkout_gate = asyncio.Semaphore(POOL_SIZE)
+
+ExecResult = namedtuple("ExecResult", ["rowcount", "lastrowid"])
+
+
+async def _in_executor(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+class AsyncConnection:
+    """Awaitable view of a pooled connection. Rows come back as dicts keyed by column name."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _run_sync(self, sql, params, many, fetch, profile):
+        operation = "fetch" if fetch else "executemany" if many else "execute"
+        started = time.perf_counter()
+        cursor = self._conn.cursor()
+        try:
+            if many:
+                cursor.executemany(sql, params)
+            else:
+                cursor.execute(sql, params or ())
+            if not fetch:
+                return ExecResult(cursor.rowcount, cursor.lastrowid)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except DB_ERRORS:
+            metrics.db_errors.labels(operation).inc()
+            raise
+        finally:
+            cursor.close()
+            elapsed = time.perf_counter() - started
+            metrics.db_query.labels(operation).observe(elapsed)
+            if profile is not None:
+                profile.record(self._conn, sql, params, many, elapsed)
+
+    async def fetch_all(self, sql, params=None):
+        return await _in_executor(self._run_sync, sql, params, False, True, profiler.current())
+
+    async def fetch_one(self, sql, params=None):
+        rows = await self.fetch_all(sql, params)
+        return rows[0] if rows else None
+
+    async def execute(self, sql, params=None):
+        return await _in_executor(self._run_sync, sql, params, False, False, profiler.current())
+
+    async def executemany(self, sql, seq_of_params):
+        return await _in_executor(self._run_sync, sql, seq_of_params, True, False, profiler.current())
+
+    async def commit(self):
+        await _in_executor(self._conn.commit)
+
+    async def rollback(self):
+        await _in_executor(self._conn.rollback)
+
+
+@asynccontextmanager
+async def connection():
+    """Borrow a pooled connection without blocking the event loop."""
+    async with _checkout_gate:
+        checkout = asyncio.ensure_future(_in_executor(get_pool().acquire))
+        try:
+            conn = await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            # The thread may still hand us a connection after we were cancelled
+            checkout.add_done_callback(lambda f: f.cancelled() or f.exception() or f.result().close())
+            raise
+        try:
+            yield AsyncConnection(conn)
+        finally:
+            # Returning the connection may roll back, which is a network round-trip
+            await _in_executor(conn.close)
+
+
+@asynccontextmanager
+async def transaction():
+    """Borrow a connection and commit when the block exits cleanly, rolling back otherwise."""
+    async with connection() as db:
+        try:
+            yield db
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+
+
+@asynccontextmanager
+async def savepoint(db, name):
+    """Undo just this block's statements if it raises a database error, keeping the rest of the transaction."""
+    await db.execute(f"SAVEPOINT {name}")
     try:
-        # First connect without specifying the database to create it
-        conn = mysql.connector.connect(
-            host="lnfdbinstance.c20rmtyx8ttq.us-east-1.rds.amazonaws.com",
-            user="admin",
-            password="LnF-password",
-            port=3306,
-        )
-        cursor = conn.cursor()
-        
-        # Create database if not exists
-        cursor.execute("CREATE DATABASE IF NOT EXISTS lnfdbinstance")
-        cursor.execute("USE lnfdbinstance")
-        
-        # --- Create 'users' table (Must be created before 'user_social_profiles') ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                student_id INT AUTO_INCREMENT NOT NULL PRIMARY KEY,
-                full_name VARCHAR(255) NOT NULL,
-                faculty ENUM(
-                    'School of Engineering',
-                    'School of Architecture, Art, and Design',
-                    'School of Industrial Education and Technology',
-                    'School of Agricultural Technology',
-                    'School of Science',
-                    'School of Food Industry',
-                    'School of Information Technology',
-                    'International College',
-                    'College of Materials Innovation and Technology',
-                    'College of Advanced Manufacturing Innovation',
-                    'KMITL Business School',
-                    'International Academy of Aviation Industry',
-                    'School of Liberal Arts',
-                    'Faculty of Medicine',
-                    'College of Innovation and Industrial Management',
-                    'Institute of Music Science and Engineering',
-                    'School of Dentistry',
-                    'School of Nursing Science',
-                    'School of Integrated Innovative Technology'
-                ) NOT NULL,
-                class_year ENUM('1', '2', '3', '4', '5', '6') NOT NULL,
-                phone VARCHAR(20) NOT NULL,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                profile_photo_url VARCHAR(255),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB
-        ''')
-        
-        # --- Create 'social_profiles' table (Must be created before 'user_social_profiles') ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS social_profiles (
-                contact_id INT AUTO_INCREMENT PRIMARY KEY,
-                platform ENUM('Facebook', 'Instagram', 'LINE', 'Twitter / X', 'Discord', 'Other') NOT NULL,
-                profile_url VARCHAR(255) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB
-        ''')
-        
-        # --- Create 'user_social_profiles' junction table (Many-to-Many link) ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_social_profiles (
-                user_social_id INT AUTO_INCREMENT PRIMARY KEY,
-                student_id INT NOT NULL,
-                contact_id INT NOT NULL,
-                -- Ensures a user can't have the same link defined twice
-                UNIQUE KEY unique_user_contact (student_id, contact_id), 
-                FOREIGN KEY (student_id) REFERENCES users(student_id) ON DELETE CASCADE,
-                FOREIGN KEY (contact_id) REFERENCES social_profiles(contact_id) ON DELETE CASCADE
-            ) ENGINE=InnoDB
-        ''')
-
-        # --- Create 'posts' table ---
-        # FIXED: expires_at is now a Generated Column for reliability (MySQL 5.7+ required)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS posts (
-                post_id INT AUTO_INCREMENT PRIMARY KEY,
-                student_id INT NOT NULL,
-                item_name VARCHAR(100) NOT NULL,
-                item_status ENUM('lost', 'found', 'returned', 'claimed', 'expired') DEFAULT 'lost',
-                place VARCHAR(100) NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                -- Corrected to use GENERATED ALWAYS AS for calculation-based columns
-                expires_at DATETIME GENERATED ALWAYS AS (DATE_ADD(created_at, INTERVAL 30 DAY)) STORED,
-                FOREIGN KEY (student_id) REFERENCES users(student_id) ON DELETE CASCADE
-            ) ENGINE=InnoDB
-        ''')
-
-        # --- Create 'post_images' table ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS post_images (
-                post_image_id INT AUTO_INCREMENT PRIMARY KEY,
-                post_id INT NOT NULL,
-                image_url VARCHAR(255) NOT NULL,
-                image_order INT NOT NULL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (post_id) REFERENCES posts(post_id) ON DELETE CASCADE
-            ) ENGINE=InnoDB
-        ''')
-        
-        # --- Create event to automatically handle expired posts ---
-        # NOTE: This requires the MySQL      to be enabled on your server.
-        # Check if the event scheduler is enabled.
-        # cursor.execute("SET GLOBAL event_scheduler = ON") 
-        
-        # cursor.execute('''
-        #     CREATE EVENT IF NOT EXISTS auto_handle_expired_posts
-        #     ON SCHEDULE EVERY 1 DAY
-        #     DO
-        #     BEGIN
-        #         -- 1. Mark posts as 'expired' when the expiration date has passed
-        #         UPDATE posts 
-        #         SET item_status = 'expired' 
-        #         WHERE expires_at < NOW() 
-        #         AND item_status IN ('lost', 'found');
-                
-        #         -- 2. Delete posts marked 'expired' that have been expired for an additional 30 days
-        #         -- (This keeps expired posts visible for 30 days after the initial expiration)
-        #         DELETE FROM posts 
-        #         WHERE item_status = 'expired' 
-        #         AND expires_at < (NOW() - INTERVAL 30 DAY);
-        #     END
-        # ''')
-        
-        conn.commit()
-        print("✅ Database 'lost_found_system' initialized successfully!")
-        print("✅ All tables created with proper relationships!")
-        print("✅ Auto-expiration event created and enabled!")
-        
-    except Error as e:
-        print(f"Database initialization failed: {e}")
-    finally:
-        # Safely close cursor and connection 
-        if conn and conn.is_connected():
-            if cursor:
-                cursor.close()
-            conn.close()
+        yield db
+    except DB_ERRORS:
+        await db.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        raise
+    await db.execute(f"RELEASE SAVEPOINT {name}")
+
+
+async def fetch_all(sql, params=None):
+    async with connection() as db:
+        return await db.fetch_all(sql, params)
+
+
+async def fetch_one(sql, params=None):
+    async with connection() as db:
+        return await db.fetch_one(sql, params)
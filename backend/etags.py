@@ -0,0 +1,57 @@
+"""Version-based ETags and If-None-Match handling for the read endpoints.
+
+Tags are built from row versions rather than response bodies: a row's
+updated_at, plus the row count and highest id of its child table (images,
+social links), since child rows are only ever added or removed. Routes can
+therefore answer 304 from a cheap version query, or straight from a cache
+entry, without building or serializing the full response.
+"""
+import hashlib
+import json
+
+from fastapi import Response
+
+# Let browsers keep the body but revalidate on every use
+CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts):
+    digest = hashlib.blake2b(json.dumps(parts, default=str).encode(), digest_size=12).hexdigest()
+    # Weak: the same version may be sent gzip'd or not
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against our tag."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def set_etag(response, etag):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def user_etag(row):
+    return make_etag("user", row['student_id'], row['updated_at'], row['social_count'], row['social_last'])
+
+
+def post_etag(row):
+    return make_etag("post", row['post_id'], row['updated_at'], row['image_count'], row['image_last'])
+
+
+def feed_etag(page):
+    """Every post on a feed page with the versions of what is shown alongside it."""
+    return make_etag("feed", page.get('next_cursor'), [
+        (post['post_id'], post['updated_at'], post.get('images'), post.get('image_srcsets'),
+         post.get('full_name'), post.get('faculty'), post.get('profile_photo_url'))
+        for post in page['posts']
+    ])
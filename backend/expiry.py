@@ -0,0 +1,173 @@
+"""Post expiry and purge engine.
+
+Runs every few minutes instead of once a day, and works in small batches:
+
+  expire  lost/found posts whose expires_at has passed become 'expired'
+  purge   posts that have been expired for PURGE_AFTER are deleted along with
+          their post_images rows (the blob store drops the files once
+          nothing references them, see blobs.py) and logged as tombstones
+          for delta sync (see changes.py); old tombstones are pruned
+
+Each batch reads at most BATCH_SIZE ids from the (item_status, expires_at)
+prefix of idx_posts_status_expires_created, oldest first, with a plain
+consistent read (no locks), then changes exactly those rows by primary key in
+its own short transaction. A processed row leaves the range it was read from,
+so the next batch simply reads the range again. Row locks are held for one
+batch only, and create_post never waits on them: it inserts new rows and
+never touches the ones being expired.
+
+Expired posts are announced to live board subscribers (see feed_events.py).
+
+Per-run metrics are kept in ExpiryEngine.last_run and /api/expiry/stats.
+"""
+import os
+import time
+from datetime import datetime
+
+import blobs
+import changes
+from cache import feed_cache, post_details
+from database import connection, transaction
+from facets import facet_index
+from feed_events import feed_hub
+from matching import match_engine
+from search_index import search_index, index_writes
+
+BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "500"))
+MAX_BATCHES_PER_RUN = int(os.getenv("EXPIRY_MAX_BATCHES", "200"))   # the next run picks up the rest
+PURGE_AFTER_DAYS = int(os.getenv("EXPIRY_PURGE_AFTER_DAYS", "30"))
+INTERVAL_MINUTES = int(os.getenv("EXPIRY_INTERVAL_MINUTES", "5"))
+
+
+def _placeholders(ids):
+    return ", ".join(["%s"] * len(ids))
+
+
+class ExpiryEngine:
+    def __init__(self, batch_size=BATCH_SIZE, max_batches=MAX_BATCHES_PER_RUN, purge_after_days=PURGE_AFTER_DAYS):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.purge_after_days = purge_after_days
+        self.last_run = None
+        self.totals = {"runs": 0, "expired": 0, "purged": 0, "images_released": 0, "errors": 0}
+
+    async def _expire_batch(self, status):
+        async with connection() as db:
+            rows = await db.fetch_all('''
+                SELECT post_id FROM posts
+                WHERE item_status = %s AND expires_at < CURRENT_TIMESTAMP
+                ORDER BY expires_at, post_id
+                LIMIT %s
+            ''', (status, self.batch_size))
+        ids = [row['post_id'] for row in rows]
+        if not ids:
+            return [], 0
+
+        async with transaction() as db:
+            # Re-check the status: the owner may have marked it returned/claimed meanwhile
+            result = await db.execute(f'''
+                UPDATE posts SET item_status = 'expired'
+                WHERE post_id IN ({_placeholders(ids)}) AND item_status = %s
+            ''', (*ids, status))
+
+        for post_id in ids:
+            index_writes.post(post_id)
+            search_index.remove_post(post_id)
+            facet_index.remove_post(post_id)
+            match_engine.remove_post(post_id)
+        feed_cache.posts_changed(ids)
+        post_details.invalidate(*ids)
+        feed_hub.posts_removed(ids)
+        return ids, result.rowcount
+
+    async def _purge_batch(self):
+        async with connection() as db:
+            rows = await db.fetch_all('''
+                SELECT post_id FROM posts
+                WHERE item_status = 'expired' AND expires_at < CURRENT_TIMESTAMP - INTERVAL %s DAY
+                ORDER BY expires_at, post_id
+                LIMIT %s
+            ''', (self.purge_after_days, self.batch_size))
+        ids = [row['post_id'] for row in rows]
+        if not ids:
+            return [], 0, 0
+
+        async with transaction() as db:
+            # Re-check and lock: the owner may have moved a post back to lost/found meanwhile, and such a
+            # post must keep its images, its blob references and stay out of the tombstones
+            rows = await db.fetch_all(f'''
+                SELECT post_id FROM posts
+                WHERE post_id IN ({_placeholders(ids)})
+                AND item_status = 'expired' AND expires_at < CURRENT_TIMESTAMP - INTERVAL %s DAY
+                FOR UPDATE
+            ''', (*ids, self.purge_after_days))
+            ids = [row['post_id'] for row in rows]
+            if not ids:
+                return [], 0, 0
+            images = await db.fetch_all(
+                f"SELECT image_url FROM post_images WHERE post_id IN ({_placeholders(ids)})", ids
+            )
+            await db.execute(f"DELETE FROM post_images WHERE post_id IN ({_placeholders(ids)})", ids)
+            result = await db.execute(f"DELETE FROM posts WHERE post_id IN ({_placeholders(ids)})", ids)
+            await blobs.release(db, [row['image_url'] for row in images])
+            await changes.record_tombstones(db, ids)
+
+        post_details.invalidate(*ids)
+        return ids, result.rowcount, len(images)
+
+    async def run(self):
+        """One pass: expire, then purge, each in batches until done or max_batches is reached."""
+        started = time.perf_counter()
+        run = {"started_at": datetime.now().isoformat(timespec="seconds"), "expired": 0, "purged": 0,
+               "images_released": 0, "tombstones_pruned": 0, "batches": 0, "backlog_left": False,
+               "error": None}
+        try:
+            for status in ("lost", "found"):
+                while run["batches"] < self.max_batches:
+                    ids, changed = await self._expire_batch(status)
+                    if not ids:
+                        break
+                    run["batches"] += 1
+                    run["expired"] += changed
+                    if len(ids) < self.batch_size:
+                        break
+
+            while run["batches"] < self.max_batches:
+                ids, deleted, released = await self._purge_batch()
+                if not ids:
+                    break
+                run["batches"] += 1
+                run["purged"] += deleted
+                run["images_released"] += released
+                if len(ids) < self.batch_size:
+                    break
+            run["backlog_left"] = run["batches"] >= self.max_batches
+
+            async with transaction() as db:
+                run["tombstones_pruned"] = await changes.prune_tombstones(db)
+        except Exception as e:
+            # Batches committed so far stay committed; the next run carries on from there
+            run["error"] = str(e)
+            self.totals["errors"] += 1
+            print(f"Error in expiry run: {e}")
+
+        run["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.last_run = run
+        self.totals["runs"] += 1
+        for key in ("expired", "purged", "images_released"):
+            self.totals[key] += run[key]
+        if run["expired"] or run["purged"]:
+            print(f"✅ Expiry: {run['expired']} expired, {run['purged']} purged in {run['duration_ms']} ms")
+        return run
+
+    def stats(self):
+        return {
+            "batch_size": self.batch_size,
+            "purge_after_days": self.purge_after_days,
+            "interval_minutes": INTERVAL_MINUTES,
+            "last_run": self.last_run,
+            "totals": self.totals,
+        }
+
+
+expiry_engine = ExpiryEngine()
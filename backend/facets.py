@@ -0,0 +1,211 @@
+"""In-process facet counts for the public board.
+
+GET /posts filters by status, place (a place_id from the catalog, see
+places.py), author faculty and creation date bucket, and with facets=true
+returns how many active posts each value of each facet has. Counts never
+touch the posts table: like the search index, FacetIndex is loaded from the
+database at startup and on every rebuild, and the routes and the expiry
+engine keep it current as posts are created, edited, deleted and expired.
+
+Active posts are kept aggregated by (status, place_id, faculty, created
+date), so counting walks a few thousand combinations, not every post. Date
+buckets are relative to today and computed at query time:
+
+    today      created today
+    yesterday  created yesterday
+    week       created 2 to 6 days ago
+    older      created 7 or more days ago
+
+Counts are disjunctive: the counts of a facet apply every filter except that
+facet's own, so the other values of a facet in use show what switching to
+them would give. A post past its expiry counts until the expiry engine runs.
+Like the search index, the counts are per process; another worker's writes
+show up at its next rebuild.
+"""
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+FACET_LIMIT = int(os.getenv("FACET_LIMIT", "50"))   # values returned per facet, most frequent first
+
+FACETS = ("item_status", "place", "faculty", "date")
+STATUSES = ("lost", "found")
+DATE_BUCKETS = ("today", "yesterday", "week", "older")
+
+PLACES_QUERY = "SELECT place_id, name FROM places"
+
+
+def date_bucket(day, today):
+    age = (today - day).days
+    if age <= 0:
+        return "today"
+    if age == 1:
+        return "yesterday"
+    return "week" if age < 7 else "older"
+
+
+def bucket_range(bucket, now=None):
+    """(start, end) of created_at for a date bucket; either may be None for an open end."""
+    midnight = datetime.combine((now or datetime.now()).date(), datetime.min.time())
+    return {
+        "today": (midnight, None),
+        "yesterday": (midnight - timedelta(days=1), midnight),
+        "week": (midnight - timedelta(days=6), midnight - timedelta(days=1)),
+        "older": (None, midnight - timedelta(days=6)),
+    }[bucket]
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._posts = {}          # post_id -> (item_status, place_id, student_id, created date)
+        self._author_posts = {}   # student_id -> {post_id}
+        self._faculty = {}        # student_id -> faculty
+        self._place_names = {}    # place_id -> catalog name
+        self._combos = Counter()  # (item_status, place_id, faculty, created date) -> active posts
+        self.version = 0          # bumped by every change to the counts, for ETags
+        self.built_at = None
+
+    # ---------- maintenance ----------
+    def _combo(self, post):
+        item_status, place_id, student_id, day = post
+        return item_status, place_id, self._faculty.get(student_id), day
+
+    def _count(self, post, delta):
+        combo = self._combo(post)
+        self._combos[combo] += delta
+        if self._combos[combo] <= 0:
+            del self._combos[combo]
+
+    def _remove(self, post_id):
+        post = self._posts.pop(post_id, None)
+        if post is None:
+            return False
+        self._count(post, -1)
+        posts = self._author_posts.get(post[2])
+        if posts is not None:
+            posts.discard(post_id)
+        return True
+
+    def add_post(self, post_id, student_id, item_status, place_id, created_at):
+        """Count or re-count a post. Posts that are not lost/found are removed instead."""
+        with self._lock:
+            self._remove(post_id)
+            if item_status in STATUSES:
+                post = (item_status, place_id, student_id, created_at.date())
+                self._posts[post_id] = post
+                self._author_posts.setdefault(student_id, set()).add(post_id)
+                self._count(post, 1)
+            self.version += 1
+
+    def remove_post(self, post_id):
+        with self._lock:
+            if self._remove(post_id):
+                self.version += 1
+
+    def set_author(self, student_id, faculty):
+        """Record an author's faculty, moving their posts' counts if it changed."""
+        with self._lock:
+            if student_id in self._faculty and self._faculty[student_id] == faculty:
+                return
+            posts = [self._posts[post_id] for post_id in self._author_posts.get(student_id, ())]
+            for post in posts:
+                self._count(post, -1)
+            self._faculty[student_id] = faculty
+            for post in posts:
+                self._count(post, 1)
+            self.version += 1
+
+    def has_author(self, student_id):
+        return student_id in self._faculty
+
+    def set_place(self, place_id, name):
+        with self._lock:
+            self._place_names[place_id] = name
+
+    def has_place(self, place_id):
+        return place_id in self._place_names
+
+    def rebuild(self, posts, authors, places):
+        """Replace every count from INDEX_QUERY, AUTHORS_QUERY and PLACES_QUERY rows."""
+        fresh = FacetIndex()
+        fresh._faculty = {author['student_id']: author['faculty'] for author in authors}
+        fresh._place_names = {place['place_id']: place['name'] for place in places}
+        for post in posts:
+            fresh.add_post(post['post_id'], post['student_id'], post['item_status'], post['place_id'],
+                           post['created_at'])
+        fresh.built_at = datetime.now()
+        with self._lock:
+            version = self.version
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != "_lock"})
+            self.version = version + 1
+
+    def __len__(self):
+        return len(self._posts)
+
+    # ---------- querying ----------
+    @staticmethod
+    def _values(combo, today):
+        item_status, place_id, faculty, day = combo
+        return {"item_status": item_status, "place": place_id, "faculty": faculty, "date": date_bucket(day, today)}
+
+    def matcher(self, filters, now=None):
+        """post_id -> whether the post passes the place, faculty and date filters; None without any."""
+        filters = {facet: value for facet, value in filters.items() if facet != "item_status" and value is not None}
+        if not filters:
+            return None
+        today = (now or datetime.now()).date()
+
+        def matches(post_id):
+            post = self._posts.get(post_id)
+            if post is None:
+                return False
+            values = self._values(self._combo(post), today)
+            return all(values[facet] == value for facet, value in filters.items())
+        return matches
+
+    def counts(self, filters, post_ids=None, now=None):
+        """{facet: [{"value", "count"}, ...]} over active posts, or over post_ids (search results).
+
+        filters maps facet names to the selected value, or None for no filter.
+        """
+        today = (now or datetime.now()).date()
+        with self._lock:
+            if post_ids is None:
+                groups = list(self._combos.items())
+            else:
+                groups = Counter(self._combo(self._posts[post_id]) for post_id in post_ids
+                                 if post_id in self._posts).items()
+            place_names = {place_id: self._place_names.get(place_id) for (_, place_id, _, _), _ in groups}
+
+        counts = {facet: Counter() for facet in FACETS}
+        for combo, n in groups:
+            values = self._values(combo, today)
+            failed = [facet for facet in FACETS if filters.get(facet) is not None and values[facet] != filters[facet]]
+            if not failed:
+                for facet in FACETS:
+                    counts[facet][values[facet]] += n
+            elif len(failed) == 1:
+                # Misses only this facet's own filter: counts toward the other values of that facet
+                counts[failed[0]][values[failed[0]]] += n
+
+        return {
+            "item_status": [{"value": value, "count": counts["item_status"][value]} for value in STATUSES],
+            "place": [{"value": value, "name": place_names.get(value), "count": n}
+                      for value, n in self._top(counts["place"], filters.get("place"))],
+            "faculty": [{"value": value, "count": n} for value, n in self._top(counts["faculty"], filters.get("faculty"))],
+            "date": [{"value": value, "count": counts["date"][value]} for value in DATE_BUCKETS],
+        }
+
+    @staticmethod
+    def _top(counter, selected):
+        """The FACET_LIMIT most frequent values, plus the selected one wherever it ranks."""
+        counter.pop(None, None)   # posts without a catalog place or a known faculty
+        top = sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))[:FACET_LIMIT]
+        if selected is not None and selected not in dict(top):
+            top.append((selected, counter.get(selected, 0)))
+        return top
+
+
+facet_index = FacetIndex()
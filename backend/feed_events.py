@@ -0,0 +1,149 @@
+"""Live board updates over Server-Sent Events.
+
+GET /posts/stream subscribes to feed_hub, an in-process pub/sub hub. Routes
+and the expiry engine publish compact change events after they commit:
+
+  post     {"post": {...}}       a post was created or edited and is on the
+                                 board; the same fields as a GET /posts item
+  removed  {"post_ids": [...]}   posts left the board (deleted, expired,
+                                 marked returned/claimed)
+
+Each event is serialized once and the same bytes are handed to every
+subscriber, so a publish costs one append per connection. Subscribers hold at
+most QUEUE_SIZE pending events; one that falls further behind (a stalled
+connection) is evicted: it gets a final `reset` event, telling the page to
+reload the list, and its stream ends. An idle subscriber is a parked
+coroutine and a short deque, so a worker can hold thousands of them; past
+MAX_SUBSCRIBERS new streams are refused with 503.
+
+Events are numbered. The last REPLAY_SIZE are kept, so a client that
+reconnects with Last-Event-ID (EventSource does this by itself) receives what
+it missed, or `reset` if that is no longer available. A comment line is sent
+every HEARTBEAT_SECONDS to keep proxies from closing quiet connections.
+
+The hub is per process: with several workers, a subscriber sees the changes
+made through its own worker immediately and the others on its next reload.
+Publish from the event loop thread only.
+"""
+import asyncio
+import os
+from collections import deque
+
+import orjson
+
+QUEUE_SIZE = int(os.getenv("FEED_STREAM_QUEUE", "64"))
+REPLAY_SIZE = int(os.getenv("FEED_STREAM_REPLAY", "256"))
+MAX_SUBSCRIBERS = int(os.getenv("FEED_STREAM_MAX_SUBSCRIBERS", "5000"))
+HEARTBEAT_SECONDS = float(os.getenv("FEED_STREAM_HEARTBEAT", "20"))
+RETRY_MS = 5000
+
+RESET = b"event: reset\ndata: {}\n\n"
+HEARTBEAT = b": ping\n\n"
+
+
+class HubFull(Exception):
+    """MAX_SUBSCRIBERS streams are already open in this process."""
+
+
+class Subscriber:
+    __slots__ = ("pending", "wakeup", "evicted")
+
+    def __init__(self):
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.evicted = False
+
+
+class FeedHub:
+    def __init__(self, queue_size=QUEUE_SIZE, replay_size=REPLAY_SIZE, max_subscribers=MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._replay = deque(maxlen=replay_size)  # (event id, encoded event), oldest first
+        self._last_id = 0
+        self._stats = {"published": 0, "delivered": 0, "evicted": 0, "refused": 0}
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    # ---------- publishing ----------
+    def publish(self, event, data):
+        """Queue one event for every subscriber; returns how many received it."""
+        self._last_id += 1
+        message = b"id: %d\nevent: %s\ndata: %s\n\n" % (self._last_id, event.encode(), orjson.dumps(data))
+        self._replay.append((self._last_id, message))
+        self._stats["published"] += 1
+
+        delivered = 0
+        for subscriber in list(self._subscribers):
+            if len(subscriber.pending) >= self.queue_size:
+                self._evict(subscriber)
+                continue
+            subscriber.pending.append(message)
+            subscriber.wakeup.set()
+            delivered += 1
+        self._stats["delivered"] += delivered
+        return delivered
+
+    def skip(self):
+        """A change was not published (nobody was listening): clients resuming from before it must reset."""
+        self._last_id += 1
+        self._replay.clear()
+
+    def post_changed(self, post):
+        self.publish("post", {"post": post})
+
+    def posts_removed(self, post_ids):
+        if post_ids:
+            self.publish("removed", {"post_ids": list(post_ids)})
+
+    def _evict(self, subscriber):
+        self._subscribers.discard(subscriber)
+        subscriber.evicted = True
+        subscriber.pending.clear()
+        subscriber.wakeup.set()
+        self._stats["evicted"] += 1
+
+    # ---------- subscribing ----------
+    def subscribe(self, last_event_id=None):
+        if len(self._subscribers) >= self.max_subscribers:
+            self._stats["refused"] += 1
+            raise HubFull()
+        subscriber = Subscriber()
+        if last_event_id is not None and last_event_id < self._last_id:
+            missed = [message for event_id, message in self._replay if event_id > last_event_id]
+            oldest = self._replay[0][0] if self._replay else self._last_id + 1
+            if last_event_id + 1 < oldest or len(missed) > self.queue_size:
+                subscriber.pending.append(RESET)
+            else:
+                subscriber.pending.extend(missed)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    async def stream(self, subscriber):
+        """The SSE body for one subscriber; ends after eviction, unsubscribes when the client goes away."""
+        try:
+            yield b"retry: %d\n\n" % RETRY_MS
+            while True:
+                while subscriber.pending:
+                    yield subscriber.pending.popleft()
+                if subscriber.evicted:
+                    yield RESET
+                    return
+                subscriber.wakeup.clear()
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return dict(self._stats, subscribers=len(self._subscribers), last_event_id=self._last_id,
+                    queue_size=self.queue_size, max_subscribers=self.max_subscribers)
+
+
+feed_hub = FeedHub()
@@ -0,0 +1,135 @@
+"""Responsive WebP derivatives for uploaded post images.
+
+/upload keeps the original and renders a WebP copy at each DERIVATIVE_WIDTHS
+size that is narrower than it (or one at the original width for small
+images), rotated upright and with EXIF and other metadata dropped. Decoding
+and resizing are CPU-bound and hold the GIL, so they run in a process pool
+instead of on the event loop.
+
+Variants are recorded in image_variants keyed by the original's URL, since
+images are uploaded before the post that references them exists. Post APIs
+expose them next to `images` as `image_srcsets`, one entry per image:
+
+    {"src": "/uploads/x.png", "srcset": "/uploads/derived/x-320.webp 320w, ..."}
+
+Run `python images.py` to generate variants for images uploaded before this
+existed.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+UPLOAD_DIR = "uploads"
+DERIVED_DIR = os.path.join(UPLOAD_DIR, "derived")
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Refuse decompression bombs rather than exhausting a worker's memory
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def shutdown():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_derivatives(path, widths=DERIVATIVE_WIDTHS):
+    """Write WebP variants of the image at path. Runs in a worker process.
+
+    Returns [(width, height, filename), ...], or None if the file is not an
+    image Pillow can read.
+    """
+    try:
+        with Image.open(path) as source:
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    targets = [w for w in widths if w < image.width] or [image.width]
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+
+    variants = []
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        filename = f"{stem}-{width}.webp"
+        # A fresh image carries no exif/xmp/icc unless passed to save(), so metadata is stripped
+        resized.save(os.path.join(DERIVED_DIR, filename), "WEBP", quality=WEBP_QUALITY, method=4)
+        variants.append((width, height, filename))
+    return variants
+
+
+async def create_derivatives(path):
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), render_derivatives, path)
+
+
+def variant_url(filename):
+    return f"/{UPLOAD_DIR}/derived/{filename}"
+
+
+async def record_derivatives(db, source_url, variants):
+    """Store the output of render_derivatives for source_url; returns its srcset entry."""
+    await db.execute("DELETE FROM image_variants WHERE source_url = %s", (source_url,))
+    await db.executemany('''
+        INSERT INTO image_variants (source_url, variant_url, width, height, format)
+        VALUES (%s, %s, %s, %s, 'webp')
+    ''', [(source_url, variant_url(filename), width, height) for width, height, filename in variants])
+    return srcset_entry(source_url, [(variant_url(filename), width) for width, _, filename in variants])
+
+
+def srcset_entry(source_url, variants):
+    """The API shape for one image: its original plus a ready-to-use srcset string."""
+    return {
+        "src": source_url,
+        "srcset": ", ".join(f"{url} {width}w" for url, width in variants),
+    }
+
+
+async def backfill():
+    """Generate variants for every post image that has none yet."""
+    from database import transaction
+
+    async with transaction() as db:
+        rows = await db.fetch_all('''
+            SELECT DISTINCT pi.image_url
+            FROM post_images pi
+            LEFT JOIN image_variants iv ON iv.source_url = pi.image_url
+            WHERE iv.variant_id IS NULL
+        ''')
+
+    done = 0
+    for row in rows:
+        url = row['image_url']
+        path = url.lstrip("/")
+        if not url.startswith(f"/{UPLOAD_DIR}/") or not os.path.exists(path):
+            continue
+        variants = await create_derivatives(path)
+        if variants:
+            async with transaction() as db:
+                await record_derivatives(db, url, variants)
+            done += 1
+    print(f"Generated variants for {done} of {len(rows)} images")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(backfill())
+    finally:
+        shutdown()
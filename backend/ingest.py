@@ -0,0 +1,210 @@
+"""Streaming ingestion of uploaded files.
+
+Uploads are read in CHUNK_SIZE pieces and never held in memory as a whole.
+The first MEMORY_BYTES stay in a buffer, so small files and duplicates that
+turn out to exist already never touch the disk. Past that point the data goes
+to a temporary file in the upload directory, written from a thread pool so
+the event loop keeps serving other requests. While streaming, ingest()
+
+  * sniffs the first bytes and rejects anything that is not a supported image,
+    whatever the client's Content-Type or filename claim;
+  * stops as soon as the size limit for the detected type is exceeded;
+  * hashes the content for the content-addressed store (see blobs.py).
+
+ingest() only sees an UploadFile once Starlette has parsed, and spooled,
+the whole multipart body. UploadLimitMiddleware bounds what the server
+receives before that: on the upload routes it answers 413 to a
+Content-Length over MAX_REQUEST_BYTES without reading the body, and stops
+reading a body sent without one (chunked) as soon as it passes the limit.
+
+An Ingested file is made visible with commit(path), which renames the
+temporary file into place (atomic on one filesystem), so a partially written
+upload can never be served.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+import metrics
+
+CHUNK_SIZE = 64 * 1024
+MEMORY_BYTES = 256 * 1024
+MB = 1024 * 1024
+
+# Detected type -> (extension, size limit)
+IMAGE_TYPES = {
+    "image/jpeg": ("jpg", int(os.getenv("UPLOAD_MAX_JPEG_MB", "15")) * MB),
+    "image/png": ("png", int(os.getenv("UPLOAD_MAX_PNG_MB", "15")) * MB),
+    "image/webp": ("webp", int(os.getenv("UPLOAD_MAX_WEBP_MB", "10")) * MB),
+    "image/gif": ("gif", int(os.getenv("UPLOAD_MAX_GIF_MB", "5")) * MB),
+}
+
+# Whole request body on the upload routes: the largest image plus the multipart boundaries,
+# part headers and small form fields (student_id)
+FORM_OVERHEAD = 64 * 1024
+MAX_REQUEST_BYTES = max(limit for _ext, limit in IMAGE_TYPES.values()) + FORM_OVERHEAD
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("UPLOAD_IO_THREADS", "4")), thread_name_prefix="ingest")
+
+
+class UploadRejected(ValueError):
+    """The upload is not an accepted type (status 415) or is too large (status 413)."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff(head):
+    """Content type from an image's magic bytes, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return None
+
+
+async def _in_executor(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+class Ingested:
+    """A fully received upload, held in memory or in a temporary file until commit() or discard()."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.content_type = None
+        self.extension = None
+        self.size = 0
+        self.sha256 = None
+        self._buffer = bytearray()
+        self._temp = None    # NamedTemporaryFile once the buffer has spilled
+
+    def _spill(self, data):
+        if self._temp is None:
+            self._temp = tempfile.NamedTemporaryFile(dir=self.directory, prefix=".ingest-", delete=False)
+        self._temp.write(data)
+
+    def _finish(self):
+        if self._temp is not None:
+            self._temp.flush()
+            os.fsync(self._temp.fileno())
+            self._temp.close()
+
+    def _commit(self, path):
+        if self._temp is None:
+            with tempfile.NamedTemporaryFile(dir=self.directory, prefix=".ingest-", delete=False) as temp:
+                temp.write(self._buffer)
+                temp.flush()
+                os.fsync(temp.fileno())
+            self._buffer = bytearray()
+            os.replace(temp.name, path)
+        else:
+            os.replace(self._temp.name, path)
+            self._temp = None
+
+    def _discard(self):
+        self._buffer = bytearray()
+        if self._temp is not None:
+            self._temp.close()
+            try:
+                os.remove(self._temp.name)
+            except FileNotFoundError:
+                pass
+            self._temp = None
+
+    async def commit(self, path):
+        """Atomically move the upload to path."""
+        await _in_executor(self._commit, path)
+
+    async def discard(self):
+        await _in_executor(self._discard)
+
+
+async def ingest(upload, directory):
+    """Stream an UploadFile into an Ingested, validating type and size on the way."""
+    received = Ingested(directory)
+    digest = hashlib.sha256()
+    limit = None
+    started = time.perf_counter()
+    try:
+        while chunk := await upload.read(CHUNK_SIZE):
+            if received.content_type is None:
+                received.content_type = sniff(chunk[:16])
+                if received.content_type is None:
+                    raise UploadRejected("File must be a JPEG, PNG, WebP or GIF image", 415)
+                received.extension, limit = IMAGE_TYPES[received.content_type]
+
+            received.size += len(chunk)
+            if received.size > limit:
+                raise UploadRejected(f"Image is larger than {limit // MB} MB", 413)
+            digest.update(chunk)
+
+            if received._temp is None and len(received._buffer) + len(chunk) <= MEMORY_BYTES:
+                received._buffer += chunk
+            else:
+                if received._buffer:
+                    chunk = bytes(received._buffer) + chunk
+                    received._buffer = bytearray()
+                await _in_executor(received._spill, chunk)
+
+        if received.content_type is None:
+            raise UploadRejected("File is empty", 415)
+        await _in_executor(received._finish)
+    except BaseException as e:
+        if isinstance(e, UploadRejected):
+            metrics.upload_rejected.labels(e.status_code).inc()
+        await asyncio.shield(received.discard())
+        raise
+
+    received.sha256 = digest.hexdigest()
+    metrics.upload_size.labels(received.content_type).observe(received.size)
+    metrics.upload_duration.labels(received.content_type).observe(time.perf_counter() - started)
+    return received
+
+
+class UploadLimitMiddleware:
+    """Refuse request bodies over max_bytes on the paths matching `paths`, before form parsing."""
+
+    def __init__(self, app, paths, max_bytes=MAX_REQUEST_BYTES):
+        self.app = app
+        self.paths = re.compile(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.paths.fullmatch(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        message = f"Upload is larger than {self.max_bytes // MB} MB"
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            metrics.upload_rejected.labels(413).inc()
+            # Connection: close, so the server does not read the unwanted body to reuse the connection
+            response = JSONResponse({"detail": message}, status_code=413, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            event = await receive()
+            if event["type"] == "http.request":
+                received += len(event.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the form parser; the route's exception handling answers 413
+                    metrics.upload_rejected.labels(413).inc()
+                    raise HTTPException(status_code=413, detail=message)
+            return event
+
+        await self.app(scope, limited_receive, send)
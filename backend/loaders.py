@@ -0,0 +1,186 @@
+"""Batched loaders for the rows that hang off posts and users.
+
+Each loader takes every id on a result page and resolves them with a single
+IN-list query (chunked for very large pages), so list endpoints run a constant
+number of queries no matter how many posts they return.
+"""
+
+from etags import post_etag, user_etag
+from images import srcset_entry
+
+# Keep IN-lists well below max_allowed_packet even for huge exports
+CHUNK_SIZE = 1000
+
+AUTHOR_COLUMNS = ("student_id", "full_name", "email", "faculty", "class_year", "phone", "profile_photo_url")
+
+# What list endpoints return per post: no description (TEXT), which only the detail page shows
+POST_SUMMARY_COLUMNS = ("post_id", "student_id", "item_name", "item_status", "place", "place_id",
+                        "created_at", "updated_at", "expires_at")
+FEED_AUTHOR_COLUMNS = ("full_name", "faculty", "profile_photo_url")
+
+
+def columns(alias, names):
+    """'p.a, p.b, ...' for a SELECT list."""
+    return ", ".join(f"{alias}.{name}" for name in names)
+
+
+def _placeholders(ids):
+    return ", ".join(["%s"] * len(ids))
+
+
+def _unique(ids):
+    return list(dict.fromkeys(i for i in ids if i is not None))
+
+
+async def _fetch_in(db, sql, ids):
+    """Run `sql` (which contains a single {ids} slot) for every chunk of ids."""
+    rows = []
+    ids = _unique(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        rows.extend(await db.fetch_all(sql.format(ids=_placeholders(chunk)), chunk))
+    return rows
+
+
+async def load_images(db, post_ids):
+    """post_id -> [image_url, ...] in display order."""
+    rows = await _fetch_in(db, '''
+        SELECT post_id, image_url
+        FROM post_images
+        WHERE post_id IN ({ids})
+        ORDER BY post_id, image_order
+    ''', post_ids)
+
+    images = {}
+    for row in rows:
+        images.setdefault(row['post_id'], []).append(row['image_url'])
+    return images
+
+
+async def load_srcsets(db, image_urls):
+    """image_url -> srcset entry for every image that has derivatives."""
+    rows = await _fetch_in(db, '''
+        SELECT source_url, variant_url, width
+        FROM image_variants
+        WHERE source_url IN ({ids})
+        ORDER BY source_url, width
+    ''', image_urls)
+
+    variants = {}
+    for row in rows:
+        variants.setdefault(row['source_url'], []).append((row['variant_url'], row['width']))
+    return {url: srcset_entry(url, sizes) for url, sizes in variants.items()}
+
+
+async def load_users(db, student_ids, columns=AUTHOR_COLUMNS):
+    """student_id -> user row with the requested columns."""
+    if "student_id" not in columns:
+        columns = ("student_id",) + tuple(columns)
+    rows = await _fetch_in(db, f'''
+        SELECT {", ".join(columns)}
+        FROM users
+        WHERE student_id IN ({{ids}})
+    ''', student_ids)
+    return {row['student_id']: row for row in rows}
+
+
+async def load_social_profiles(db, student_ids):
+    """student_id -> [{"platform", "profile_url"}, ...]"""
+    rows = await _fetch_in(db, '''
+        SELECT usp.student_id, sp.platform, sp.profile_url
+        FROM social_profiles sp
+        JOIN user_social_profiles usp ON sp.contact_id = usp.contact_id
+        WHERE usp.student_id IN ({ids})
+        ORDER BY usp.student_id, sp.contact_id
+    ''', student_ids)
+
+    profiles = {}
+    for row in rows:
+        profiles.setdefault(row.pop('student_id'), []).append(row)
+    return profiles
+
+
+async def attach_images(db, posts):
+    """Set `images` (original URLs) and `image_srcsets` (responsive variants) on each post."""
+    images = await load_images(db, [post['post_id'] for post in posts])
+    srcsets = await load_srcsets(db, [url for urls in images.values() for url in urls])
+    for post in posts:
+        post['images'] = images.get(post['post_id'], [])
+        post['image_srcsets'] = [srcsets.get(url) or srcset_entry(url, []) for url in post['images']]
+    return posts
+
+
+async def attach_authors(db, posts, columns=AUTHOR_COLUMNS):
+    """Copy the author's columns onto each post, as the old JOIN on users did."""
+    authors = await load_users(db, [post['student_id'] for post in posts], columns)
+    for post in posts:
+        author = authors.get(post['student_id'], {})
+        for column in columns:
+            if column != "student_id":
+                post[column] = author.get(column)
+    return posts
+
+
+async def attach_social_profiles(db, rows):
+    profiles = await load_social_profiles(db, [row['student_id'] for row in rows])
+    for row in rows:
+        row['social_profiles'] = profiles.get(row['student_id'], [])
+    return rows
+
+
+# Child-table versions for ETags: rows are only ever added or removed
+USER_VERSION_COLUMNS = """
+    u.updated_at,
+    (SELECT COUNT(*) FROM user_social_profiles usp WHERE usp.student_id = u.student_id) AS social_count,
+    (SELECT MAX(usp.contact_id) FROM user_social_profiles usp WHERE usp.student_id = u.student_id) AS social_last
+"""
+POST_VERSION_COLUMNS = """
+    (SELECT COUNT(*) FROM post_images pi WHERE pi.post_id = p.post_id) AS image_count,
+    (SELECT MAX(pi.post_image_id) FROM post_images pi WHERE pi.post_id = p.post_id) AS image_last
+"""
+
+
+async def load_user_card(db, student_id):
+    """(user's public profile with social links, etag), or None."""
+    user = await db.fetch_one(f'''
+        SELECT {", ".join("u." + column for column in AUTHOR_COLUMNS)}, {USER_VERSION_COLUMNS}
+        FROM users u WHERE u.student_id = %s
+    ''', (student_id,))
+    if not user:
+        return None
+    etag = user_etag(user)
+    for column in ("updated_at", "social_count", "social_last"):
+        del user[column]
+    await attach_social_profiles(db, [user])
+    return user, etag
+
+
+async def load_user_etag(db, student_id):
+    row = await db.fetch_one(f'''
+        SELECT u.student_id, {USER_VERSION_COLUMNS}
+        FROM users u WHERE u.student_id = %s
+    ''', (student_id,))
+    return user_etag(row) if row else None
+
+
+async def load_post(db, post_id):
+    """(post row with its images, etag), or None."""
+    post = await db.fetch_one(f'''
+        SELECT p.*, {POST_VERSION_COLUMNS}
+        FROM posts p WHERE p.post_id = %s
+    ''', (post_id,))
+    if not post:
+        return None
+    etag = post_etag(post)
+    del post['image_count'], post['image_last']
+    await attach_images(db, [post])
+    return post, etag
+
+
+async def load_post_etag(db, post_id):
+    """(author's student_id, etag) for a post, or None."""
+    row = await db.fetch_one(f'''
+        SELECT p.post_id, p.student_id, p.updated_at, {POST_VERSION_COLUMNS}
+        FROM posts p WHERE p.post_id = %s
+    ''', (post_id,))
+    return (row['student_id'], post_etag(row)) if row else None
@@ -0,0 +1,351 @@
+"""Lost <-> found match suggestions.
+
+Someone who posts a lost wallet should see the "found" wallet another
+student posted the day after. MatchEngine scores every active post against
+the active posts of the opposite status and keeps the best MAX_MATCHES for
+each, served by GET /posts/{post_id}/matches.
+
+Scoring (0..1) combines, with SCORE_WEIGHTS:
+
+  text   cosine similarity of the item name and description tokens
+         (search_index.tokenize, so Thai works the same as in search),
+         weighted by field and by inverse document frequency
+  place  1 for the same catalog place (see places.py), else the overlap of
+         the two place texts' tokens
+  time   exp(-days apart / TIME_SCALE_DAYS)
+
+Candidates come from an inverted index with one posting list per status and
+token, never from a scan of every post. The post's tokens are tried rarest
+first, taking up to SCAN_PER_TOKEN of the most recently indexed posts from
+each list, until MAX_CANDIDATES are collected, so matching one post costs
+the same on a board of a thousand posts or a million. A pair is only
+suggested if the two posts share a token, belong to different students and
+score at least MIN_SCORE.
+
+Matching runs off the request path. The routes index a post as they
+re-index it for search (cheap) and queue it; one worker thread scores the
+queue, newest posts first, and records each pair on both posts. It holds
+the engine's lock only to copy what it scores and to record the result, and
+a rebuild builds its new index before taking the lock to swap it in, so the
+routes never wait for scoring. Deleted,
+expired and returned/claimed posts are dropped at once, along with every
+suggestion that points at them. A rebuild (startup, then with the search
+index) only queues posts that are new or changed since the last one. A
+post that fails to score is logged as a "match.failed" event and counted in
+lostfound_match_errors_total.
+Suggestions are per process, like the search index.
+"""
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import metrics
+import request_log
+from search_index import tokenize
+
+FIELD_WEIGHTS = {"item_name": 3.0, "description": 1.0}
+SCORE_WEIGHTS = {"text": 0.6, "place": 0.25, "time": 0.15}
+TIME_SCALE_DAYS = float(os.getenv("MATCH_TIME_SCALE_DAYS", "3"))
+MIN_SCORE = float(os.getenv("MATCH_MIN_SCORE", "0.3"))
+MAX_MATCHES = int(os.getenv("MATCH_MAX_MATCHES", "20"))        # suggestions kept per post
+MAX_CANDIDATES = int(os.getenv("MATCH_MAX_CANDIDATES", "500"))  # posts scored per match
+SCAN_PER_TOKEN = int(os.getenv("MATCH_SCAN_PER_TOKEN", "200"))  # newest entries read from one posting list
+
+OPPOSITE = {"lost": "found", "found": "lost"}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="match")
+
+
+class _Doc:
+    __slots__ = ("student_id", "item_status", "weights", "place_id", "place_tokens", "created_at", "expires_at")
+
+    def __init__(self, student_id, item_status, weights, place_id, place_tokens, created_at, expires_at):
+        self.student_id = student_id
+        self.item_status = item_status
+        self.weights = weights
+        self.place_id = place_id
+        self.place_tokens = place_tokens
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+    def same_as(self, other):
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+def make_doc(row):
+    """A _Doc from an INDEX_QUERY row."""
+    weights = Counter()
+    for token in tokenize(row['item_name']):
+        weights[token] += FIELD_WEIGHTS["item_name"]
+    for token in tokenize(row['description']):
+        weights[token] += FIELD_WEIGHTS["description"]
+    return _Doc(row['student_id'], row['item_status'], dict(weights), row['place_id'],
+                frozenset(tokenize(row['place'])), row['created_at'], row['expires_at'])
+
+
+class MatchEngine:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}                                        # post_id -> _Doc
+        self._postings = {status: {} for status in OPPOSITE}  # status -> token -> {post_id: weight}, oldest first
+        self._matches = {}   # post_id -> {other post_id: score}, its suggestions
+        self._refs = {}      # post_id -> {post_ids whose suggestions include it}
+        self._queue = deque()
+        self._queued = set()
+        self._draining = False
+        self.built_at = None
+        self.totals = {"matched": 0, "pairs": 0, "match_seconds": 0.0}
+
+    # ---------- index ----------
+    def _index(self, post_id, doc):
+        self._docs[post_id] = doc
+        postings = self._postings[doc.item_status]
+        for token, weight in doc.weights.items():
+            postings.setdefault(token, {})[post_id] = weight
+
+    def _unindex(self, post_id):
+        doc = self._docs.pop(post_id, None)
+        if doc is None:
+            return
+        postings = self._postings[doc.item_status]
+        for token in doc.weights:
+            posting = postings.get(token)
+            if posting is not None:
+                posting.pop(post_id, None)
+                if not posting:
+                    del postings[token]
+
+    # ---------- suggestions ----------
+    def _link(self, post_id, other_id, score):
+        self._matches.setdefault(post_id, {})[other_id] = score
+        self._refs.setdefault(other_id, set()).add(post_id)
+
+    def _unlink(self, post_id, other_id):
+        self._matches.get(post_id, {}).pop(other_id, None)
+        refs = self._refs.get(other_id)
+        if refs is not None:
+            refs.discard(post_id)
+
+    def _forget(self, post_id):
+        """Drop a post's suggestions and every suggestion of it."""
+        for other_id in list(self._matches.pop(post_id, {})):
+            self._unlink(post_id, other_id)
+        for other_id in list(self._refs.pop(post_id, ())):
+            self._unlink(other_id, post_id)
+
+    def _offer(self, post_id, other_id, score):
+        """Add other_id to post_id's suggestions if it ranks among the best MAX_MATCHES."""
+        current = self._matches.get(post_id, {})
+        if len(current) >= MAX_MATCHES:
+            worst = min(current, key=lambda q: (current[q], q))
+            if (current[worst], worst) >= (score, other_id):
+                return
+            self._unlink(post_id, worst)
+        self._link(post_id, other_id, score)
+
+    # ---------- maintenance ----------
+    def add_post(self, post_id, row):
+        """Index or re-index a post from an INDEX_QUERY row and queue it for matching.
+
+        Posts that are not lost/found are removed instead.
+        """
+        if row['item_status'] not in OPPOSITE:
+            self.remove_post(post_id)
+            return
+        doc = make_doc(row)
+        with self._lock:
+            old = self._docs.get(post_id)
+            if old is not None and old.same_as(doc):
+                return
+            self._forget(post_id)
+            self._unindex(post_id)
+            self._index(post_id, doc)
+            self._enqueue(post_id, urgent=True)
+
+    def remove_post(self, post_id):
+        with self._lock:
+            self._forget(post_id)
+            self._unindex(post_id)
+            self._queued.discard(post_id)
+
+    def sync(self, rows):
+        """Bring the index in line with every active post (INDEX_QUERY rows); only changes are re-matched.
+
+        Like SearchIndex.rebuild, the new index is built without the lock and swapped in.
+        """
+        with self._lock:
+            current = dict(self._docs)
+        # Oldest first, so posting lists stay ordered by age
+        fresh = {}
+        changed = []
+        for row in sorted(rows, key=lambda row: (row['created_at'], row['post_id'])):
+            doc = make_doc(row)
+            old = current.get(row['post_id'])
+            if old is not None and old.same_as(doc):
+                doc = old   # the same object, so a match scored against it still applies
+            else:
+                changed.append(row['post_id'])
+            fresh[row['post_id']] = doc
+        removed = [post_id for post_id in current if post_id not in fresh]
+        postings = {status: {} for status in OPPOSITE}
+        for post_id, doc in fresh.items():
+            for token, weight in doc.weights.items():
+                postings[doc.item_status].setdefault(token, {})[post_id] = weight
+
+        with self._lock:
+            self._docs = fresh
+            self._postings = postings
+            for post_id in removed:
+                self._forget(post_id)
+                self._queued.discard(post_id)
+            for post_id in changed:
+                self._forget(post_id)
+            for post_id in reversed(changed):
+                self._enqueue(post_id)
+            self.built_at = datetime.now()
+
+    def _enqueue(self, post_id, urgent=False):
+        """Called with the lock held. Urgent posts (just written by a user) go to the front."""
+        if post_id not in self._queued:
+            self._queued.add(post_id)
+            if urgent:
+                self._queue.appendleft(post_id)
+            else:
+                self._queue.append(post_id)
+        elif urgent:
+            self._queue.remove(post_id)
+            self._queue.appendleft(post_id)
+        if not self._draining:
+            self._draining = True
+            _executor.submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                post_id = None
+                while self._queue:
+                    candidate = self._queue.popleft()
+                    if candidate in self._queued:
+                        self._queued.discard(candidate)
+                        post_id = candidate
+                        break
+                if post_id is None:
+                    self._draining = False
+                    return
+            try:
+                self._match(post_id)
+            except Exception as e:
+                # One bad row must not stop matching for everyone else
+                metrics.match_errors.inc()
+                request_log.event("match.failed", post_id=post_id, error=f"{type(e).__name__}: {e}")
+
+    # ---------- scoring ----------
+    @staticmethod
+    def _idf(token, df, n_docs):
+        return math.log(1 + n_docs / (df.get(token, 0) + 1))
+
+    def _candidates(self, doc):
+        postings = self._postings[OPPOSITE[doc.item_status]]
+        tokens = sorted((token for token in doc.weights if token in postings), key=lambda t: len(postings[t]))
+        candidates = set()
+        for token in tokens:
+            # Dicts keep insertion order: reversed() starts from the most recently indexed posts
+            candidates.update(itertools.islice(reversed(postings[token]), SCAN_PER_TOKEN))
+            if len(candidates) >= MAX_CANDIDATES:
+                break
+        return candidates
+
+    def _score(self, doc, other, idf, norm):
+        dot = sum(weight * other.weights[token] * idf(token) ** 2
+                  for token, weight in doc.weights.items() if token in other.weights)
+        other_norm = math.sqrt(sum((weight * idf(token)) ** 2 for token, weight in other.weights.items()))
+        text = dot / (norm * other_norm) if norm and other_norm else 0.0
+
+        if doc.place_id is not None and doc.place_id == other.place_id:
+            place = 1.0
+        elif doc.place_tokens and other.place_tokens:
+            place = len(doc.place_tokens & other.place_tokens) / len(doc.place_tokens | other.place_tokens)
+        else:
+            place = 0.0
+
+        days = abs((doc.created_at - other.created_at).total_seconds()) / 86400
+        proximity = math.exp(-days / TIME_SCALE_DAYS)
+
+        return (SCORE_WEIGHTS["text"] * text + SCORE_WEIGHTS["place"] * place
+                + SCORE_WEIGHTS["time"] * proximity)
+
+    def _match(self, post_id):
+        started = time.perf_counter()
+        # Under the lock only collect what scoring needs: the routes take it on the event loop.
+        # _Doc objects are replaced, never changed, so the ones copied here stay as they were.
+        with self._lock:
+            doc = self._docs.get(post_id)
+            if doc is None:
+                return
+            others = {other_id: self._docs[other_id] for other_id in self._candidates(doc)}
+            tokens = set(doc.weights).union(*(other.weights for other in others.values()))
+            df = {token: sum(len(postings.get(token, ())) for postings in self._postings.values())
+                  for token in tokens}
+            n_docs = len(self._docs)
+
+        idf_cache = {}
+
+        def idf(token):
+            if token not in idf_cache:
+                idf_cache[token] = self._idf(token, df, n_docs)
+            return idf_cache[token]
+
+        norm = math.sqrt(sum((weight * idf(token)) ** 2 for token, weight in doc.weights.items()))
+        scored = []
+        for other_id, other in others.items():
+            if other.student_id == doc.student_id:
+                continue
+            score = self._score(doc, other, idf, norm)
+            if score >= MIN_SCORE:
+                scored.append((round(score, 4), other_id))
+        best = heapq.nlargest(MAX_MATCHES, scored)
+
+        with self._lock:
+            if self._docs.get(post_id) is not doc:
+                return   # changed or removed meanwhile; a changed post was queued again
+            self._forget(post_id)
+            for score, other_id in best:
+                if self._docs.get(other_id) is not others[other_id]:
+                    continue   # changed (and queued, so it is matched again) or removed meanwhile
+                self._link(post_id, other_id, score)
+                self._offer(other_id, post_id, score)
+            self.totals["matched"] += 1
+            self.totals["pairs"] += len(best)
+            self.totals["match_seconds"] += time.perf_counter() - started
+
+    # ---------- querying ----------
+    def has_post(self, post_id):
+        return post_id in self._docs
+
+    def pending(self, post_id):
+        return post_id in self._queued
+
+    def matches(self, post_id, limit=MAX_MATCHES, now=None):
+        """[(score, other post_id)] best first, leaving out posts past their expiry."""
+        now = now or datetime.now()
+        with self._lock:
+            current = list(self._matches.get(post_id, {}).items())
+            live = [(score, other_id) for other_id, score in current
+                    if other_id in self._docs and self._docs[other_id].expires_at > now]
+        return sorted(live, key=lambda m: (-m[0], -m[1]))[:limit]
+
+    def __len__(self):
+        return len(self._docs)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.totals, indexed=len(self._docs), queued=len(self._queued))
+
+
+match_engine = MatchEngine()
@@ -0,0 +1,310 @@
+"""Prometheus metrics, served at GET /metrics.
+
+A small in-process registry instead of a client library: counters, gauges
+and histograms with labels, rendered in the Prometheus text format (0.0.4).
+What is measured:
+
+  * every HTTP request (MetricsMiddleware): latency and response size
+    histograms and a request counter per method, route template and status,
+    plus the number of requests in flight;
+  * JSON encoding time of API responses (ORJSONResponse below);
+  * the database: connect time, pool checkout wait and query time by
+    operation (see database.py);
+  * uploads: bytes received, time to stream them in and rejections (see
+    ingest.py), and new versus duplicate blobs (see blobs.py);
+  * posts the match engine failed to score (see matching.py);
+  * stats() dicts the app already keeps (pool, caches, live feed, expiry),
+    read as gauges at scrape time through register_collector().
+
+Routes are labelled by their template (/posts/{post_id}), never the raw
+path, so the number of series stays fixed. Observations take a lock per
+metric and cost well under a microsecond; database timings come from the
+DB worker threads. Metrics are per process: with several workers, each
+scrape sees the worker that answered it.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from fastapi.responses import ORJSONResponse as _ORJSONResponse
+
+import request_log
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UPLOAD_BUCKETS = (16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+_families = []     # every metric, in registration order
+_collectors = []   # functions yielding (name, type, help, [(labels, value)]) at scrape time
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._children = {}
+        _families.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value(self._lock)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_labels(self.label_names, values)} {_number(child.value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds, lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # per bucket, not cumulative; the last is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, description, labels)
+
+    def _new_child(self):
+        return _Buckets(self.buckets, self._lock)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            with self._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, values)} {count}"
+
+
+def register_collector(collect):
+    """collect() is called on every scrape and yields (name, type, help, [(labels dict, value), ...])."""
+    _collectors.append(collect)
+
+
+def stats_collector(prefix, description, read, label=None):
+    """Expose the numbers in a stats() dict as gauges named prefix_<key>.
+
+    With label set, read() returns {label value: stats dict} instead, one series per entry.
+    """
+    def collect():
+        groups = read() if label else {None: read()}
+        families = {}
+        for group, stats in groups.items():
+            for key, value in stats.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    families.setdefault(key, []).append(({label: group} if label else {}, value))
+        for key, samples in families.items():
+            yield f"{prefix}_{key}", "gauge", f"{description}: {key}", samples
+    register_collector(collect)
+
+
+def render():
+    """The whole registry in the Prometheus text format."""
+    lines = []
+    for family in _families:
+        lines.extend(family.render())
+    for collect in _collectors:
+        try:
+            collected = list(collect())
+        except Exception as e:
+            # A failing source (database down) must not take the other metrics with it
+            print(f"Error collecting metrics: {e}")
+            continue
+        for name, kind, description, samples in collected:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- HTTP ----------
+http_requests = Counter("lostfound_http_requests_total", "HTTP requests by method, route and status",
+                        ("method", "route", "status"))
+http_latency = Histogram("lostfound_http_request_duration_seconds",
+                         "Time from receiving a request to sending the last body byte", ("method", "route"))
+http_response_size = Histogram("lostfound_http_response_size_bytes", "Response body bytes as sent",
+                               ("method", "route"), SIZE_BUCKETS)
+http_in_flight = Gauge("lostfound_http_requests_in_flight", "Requests being handled right now")
+json_render = Histogram("lostfound_json_render_seconds", "Time spent encoding JSON response bodies",
+                        buckets=DB_BUCKETS)
+
+# ---------- database ----------
+db_connect = Histogram("lostfound_db_connect_seconds", "Time to open a new database connection",
+                       buckets=DB_BUCKETS)
+db_checkout_wait = Histogram("lostfound_db_checkout_wait_seconds", "Time waiting for a free pooled connection",
+                             buckets=DB_BUCKETS)
+db_query = Histogram("lostfound_db_query_seconds", "Time running a statement and fetching its rows",
+                     ("operation",), DB_BUCKETS)
+db_errors = Counter("lostfound_db_errors_total", "Statements that raised a driver error", ("operation",))
+
+# ---------- uploads ----------
+upload_size = Histogram("lostfound_upload_size_bytes", "Bytes of accepted uploads", ("content_type",),
+                        UPLOAD_BUCKETS)
+upload_duration = Histogram("lostfound_upload_duration_seconds", "Time to stream in and check an upload",
+                            ("content_type",))
+upload_rejected = Counter("lostfound_upload_rejected_total", "Uploads refused, by response status", ("status",))
+upload_blobs = Counter("lostfound_upload_blobs_total", "Stored uploads that were new or duplicates", ("result",))
+
+# ---------- matching ----------
+match_errors = Counter("lostfound_match_errors_total", "Posts the match engine failed to score")
+match_errors.inc(0)   # exported from the start, so a rate() alert sees the first failure
+
+
+class ORJSONResponse(_ORJSONResponse):
+    """fastapi's ORJSONResponse, timing how long each body takes to encode."""
+
+    def render(self, content):
+        started = time.perf_counter()
+        body = super().render(content)
+        json_render.observe(time.perf_counter() - started)
+        return body
+
+
+def route_label(scope):
+    """The matched route's template; the mount path for mounted apps (/uploads); 'unmatched' for 404s."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts the bytes it sends; also writes the sampled request log.
+
+    Add it last, so that it is outermost and measures what goes on the wire.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def measuring_send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, measuring_send)
+        finally:
+            http_in_flight.dec()
+            elapsed = time.perf_counter() - started
+            method = scope["method"] if scope["method"] in METHODS else "OTHER"
+            route = route_label(scope)
+            http_requests.labels(method, route, str(status)).inc()
+            http_latency.labels(method, route).observe(elapsed)
+            http_response_size.labels(method, route).observe(size)
+            if request_log.sampled():
+                request_log.event("request", method=method, route=route, status=status,
+                                  duration_ms=round(elapsed * 1000, 2), bytes=size)
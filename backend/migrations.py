@@ -0,0 +1,562 @@
+"""Versioned schema migrations.
+
+The schema is no longer created on every boot. Each change is a numbered
+migration; the schema_version table records which ones have been applied, and
+`python migrations.py` applies the pending ones in order:
+
+    python migrations.py            # apply pending migrations (the default)
+    python migrations.py status     # show current and latest version
+
+Runs from several containers at once are serialized with a MySQL named lock,
+so each migration is applied exactly once. MySQL commits DDL implicitly, so a
+migration is recorded right after its statements succeed; a failure stops the
+run and the next run retries from that migration. Migration 1 uses
+IF NOT EXISTS throughout, so databases created by the old init_database
+adopt the versioning without changes.
+
+Every migration also has a SQLite form, used when DB_BACKEND=sqlite (see
+sqlite_backend.py). ENUM columns become CHECK constraints over the same
+values, ON UPDATE CURRENT_TIMESTAMP becomes a trigger, and the generated
+expires_at column is computed with SQLite's date functions. There DDL is
+transactional and BEGIN IMMEDIATE serializes concurrent runs, so each
+migration is applied and recorded atomically.
+
+The app itself only compares the recorded version with LATEST_VERSION at
+startup (check_schema) and reports not-ready on a mismatch.
+"""
+import sys
+
+import mysql.connector
+
+import places
+from database import DB_BACKEND, DB_CONFIG, DB_PATH, db_connection
+
+LOCK_NAME = "lost_found_migrations"
+LOCK_TIMEOUT = 120   # seconds to wait for another migrator to finish
+
+# Allowed values of the ENUM columns; SQLite enforces them with CHECK constraints
+FACULTIES = (
+    'School of Engineering',
+    'School of Architecture, Art, and Design',
+    'School of Industrial Education and Technology',
+    'School of Agricultural Technology',
+    'School of Science',
+    'School of Food Industry',
+    'School of Information Technology',
+    'International College',
+    'College of Materials Innovation and Technology',
+    'College of Advanced Manufacturing Innovation',
+    'KMITL Business School',
+    'International Academy of Aviation Industry',
+    'School of Liberal Arts',
+    'Faculty of Medicine',
+    'College of Innovation and Industrial Management',
+    'Institute of Music Science and Engineering',
+    'School of Dentistry',
+    'School of Nursing Science',
+    'School of Integrated Innovative Technology',
+)
+CLASS_YEARS = ('1', '2', '3', '4', '5', '6')
+PLATFORMS = ('Facebook', 'Instagram', 'LINE', 'Twitter / X', 'Discord', 'Other')
+ITEM_STATUSES = ('lost', 'found', 'returned', 'claimed', 'expired')
+
+POST_LIFETIME_DAYS = 30   # posts.expires_at = created_at + this
+
+SQLITE_NOW = "(datetime('now', 'localtime'))"
+
+
+def _values(values):
+    return ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+
+
+def _enum(values):
+    return f"ENUM({_values(values)})"
+
+
+def _check(column, values):
+    return f"CHECK ({column} IN ({_values(values)}))"
+
+
+def _ensure_index(cursor, table, name, columns):
+    """Create an index unless it already exists (MySQL has no CREATE INDEX IF NOT EXISTS)."""
+    cursor.execute('''
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    ''', (table, name))
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+
+def _ensure_column(cursor, table, column, alter):
+    """Run `ALTER TABLE table <alter>` unless the column already exists."""
+    cursor.execute('''
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    ''', (table, column))
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} {alter}")
+
+
+def _backfill_places(cursor, sqlite=False):
+    """Add a catalog entry for every place text posts use and point the posts at it (see places.py)."""
+    ignore, param = ("OR IGNORE", "?") if sqlite else ("IGNORE", "%s")
+    cursor.execute("SELECT DISTINCT place FROM posts WHERE place_id IS NULL")
+    keyed = [(name, places.normalize(name)) for (name,) in cursor.fetchall()]
+    keyed = [(name, key) for name, key in keyed if key]
+    if not keyed:
+        return
+    cursor.executemany(f"INSERT {ignore} INTO places (place_key, name) VALUES ({param}, {param})",
+                       [(key, places.display(name)) for name, key in keyed])
+    # place text -> catalog key, so one UPDATE sets every post instead of one full scan per place
+    cursor.execute(f'''
+        CREATE TEMPORARY TABLE place_backfill (
+            place VARCHAR({places.MAX_LENGTH}) PRIMARY KEY,
+            place_key VARCHAR({places.MAX_LENGTH}) NOT NULL
+        )
+    ''')
+    cursor.executemany(f"INSERT {ignore} INTO place_backfill (place, place_key) VALUES ({param}, {param})", keyed)
+    if sqlite:
+        cursor.execute('''
+            UPDATE posts SET place_id = (
+                SELECT pl.place_id FROM place_backfill b JOIN places pl ON pl.place_key = b.place_key
+                WHERE b.place = posts.place
+            )
+            WHERE place_id IS NULL
+        ''')
+        cursor.execute("DROP TABLE temp.place_backfill")
+    else:
+        cursor.execute('''
+            UPDATE posts p
+            JOIN place_backfill b ON b.place = p.place
+            JOIN places pl ON pl.place_key = b.place_key
+            SET p.place_id = pl.place_id
+            WHERE p.place_id IS NULL
+        ''')
+        cursor.execute("DROP TEMPORARY TABLE place_backfill")
+
+
+def _initial_schema(cursor):
+    # --- 'users' table (must be created before 'user_social_profiles') ---
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS users (
+            student_id INT AUTO_INCREMENT NOT NULL PRIMARY KEY,
+            full_name VARCHAR(255) NOT NULL,
+            faculty {_enum(FACULTIES)} NOT NULL,
+            class_year {_enum(CLASS_YEARS)} NOT NULL,
+            phone VARCHAR(20) NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            profile_photo_url VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    ''')
+
+    # --- 'social_profiles' table (must be created before 'user_social_profiles') ---
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS social_profiles (
+            contact_id INT AUTO_INCREMENT PRIMARY KEY,
+            platform {_enum(PLATFORMS)} NOT NULL,
+            profile_url VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    ''')
+
+    # --- 'user_social_profiles' junction table (many-to-many link) ---
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_social_profiles (
+            user_social_id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            contact_id INT NOT NULL,
+            -- Ensures a user can't have the same link defined twice
+            UNIQUE KEY unique_user_contact (student_id, contact_id),
+            FOREIGN KEY (student_id) REFERENCES users(student_id) ON DELETE CASCADE,
+            FOREIGN KEY (contact_id) REFERENCES social_profiles(contact_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    ''')
+
+    # --- 'posts' table; expires_at is a generated column (MySQL 5.7+) ---
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS posts (
+            post_id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            item_name VARCHAR(100) NOT NULL,
+            item_status {_enum(ITEM_STATUSES)} DEFAULT 'lost',
+            place VARCHAR(100) NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            expires_at DATETIME GENERATED ALWAYS AS (DATE_ADD(created_at, INTERVAL {POST_LIFETIME_DAYS} DAY)) STORED,
+            FOREIGN KEY (student_id) REFERENCES users(student_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    ''')
+
+    # --- 'post_images' table ---
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_images (
+            post_image_id INT AUTO_INCREMENT PRIMARY KEY,
+            post_id INT NOT NULL,
+            image_url VARCHAR(255) NOT NULL,
+            image_order INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (post_id) REFERENCES posts(post_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    ''')
+
+
+def _feed_index(cursor):
+    # Public feed (active posts, newest first) and the expiry engine's (item_status, expires_at) scans
+    _ensure_index(cursor, "posts", "idx_posts_status_expires_created", "item_status, expires_at, created_at")
+
+
+def _image_variants(cursor):
+    # WebP derivatives of uploaded images, keyed by the original's URL (see images.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_variants (
+            variant_id INT AUTO_INCREMENT PRIMARY KEY,
+            source_url VARCHAR(255) NOT NULL,
+            variant_url VARCHAR(255) NOT NULL,
+            width INT NOT NULL,
+            height INT NOT NULL,
+            format VARCHAR(10) NOT NULL,
+            UNIQUE KEY unique_variant (source_url, format, width)
+        ) ENGINE=InnoDB
+    ''')
+
+
+def _blobs(cursor):
+    # Content-addressed upload store; ref_count covers post_images and users.profile_photo_url (see blobs.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 CHAR(64) PRIMARY KEY,
+            url VARCHAR(255) NOT NULL,
+            size BIGINT NOT NULL,
+            content_type VARCHAR(100),
+            ref_count INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_blob_url (url)
+        ) ENGINE=InnoDB
+    ''')
+
+
+def _sessions(cursor):
+    # Login sessions by SHA-256 of their opaque token (see sessions.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash CHAR(64) PRIMARY KEY,
+            student_id INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL,
+            KEY idx_sessions_expires (expires_at),
+            FOREIGN KEY (student_id) REFERENCES users(student_id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    ''')
+
+
+def _post_changes(cursor):
+    # Delta sync (see changes.py): changed posts by updated_at, deleted ones from the tombstone log
+    _ensure_index(cursor, "posts", "idx_posts_updated", "updated_at")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_tombstones (
+            post_id INT PRIMARY KEY,
+            deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_tombstones_deleted (deleted_at)
+        ) ENGINE=InnoDB
+    ''')
+
+
+def _places(cursor):
+    # Normalized place catalog for filtering and counting the board by place (see places.py and facets.py).
+    # Binary collation: keys are already case folded, and accent-insensitive matching would merge places
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS places (
+            place_id INT AUTO_INCREMENT PRIMARY KEY,
+            place_key VARCHAR({places.MAX_LENGTH}) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+            name VARCHAR({places.MAX_LENGTH}) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_place_key (place_key)
+        ) ENGINE=InnoDB
+    ''')
+    _ensure_column(cursor, "posts", "place_id", '''
+        ADD COLUMN place_id INT NULL AFTER place,
+        ADD INDEX idx_posts_place_created (place_id, created_at),
+        ADD CONSTRAINT fk_posts_place FOREIGN KEY (place_id) REFERENCES places(place_id)
+    ''')
+    # The board's faculty filter selects authors by faculty
+    _ensure_index(cursor, "users", "idx_users_faculty", "faculty")
+    _backfill_places(cursor)
+
+
+# ---------- SQLite forms of the migrations above ----------
+def _initial_schema_sqlite(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS users (
+            student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            full_name TEXT NOT NULL,
+            faculty TEXT NOT NULL {_check("faculty", FACULTIES)},
+            class_year TEXT NOT NULL {_check("class_year", CLASS_YEARS)},
+            phone TEXT NOT NULL,
+            email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            password TEXT NOT NULL,
+            profile_photo_url TEXT,
+            created_at TIMESTAMP DEFAULT {SQLITE_NOW},
+            updated_at TIMESTAMP DEFAULT {SQLITE_NOW}
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS social_profiles (
+            contact_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            platform TEXT NOT NULL {_check("platform", PLATFORMS)},
+            profile_url TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT {SQLITE_NOW}
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_social_profiles (
+            user_social_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL REFERENCES users(student_id) ON DELETE CASCADE,
+            contact_id INTEGER NOT NULL REFERENCES social_profiles(contact_id) ON DELETE CASCADE,
+            UNIQUE (student_id, contact_id)
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS posts (
+            post_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL REFERENCES users(student_id) ON DELETE CASCADE,
+            item_name TEXT NOT NULL,
+            item_status TEXT DEFAULT 'lost' {_check("item_status", ITEM_STATUSES)},
+            place TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT {SQLITE_NOW},
+            updated_at TIMESTAMP DEFAULT {SQLITE_NOW},
+            expires_at DATETIME GENERATED ALWAYS AS (datetime(created_at, '+{POST_LIFETIME_DAYS} days')) STORED
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS post_images (
+            post_image_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER NOT NULL REFERENCES posts(post_id) ON DELETE CASCADE,
+            image_url TEXT NOT NULL,
+            image_order INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT {SQLITE_NOW}
+        )
+    ''')
+    # SQLite does not index foreign keys by itself; InnoDB does
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_student ON posts (student_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_post_images_post ON post_images (post_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_social_contact ON user_social_profiles (contact_id)")
+    # ON UPDATE CURRENT_TIMESTAMP, unless the statement set updated_at itself
+    for table, key in (("users", "student_id"), ("posts", "post_id")):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_updated_at AFTER UPDATE ON {table}
+            FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN
+                UPDATE {table} SET updated_at = {SQLITE_NOW} WHERE {key} = NEW.{key};
+            END
+        ''')
+
+
+def _feed_index_sqlite(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_status_expires_created "
+                   "ON posts (item_status, expires_at, created_at)")
+
+
+def _image_variants_sqlite(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_variants (
+            variant_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_url TEXT NOT NULL,
+            variant_url TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            format TEXT NOT NULL,
+            UNIQUE (source_url, format, width)
+        )
+    ''')
+
+
+def _blobs_sqlite(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            content_type TEXT,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT {SQLITE_NOW}
+        )
+    ''')
+
+
+def _sessions_sqlite(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            student_id INTEGER NOT NULL REFERENCES users(student_id) ON DELETE CASCADE,
+            created_at TIMESTAMP DEFAULT {SQLITE_NOW},
+            expires_at DATETIME NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_student ON sessions (student_id)")
+
+
+def _post_changes_sqlite(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_updated ON posts (updated_at)")
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS post_tombstones (
+            post_id INTEGER PRIMARY KEY,
+            deleted_at TIMESTAMP NOT NULL DEFAULT {SQLITE_NOW}
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_deleted ON post_tombstones (deleted_at)")
+
+
+def _places_sqlite(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS places (
+            place_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            place_key TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT {SQLITE_NOW}
+        )
+    ''')
+    cursor.execute("SELECT COUNT(*) FROM pragma_table_info('posts') WHERE name = 'place_id'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("ALTER TABLE posts ADD COLUMN place_id INTEGER REFERENCES places(place_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_place_created ON posts (place_id, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_faculty ON users (faculty)")
+    _backfill_places(cursor, sqlite=True)
+
+
+# (version, description, apply(cursor) for MySQL, apply(cursor) for SQLite) in order;
+# never edit or renumber an applied one
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema, _initial_schema_sqlite),
+    (2, "feed index on posts(item_status, expires_at, created_at)", _feed_index, _feed_index_sqlite),
+    (3, "image_variants table", _image_variants, _image_variants_sqlite),
+    (4, "blobs table", _blobs, _blobs_sqlite),
+    (5, "sessions table", _sessions, _sessions_sqlite),
+    (6, "posts(updated_at) index and post_tombstones table", _post_changes, _post_changes_sqlite),
+    (7, "places catalog, posts.place_id and users(faculty) index", _places, _places_sqlite),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor):
+    """Highest applied migration, or 0 for a database that has never been migrated."""
+    if DB_BACKEND == "sqlite":
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+    else:
+        cursor.execute('''
+            SELECT COUNT(*) FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = 'schema_version'
+        ''')
+    if cursor.fetchone()[0] == 0:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def check_schema(conn):
+    """(current, latest) schema versions; one query on an already open connection."""
+    cursor = conn.cursor()
+    try:
+        return current_version(cursor), LATEST_VERSION
+    finally:
+        cursor.close()
+
+
+def migrate():
+    """Create the database if needed and apply every pending migration. Returns the versions applied."""
+    if DB_BACKEND == "sqlite":
+        return _migrate_sqlite()
+    conn = mysql.connector.connect(**{k: v for k, v in DB_CONFIG.items() if k != "database"})
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_CONFIG['database']}")
+        cursor.execute(f"USE {DB_CONFIG['database']}")
+
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError(f"Another migration run still holds the lock after {LOCK_TIMEOUT}s")
+        try:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                ) ENGINE=InnoDB
+            ''')
+            # Read after taking the lock: another container may have just migrated
+            current = current_version(cursor)
+            applied = []
+            for version, description, apply, _ in MIGRATIONS:
+                if version <= current:
+                    continue
+                print(f"🟡 Applying migration {version}: {description}")
+                apply(cursor)
+                cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                               (version, description))
+                conn.commit()
+                applied.append(version)
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _migrate_sqlite():
+    import sqlite_backend
+
+    conn = sqlite_backend.open_database(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        applied = []
+        for version, description, _, apply in MIGRATIONS:
+            # Taking the write lock first means a concurrent run waits here, then sees our versions
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP DEFAULT {SQLITE_NOW}
+                    )
+                ''')
+                if version <= current_version(cursor):
+                    conn.rollback()
+                    continue
+                print(f"🟡 Applying migration {version}: {description}")
+                apply(cursor)
+                cursor.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                               (version, description))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            applied.append(version)
+        return applied
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def main(argv):
+    command = argv[0] if argv else "migrate"
+    if command == "migrate":
+        applied = migrate()
+        print(f"✅ Applied migrations {applied}" if applied else "✅ Schema is up to date")
+    elif command == "status":
+        with db_connection() as conn:
+            current, latest = check_schema(conn)
+        print(f"Schema version {current} of {latest}" + ("" if current == latest else " (run: python migrations.py)"))
+    else:
+        sys.exit("usage: python migrations.py [migrate|status]")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
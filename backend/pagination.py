@@ -0,0 +1,42 @@
+"""Opaque keyset-pagination cursors.
+
+A cursor is the sort key of the last row on the previous page, JSON-encoded and
+base64url-wrapped so clients treat it as an opaque token. Datetimes are kept as
+ISO strings and turned back into datetime objects on decode.
+"""
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, *types):
+    """Decode a cursor produced by encode_cursor, checking it holds one value per type."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise ValueError("wrong number of values")
+        return tuple(datetime.fromisoformat(v) if t is datetime else t(v) for t, v in zip(types, payload))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def page(rows, limit, key):
+    """Split a LIMIT limit+1 result into (rows, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
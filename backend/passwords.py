@@ -0,0 +1,81 @@
+"""Password hashing.
+
+Passwords are stored as PBKDF2-HMAC-SHA256 with a random salt:
+
+    pbkdf2_sha256$<iterations>$<salt, base64>$<hash, base64>
+
+Hashing is deliberately slow (ITERATIONS rounds), so it never runs on the
+event loop: hash_password() and verify_password() hand the work to a small
+dedicated thread pool (hashlib releases the GIL while it iterates). A burst
+of logins queues there, at most HASH_WORKERS at a time, while every other
+request keeps being served.
+
+Rows written before hashing was introduced hold the plaintext password.
+verify_password() still accepts those, and needs_rehash() flags them so
+login can store a proper hash in their place.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+ALGORITHM = "pbkdf2_sha256"
+ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "260000"))
+SALT_BYTES = 16
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password")
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _derive(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+
+
+def _hash_sync(password, iterations=ITERATIONS):
+    salt = secrets.token_bytes(SALT_BYTES)
+    return f"{ALGORITHM}${iterations}${_b64(salt)}${_b64(_derive(password, salt, iterations))}"
+
+
+def _verify_sync(password, stored):
+    if not is_hashed(stored):
+        # Legacy plaintext row; still compared in constant time
+        return hmac.compare_digest(password.encode("utf-8"), (stored or "").encode("utf-8"))
+    _algorithm, iterations, salt, expected = stored.split("$")
+    actual = _derive(password, base64.b64decode(salt), int(iterations))
+    return hmac.compare_digest(actual, base64.b64decode(expected))
+
+
+# Verified against when the email is unknown, so both outcomes take the same time
+_DUMMY_HASH = _hash_sync(secrets.token_urlsafe(16))
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(ALGORITHM + "$")
+
+
+def needs_rehash(stored):
+    """True for plaintext rows and hashes made with fewer iterations than ITERATIONS."""
+    return not is_hashed(stored) or int(stored.split("$")[1]) < ITERATIONS
+
+
+async def _in_executor(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+async def hash_password(password):
+    return await _in_executor(_hash_sync, password)
+
+
+async def verify_password(password, stored):
+    """Check password against a stored value; stored=None (unknown user) always fails, just as slowly."""
+    if stored is None:
+        await _in_executor(_verify_sync, password, _DUMMY_HASH)
+        return False
+    return await _in_executor(_verify_sync, password, stored)
@@ -0,0 +1,60 @@
+"""Normalized catalog of the places posts are about.
+
+posts.place stays the text the author typed and is shown as typed. Next to
+it, posts.place_id points at a row of the places table, keyed by the
+normalized text: Unicode NFKC, case folded, whitespace collapsed. "Library",
+"library " and "LIBRARY" are one place, so the board can filter and count
+by place with an index instead of comparing free text. A catalog row keeps
+the first spelling seen as its display name. Rows are only ever added, so a
+place_id never changes meaning.
+
+Migration 7 builds the catalog from existing posts; create_post,
+update_post and writers.insert_posts resolve place_id as they write.
+"""
+import unicodedata
+
+MAX_LENGTH = 100   # places.name and places.place_key, as posts.place
+
+
+def display(name):
+    """The name as shown in the catalog: surrounding and repeated whitespace removed."""
+    return " ".join((name or "").split())[:MAX_LENGTH]
+
+
+def normalize(name):
+    """Catalog key for a place text; empty for text with no place in it."""
+    return " ".join(unicodedata.normalize("NFKC", name or "").casefold().split())[:MAX_LENGTH]
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+async def _lookup(db, keys, locking=False):
+    rows = await db.fetch_all(
+        f"SELECT place_id, place_key FROM places WHERE place_key IN ({_placeholders(keys)})"
+        + (" LOCK IN SHARE MODE" if locking else ""), list(keys)
+    )
+    return {row['place_key']: row['place_id'] for row in rows}
+
+
+async def resolve(db, names):
+    """{name: place_id} for place texts, adding catalog rows for new places; None for empty texts.
+
+    One indexed lookup when every place is known, three statements otherwise.
+    Call it inside the transaction that writes the posts.
+    """
+    keys = {name: normalize(name) for name in set(names)}
+    wanted = {key: display(name) for name, key in keys.items() if key}
+    if not wanted:
+        return {name: None for name in keys}
+
+    ids = await _lookup(db, wanted)
+    missing = [key for key in wanted if key not in ids]
+    if missing:
+        # IGNORE: a concurrent writer may add the same place first. Its row is newer than our
+        # transaction's snapshot, so it is read back with a locking read, which sees the latest version
+        await db.executemany("INSERT IGNORE INTO places (place_key, name) VALUES (%s, %s)",
+                             [(key, wanted[key]) for key in missing])
+        ids.update(await _lookup(db, missing, locking=True))
+    return {name: ids.get(key) for name, key in keys.items()}
@@ -0,0 +1,165 @@
+"""Per-request query profiler (QUERY_PROFILER=1; off by default).
+
+ProfilerMiddleware gives each request a QueryProfile in a context variable;
+AsyncConnection reports every statement it runs to the current one (see
+database.py). Per request it keeps:
+
+  * the number of statements and the total time spent in the driver;
+  * statement shapes (whitespace collapsed, IN lists and inline literals
+    folded) seen N_PLUS_ONE times or more: the signature of a loop issuing
+    one query per row, which should be a single batched query (loaders.py);
+  * statements slower than SLOW_MS, with the database's plan for SELECTs
+    (EXPLAIN on MySQL, EXPLAIN QUERY PLAN on SQLite), run on the same
+    connection right after the statement.
+
+The summary goes out in an X-Query-Profile response header. The last
+BUFFER_SIZE profiles are kept in a ring buffer for GET /api/debug/queries,
+which requires QUERY_PROFILER_TOKEN in an X-Profiler-Token header. SQL text
+is recorded without its parameters. Statements run through a plain sync
+connection (db_connection) are not profiled.
+"""
+import hmac
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+
+ENABLED = os.getenv("QUERY_PROFILER", "0").lower() in ("1", "true", "on")
+SLOW_MS = float(os.getenv("QUERY_PROFILER_SLOW_MS", "100"))
+N_PLUS_ONE = int(os.getenv("QUERY_PROFILER_N_PLUS_ONE", "3"))
+BUFFER_SIZE = int(os.getenv("QUERY_PROFILER_BUFFER", "200"))
+TOKEN = os.getenv("QUERY_PROFILER_TOKEN", "")
+MAX_SLOW = 10   # slow statements kept per request
+
+HEADER = b"x-query-profile"
+
+_current = ContextVar("query_profile", default=None)
+_recent = deque(maxlen=BUFFER_SIZE)
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+\b")
+_EXPLAINABLE = re.compile(r"\s*(SELECT|WITH)\b", re.I)
+
+
+@lru_cache(maxsize=2048)
+def shape(sql):
+    """The statement with the parts that vary between calls of the same query folded away."""
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _IN_LIST.sub("(...)", sql)
+    return _NUMBER.sub("N", _STRING.sub("'?'", sql))
+
+
+def current():
+    return _current.get()
+
+
+class QueryProfile:
+    __slots__ = ("queries", "db_seconds", "shapes", "slow", "_lock")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes = Counter()
+        self.slow = []
+        self._lock = threading.Lock()
+
+    def record(self, conn, sql, params, many, elapsed):
+        """Called on the DB thread right after a statement ran on conn."""
+        key = shape(sql)
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += elapsed
+            self.shapes[key] += 1
+            keep = elapsed * 1000 >= SLOW_MS and len(self.slow) < MAX_SLOW
+        if keep:
+            plan = _explain(conn, sql, params) if not many and _EXPLAINABLE.match(sql) else None
+            with self._lock:
+                self.slow.append({"sql": key, "ms": round(elapsed * 1000, 2), "plan": plan})
+
+    def n_plus_one(self):
+        return [{"sql": sql, "count": count} for sql, count in self.shapes.most_common() if count >= N_PLUS_ONE]
+
+    def header(self):
+        return (f"queries={self.queries}; db_ms={self.db_seconds * 1000:.2f}; "
+                f"n_plus_one={len(self.n_plus_one())}; slow={len(self.slow)}")
+
+
+def _explain(conn, sql, params):
+    from database import DB_BACKEND
+
+    prefix = "EXPLAIN QUERY PLAN " if DB_BACKEND == "sqlite" else "EXPLAIN "
+    cursor = conn.cursor()
+    try:
+        cursor.execute(prefix + sql, params or ())
+        columns = [col[0] for col in cursor.description]
+        return [{column: value if isinstance(value, (int, float, str, type(None))) else str(value)
+                 for column, value in zip(columns, row)} for row in cursor.fetchall()]
+    except Exception as e:
+        # The plan is a diagnostic; never fail the request over it
+        return [{"error": str(e)}]
+    finally:
+        cursor.close()
+
+
+class ProfilerMiddleware:
+    """Profiles each HTTP request's queries, adds X-Query-Profile and files the result in the ring buffer."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = QueryProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        status = 500
+
+        async def profiled_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Queries run by a streamed body after this point reach the ring buffer only
+                message["headers"] = list(message.get("headers", [])) + [(HEADER, profile.header().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            _recent.append({
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route.path if route is not None else None,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "queries": profile.queries,
+                "db_ms": round(profile.db_seconds * 1000, 2),
+                "n_plus_one": profile.n_plus_one(),
+                "slow": profile.slow,
+            })
+
+
+def authorized(token):
+    return bool(TOKEN) and token is not None and hmac.compare_digest(token.encode(), TOKEN.encode())
+
+
+def recent(flagged_only=False):
+    """Profiles in the ring buffer, newest first; flagged_only keeps those with N+1 shapes or slow statements."""
+    profiles = list(reversed(_recent))
+    if flagged_only:
+        profiles = [p for p in profiles if p["n_plus_one"] or p["slow"]]
+    return profiles
+
+
+def settings():
+    return {"enabled": ENABLED, "slow_ms": SLOW_MS, "n_plus_one": N_PLUS_ONE, "buffer_size": BUFFER_SIZE}
@@ -0,0 +1,44 @@
+"""Structured, sampled event logging.
+
+Each event is one JSON line on the "lostfound.events" logger (stdout):
+
+    {"ts": 1760760000.123, "event": "request", "sample_rate": 0.01, "route": "/posts", ...}
+
+Only a sample of events is written: LOG_SAMPLE_RATE, from 0 (off, the
+default) to 1 (everything). sample_rate is part of each line, so counts can
+be scaled back up. Callers check sampled() before building the fields, so
+with logging off an event costs one comparison:
+
+    if request_log.sampled():
+        request_log.event("register", student_id=student_id, social_profiles=len(links))
+
+Failures worth reading every time are logged with event() directly,
+unsampled. Never log passwords, tokens or other personal data.
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+import orjson
+
+SAMPLE_RATE = min(max(float(os.getenv("LOG_SAMPLE_RATE", "0")), 0.0), 1.0)
+
+logger = logging.getLogger("lostfound.events")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def sampled():
+    """Whether to log this occurrence; False without touching the RNG when sampling is off."""
+    return SAMPLE_RATE > 0 and (SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE)
+
+
+def event(name, **fields):
+    line = {"ts": round(time.time(), 3), "event": name, "sample_rate": SAMPLE_RATE, **fields}
+    logger.info(orjson.dumps(line, default=str).decode())
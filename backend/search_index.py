@@ -0,0 +1,308 @@
+"""In-process inverted index for searching the public post board.
+
+Replaces the leading-wildcard LIKE scan in get_all_posts. Only active
+(lost/found) posts are indexed; the routes and the expiry engine keep it current.
+
+Tokenizer: Thai has no spaces between words, so each run of Thai characters is
+indexed as overlapping character bigrams; everything else is split into
+lowercase alphanumeric words. The last word of a query also matches words it
+is a prefix of, so results update while the user is still typing.
+
+Scoring is BM25 over three fields with different weights (item name, author
+name, description). Author names live in their own postings keyed by
+student_id, so renaming a user touches one entry instead of all their posts.
+
+A rebuild replaces the index with a snapshot that is already out of date
+when it is swapped in. Every route and the expiry engine note the posts and
+authors they change in index_writes; build_search_index starts the log
+before reading the snapshot and, after the swap, re-reads what it recorded,
+so a write made in between is not lost.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+
+TOKEN_RE = re.compile(r"[\u0E00-\u0E7F]+|[^\W_]+")
+THAI_RE = re.compile(r"[\u0E00-\u0E7F]")
+
+FIELD_WEIGHTS = {"item_name": 3.0, "author": 2.0, "description": 1.0}
+PREFIX_WEIGHT = 0.6      # a prefix hit counts a bit less than the whole word
+MAX_PREFIX_EXPANSION = 50
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+INDEX_QUERY = '''
+    SELECT p.post_id, p.student_id, p.item_name, p.description, p.item_status, p.place, p.place_id,
+           p.created_at, p.expires_at
+    FROM posts p
+    WHERE p.item_status IN ('lost', 'found')
+    AND p.expires_at > CURRENT_TIMESTAMP
+'''
+INDEX_POST_QUERY = INDEX_QUERY + " AND p.post_id = %s"
+INDEX_POSTS_QUERY = INDEX_QUERY + " AND p.post_id IN ({})"
+AUTHORS_QUERY = "SELECT student_id, full_name, faculty FROM users"
+
+
+def tokenize(text):
+    """Lowercased search tokens: Thai character bigrams and whole words for everything else."""
+    tokens = []
+    for run in TOKEN_RE.findall((text or "").lower()):
+        if THAI_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class WriteLog:
+    """Posts and authors written while a rebuild is in progress (see the module docstring)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._posts = None     # recorded post_ids; None while no rebuild is running
+        self._authors = None   # recorded student_ids
+
+    def start(self):
+        with self._lock:
+            if self._posts is None:
+                self._posts, self._authors = set(), set()
+
+    def post(self, post_id):
+        with self._lock:
+            if self._posts is not None:
+                self._posts.add(post_id)
+
+    def author(self, student_id):
+        with self._lock:
+            if self._authors is not None:
+                self._authors.add(student_id)
+
+    def take(self):
+        """(post_ids, student_ids) recorded since the last take. Recording stops once both are empty,
+        so nothing written after a replay's reads can be overwritten by them."""
+        with self._lock:
+            posts, authors = self._posts or set(), self._authors or set()
+            if posts or authors:
+                self._posts, self._authors = set(), set()
+            else:
+                self._posts = self._authors = None
+            return posts, authors
+
+    def stop(self):
+        with self._lock:
+            self._posts = self._authors = None
+
+
+class _Doc:
+    __slots__ = ("student_id", "item_status", "expires_at", "length", "tokens")
+
+    def __init__(self, student_id, item_status, expires_at, length, tokens):
+        self.student_id = student_id
+        self.item_status = item_status
+        self.expires_at = expires_at
+        self.length = length
+        self.tokens = tokens
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}         # token -> {post_id: weighted term frequency}
+        self._author_postings = {}  # token -> {student_id: weighted term frequency}
+        self._author_tokens = {}    # student_id -> tokens of their name
+        self._author_posts = {}     # student_id -> {post_id}
+        self._docs = {}             # post_id -> _Doc
+        self._vocab = []            # sorted tokens, for prefix lookups
+        self._total_length = 0
+        self.built_at = None        # set by rebuild(); until then the index may be incomplete
+
+    # ---------- maintenance ----------
+    def _add_vocab(self, token):
+        if self._vocab is None:  # bulk load in progress; sorted once at the end
+            return
+        i = bisect.bisect_left(self._vocab, token)
+        if i == len(self._vocab) or self._vocab[i] != token:
+            self._vocab.insert(i, token)
+
+    def _drop_vocab(self, token):
+        if self._vocab is None or token in self._postings or token in self._author_postings:
+            return
+        i = bisect.bisect_left(self._vocab, token)
+        if i < len(self._vocab) and self._vocab[i] == token:
+            del self._vocab[i]
+
+    def add_post(self, post_id, student_id, item_name, description, item_status, expires_at=None):
+        """Index or re-index a post. Posts that are not lost/found are removed instead."""
+        with self._lock:
+            self.remove_post(post_id)
+            if item_status not in ("lost", "found"):
+                return
+
+            weights = Counter()
+            for token in tokenize(item_name):
+                weights[token] += FIELD_WEIGHTS["item_name"]
+            for token in tokenize(description):
+                weights[token] += FIELD_WEIGHTS["description"]
+
+            for token, weight in weights.items():
+                self._postings.setdefault(token, {})[post_id] = weight
+                self._add_vocab(token)
+
+            length = sum(weights.values())
+            self._docs[post_id] = _Doc(student_id, item_status, expires_at, length, tuple(weights))
+            self._author_posts.setdefault(student_id, set()).add(post_id)
+            self._total_length += length
+
+    def remove_post(self, post_id):
+        with self._lock:
+            doc = self._docs.pop(post_id, None)
+            if doc is None:
+                return
+            self._total_length -= doc.length
+            for token in doc.tokens:
+                posting = self._postings.get(token)
+                if posting is not None:
+                    posting.pop(post_id, None)
+                    if not posting:
+                        del self._postings[token]
+                        self._drop_vocab(token)
+            posts = self._author_posts.get(doc.student_id)
+            if posts is not None:
+                posts.discard(post_id)
+
+    def set_author(self, student_id, full_name):
+        with self._lock:
+            for token in self._author_tokens.pop(student_id, ()):
+                posting = self._author_postings.get(token)
+                if posting is not None:
+                    posting.pop(student_id, None)
+                    if not posting:
+                        del self._author_postings[token]
+                        self._drop_vocab(token)
+
+            tokens = Counter(tokenize(full_name))
+            for token, count in tokens.items():
+                self._author_postings.setdefault(token, {})[student_id] = count * FIELD_WEIGHTS["author"]
+                self._add_vocab(token)
+            self._author_tokens[student_id] = tuple(tokens)
+
+    def has_author(self, student_id):
+        return student_id in self._author_tokens
+
+    def rebuild(self, posts, authors):
+        """Replace the whole index from INDEX_QUERY and AUTHORS_QUERY rows."""
+        fresh = SearchIndex()
+        fresh._vocab = None
+        for author in authors:
+            fresh.set_author(author['student_id'], author['full_name'])
+        for post in posts:
+            fresh.add_post(post['post_id'], post['student_id'], post['item_name'],
+                           post['description'], post['item_status'], post['expires_at'])
+        fresh._vocab = sorted(set(fresh._postings) | set(fresh._author_postings))
+        fresh.built_at = datetime.now()
+        with self._lock:
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != "_lock"})
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ---------- querying ----------
+    def _expand(self, term, prefix):
+        """Tokens a query term matches, with the weight each hit carries."""
+        matches = [(term, 1.0)]
+        if prefix:
+            i = bisect.bisect_left(self._vocab, term)
+            while i < len(self._vocab) and len(matches) <= MAX_PREFIX_EXPANSION:
+                token = self._vocab[i]
+                if not token.startswith(term):
+                    break
+                if token != term:
+                    matches.append((token, PREFIX_WEIGHT))
+                i += 1
+        return matches
+
+    def _term_scores(self, term, prefix, avg_length):
+        """post_id -> BM25 contribution of one query term (best matching token wins)."""
+        n_docs = len(self._docs)
+        scores = {}
+        for token, hit_weight in self._expand(term, prefix):
+            posting = self._postings.get(token, {})
+            author_hits = self._author_postings.get(token, {})
+            df = len(posting) + sum(len(self._author_posts.get(sid, ())) for sid in author_hits)
+            if df == 0:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+            def bm25(tf, length):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                return hit_weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            for post_id, tf in posting.items():
+                score = bm25(tf, self._docs[post_id].length)
+                if score > scores.get(post_id, 0.0):
+                    scores[post_id] = score
+            for student_id, tf in author_hits.items():
+                for post_id in self._author_posts.get(student_id, ()):
+                    score = bm25(tf, self._docs[post_id].length)
+                    if score > scores.get(post_id, 0.0):
+                        scores[post_id] = score
+        return scores
+
+    def search(self, query, item_status=None, limit=None, after=None, now=None, where=None):
+        """Ranked [(score, post_id)] of active posts matching every query term.
+
+        Results are ordered by score, then newest post_id. `after` is the
+        (score, post_id) of the last result already shown, for pagination.
+        `where(post_id)` filters further on what the index does not hold (see facets.py).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        now = now or datetime.now()
+
+        with self._lock:
+            if not self._docs:
+                return []
+            avg_length = self._total_length / len(self._docs) or 1.0
+            # Only the final word may still be incomplete while the user types
+            prefix_term = terms[-1] if not THAI_RE.match(terms[-1]) else None
+
+            per_term = sorted(
+                (self._term_scores(term, term == prefix_term, avg_length) for term in terms),
+                key=len
+            )
+            candidates = per_term[0]
+            for scores in per_term[1:]:
+                candidates = {pid: s + scores[pid] for pid, s in candidates.items() if pid in scores}
+                if not candidates:
+                    return []
+
+            results = []
+            for post_id, score in candidates.items():
+                doc = self._docs[post_id]
+                if item_status and doc.item_status != item_status:
+                    continue
+                if doc.expires_at is not None and doc.expires_at <= now:
+                    continue
+                if where is not None and not where(post_id):
+                    continue
+                results.append((round(score, 6), post_id))
+
+        if after is not None:
+            after_score, after_id = after
+            results = [r for r in results if r[0] < after_score or (r[0] == after_score and r[1] < after_id)]
+        order = lambda r: (-r[0], -r[1])
+        if limit is not None:
+            return heapq.nsmallest(limit, results, key=order)
+        return sorted(results, key=order)
+
+
+search_index = SearchIndex()
+index_writes = WriteLog()
@@ -0,0 +1,113 @@
+"""Server-side login sessions.
+
+Login issues an opaque random token. The browser gets it in an HttpOnly
+cookie, and the login response body carries it too, for clients that send it
+as `Authorization: Bearer <token>` instead. Only the token's SHA-256 is stored
+in the sessions table, so a leaked table cannot be replayed.
+
+Routes resolve the token to a student_id through session_cache (see
+cache.py): a hit costs no database round trip, a miss reads one row by
+primary key. Concurrent misses on the same token share a single query.
+
+Sessions last SESSION_HOURS from login. Logout deletes the row and the cache
+entry; expired rows are removed by purge_expired() on the scheduler.
+"""
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Request
+
+from cache import session_cache
+from database import connection, transaction
+
+SESSION_HOURS = int(os.getenv("SESSION_HOURS", "24"))
+COOKIE_NAME = "lostfound_session"
+COOKIE_SECURE = os.getenv("SESSION_COOKIE_SECURE", "0") == "1"
+TOKEN_BYTES = 32
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def token_from(request):
+    """The session token a request carries, from the Authorization header or the cookie."""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, credentials = authorization.partition(" ")
+    if scheme.lower() == "bearer" and credentials.strip():
+        return credentials.strip()
+    return request.cookies.get(COOKIE_NAME)
+
+
+async def create(db, student_id):
+    """Start a session on an open connection; returns (token, expires_at)."""
+    token = secrets.token_urlsafe(TOKEN_BYTES)
+    expires_at = (datetime.now() + timedelta(hours=SESSION_HOURS)).replace(microsecond=0)
+    await db.execute('''
+        INSERT INTO sessions (token_hash, student_id, expires_at) VALUES (%s, %s, %s)
+    ''', (_token_hash(token), student_id, expires_at))
+    return token, expires_at
+
+
+async def resolve(token):
+    """student_id of a live session, or None."""
+    if not token:
+        return None
+    key = _token_hash(token)
+
+    async def load():
+        async with connection() as db:
+            row = await db.fetch_one(
+                "SELECT student_id, expires_at FROM sessions WHERE token_hash = %s", (key,)
+            )
+        return (row['student_id'], row['expires_at']) if row else None
+
+    session = await session_cache.get_or_load(key, load)
+    if session is None:
+        return None
+    student_id, expires_at = session
+    if expires_at <= datetime.now():
+        session_cache.invalidate(key)
+        return None
+    return student_id
+
+
+async def revoke(token):
+    if not token:
+        return
+    key = _token_hash(token)
+    async with transaction() as db:
+        await db.execute("DELETE FROM sessions WHERE token_hash = %s", (key,))
+    session_cache.invalidate(key)
+
+
+async def purge_expired():
+    async with transaction() as db:
+        result = await db.execute("DELETE FROM sessions WHERE expires_at < %s", (datetime.now(),))
+    if result.rowcount:
+        print(f"🧹 Removed {result.rowcount} expired sessions")
+
+
+def set_cookie(response, token, expires_at):
+    response.set_cookie(COOKIE_NAME, token, max_age=int((expires_at - datetime.now()).total_seconds()),
+                        httponly=True, samesite="lax", secure=COOKIE_SECURE)
+
+
+def clear_cookie(response):
+    response.delete_cookie(COOKIE_NAME, httponly=True, samesite="lax", secure=COOKIE_SECURE)
+
+
+async def current_student(request: Request):
+    """Route dependency: the signed-in student's id, or 401."""
+    student_id = await resolve(token_from(request))
+    if student_id is None:
+        raise HTTPException(status_code=401, detail="Not signed in or session expired")
+    return student_id
+
+
+def require_self(student_id, session_student):
+    """403 unless the signed-in student is the one the request acts for."""
+    if str(student_id) != str(session_student):
+        raise HTTPException(status_code=403, detail="Not allowed for another user")
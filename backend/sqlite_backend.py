@@ -0,0 +1,229 @@
+"""SQLite storage for single-node installs and CI (DB_BACKEND=sqlite).
+
+The rest of the app is written against MySQL: %s placeholders, dictionary
+cursors, INSERT IGNORE, CURRENT_TIMESTAMP - INTERVAL n DAY. connect() returns
+an object with the subset of the mysql-connector connection API the app uses,
+so database.py pools it with the same ConnectionPool, and each statement is
+rewritten into SQLite's dialect once (translate() is memoized) before it runs.
+
+The database is in WAL mode, so readers never wait for the writer. Every
+pooled connection has its own read-only SQLite connection; statements that
+write go to one writer connection per process, which a pooled connection
+takes over with its first write (BEGIN IMMEDIATE) and hands back on commit,
+rollback or close. Everything that connection runs in between, reads
+included, goes to the writer, so a transaction sees its own changes. A write
+transaction therefore holds up other writers until it ends, as a row lock
+held to the end of an InnoDB transaction would; keep them short. A locking
+read (FOR UPDATE, FOR SHARE, LOCK IN SHARE MODE) takes over the writer like
+a write, so the rows it returns cannot change before the transaction ends.
+
+Because there is a single writer, the rows of one executemany() INSERT get
+consecutive ids, and lastrowid reports the first of them, as mysql-connector
+does for its multi-row INSERT (writers.py relies on this).
+
+Timestamps are stored as local-time 'YYYY-MM-DD HH:MM:SS' text, which sorts
+and compares like the DATETIME values it stands for; columns declared
+TIMESTAMP or DATETIME come back as datetime objects. The schema itself is in
+migrations.py.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))          # page cache per connection
+MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))           # memory-mapped reads
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # wait for other processes' locks
+STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))    # prepared statements kept per connection
+WRITER_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for the writer
+
+NOW = "datetime('now', 'localtime')"
+
+# MySQL constructs used by the app's queries, in the order they are rewritten
+_REWRITES = [
+    (re.compile(r"CURRENT_TIMESTAMP\s*([-+])\s*INTERVAL\s+(%s|\d+)\s+(SECOND|MINUTE|HOUR|DAY)\b", re.I),
+     lambda m: f"datetime('now', 'localtime', '{m[1]}' || {m[2]} || ' {m[3].lower()}s')"),
+    (re.compile(r"\bCURRENT_TIMESTAMP\b", re.I), lambda m: NOW),
+    (re.compile(r"\b(INSERT|UPDATE)\s+IGNORE\b", re.I), lambda m: f"{m[1]} OR IGNORE"),
+    (re.compile(r"\bGREATEST\(", re.I), lambda m: "MAX("),
+    (re.compile(r"\bLEAST\(", re.I), lambda m: "MIN("),
+    (re.compile(r"@@auto_increment_increment\b", re.I), lambda m: "1"),
+    # Locking reads: they run on the writer (see _route), which no one else can change rows through
+    (re.compile(r"\s+(FOR\s+(SHARE|UPDATE)|LOCK\s+IN\s+SHARE\s+MODE)\b", re.I), lambda m: ""),
+    (re.compile(r"%s"), lambda m: "?"),
+]
+_READ = re.compile(r"\s*(SELECT|WITH|EXPLAIN)\b", re.I)
+_LOCKING = re.compile(r"\b(FOR\s+(SHARE|UPDATE)|LOCK\s+IN\s+SHARE\s+MODE)\s*$", re.I)
+_INSERT = re.compile(r"\s*(INSERT|REPLACE)\b", re.I)
+
+
+class WriterTimeout(sqlite3.OperationalError):
+    """Another connection kept the writer for longer than the checkout timeout."""
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    for pattern, replace in _REWRITES:
+        sql = pattern.sub(replace, sql)
+    return sql
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+for _type in ("TIMESTAMP", "DATETIME"):
+    sqlite3.register_converter(_type, lambda value: datetime.fromisoformat(value.decode()))
+
+
+def open_database(path, readonly=False):
+    """A raw sqlite3 connection with the pragmas every connection needs. Statements are autocommitted
+    unless the caller issues BEGIN."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")   # durable at checkpoints; safe with WAL
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_MB * 1024}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_MB * 1024 * 1024}")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn.execute("PRAGMA journal_mode = WAL")
+    return conn
+
+
+class _Writer:
+    """The process's one writing connection and the lock that says who is using it."""
+
+    def __init__(self, path):
+        self.conn = open_database(path)
+        self.lock = threading.Lock()
+        self.owner = None
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _writer(path):
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = _Writer(path)
+        return _writers[path]
+
+
+class Cursor:
+    """A mysql-connector style cursor: %s parameters, tuple or dict rows."""
+
+    def __init__(self, conn, dictionary):
+        self._conn = conn
+        self._dictionary = dictionary
+        self._cursor = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    @property
+    def description(self):
+        return self._cursor.description if self._cursor else None
+
+    def execute(self, sql, params=()):
+        raw = self._conn._route(sql)
+        self._cursor = raw.execute(translate(sql), tuple(params or ()))
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+
+    def executemany(self, sql, seq_of_params):
+        raw = self._conn._route(sql)
+        self._cursor = raw.executemany(translate(sql), [tuple(params) for params in seq_of_params])
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = None
+        if _INSERT.match(sql) and self.rowcount > 0:
+            last = raw.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.lastrowid = last - self.rowcount + 1
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([col[0] for col in self._cursor.description], row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if not self._dictionary:
+            return rows
+        columns = [col[0] for col in self._cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+
+class Connection:
+    """One pooled connection: a private reader, plus the shared writer while it has one open transaction."""
+
+    def __init__(self, path):
+        self._reader = open_database(path, readonly=True)
+        self._shared = _writer(path)
+        self._closed = False
+
+    @property
+    def in_transaction(self):
+        return self._shared.owner is self
+
+    def _route(self, sql):
+        if self.in_transaction:
+            return self._shared.conn
+        if _READ.match(sql) and not _LOCKING.search(sql):
+            return self._reader
+        if not self._shared.lock.acquire(timeout=WRITER_TIMEOUT):
+            raise WriterTimeout(f"The database writer was not free after {WRITER_TIMEOUT:.1f}s")
+        try:
+            self._shared.conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._shared.lock.release()
+            raise
+        self._shared.owner = self
+        return self._shared.conn
+
+    def _end(self, statement):
+        if not self.in_transaction:
+            return
+        try:
+            self._shared.conn.execute(statement)
+        finally:
+            if self._shared.conn.in_transaction:
+                self._shared.conn.rollback()
+            self._shared.owner = None
+            self._shared.lock.release()
+
+    def cursor(self, dictionary=False):
+        return Cursor(self, dictionary)
+
+    def commit(self):
+        self._end("COMMIT")
+
+    def rollback(self):
+        self._end("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        self._reader.execute("SELECT 1").fetchone()
+
+    def is_connected(self):
+        return not self._closed
+
+    def close(self):
+        if self._closed:
+            return
+        self.rollback()
+        self._reader.close()
+        self._closed = True
+
+
+def connect(path):
+    return Connection(path)
@@ -1,14 +1,6 @@
 // api.js
-<<<<<<< HEAD
 const API_BASE = "";
 
-=======
-const API_BASE = window.location.hostname === 'localhost' 
-    ? "http://localhost:8000" 
-    : `http://${window.location.hostname}:8000`;
-
-console.log("🌐 Using API:", API_BASE);
->>>>>>> pim-ing
 class LostFoundAPI {
         static async request(endpoint, options = {}) {
         const url = `${API_BASE}${endpoint}`;
@@ -59,6 +51,10 @@ class LostFoundAPI {
         });
     }
 
+    static async logout() {
+        return this.request('/auth/logout', { method: 'POST' });
+    }
+
     static async register(userData) {
         return this.request('/auth/register', {
             method: 'POST',
@@ -72,6 +68,14 @@ class LostFoundAPI {
         return this.request(`/posts?${params}`);
     }
 
+    // What changed on the board since a sync token; without one, just a token for "now"
+    static async getChanges(since = null, limit = null) {
+        const params = new URLSearchParams();
+        if (since) params.set('since', since);
+        if (limit) params.set('limit', limit);
+        return this.request(`/posts/changes?${params}`);
+    }
+
     static async createPost(postData) {
         return this.request('/posts', {
             method: 'POST',
@@ -79,8 +83,21 @@ class LostFoundAPI {
         });
     }
 
-    static async getUserPosts(studentId) {
-        return this.request(`/posts/user/${studentId}`);
+    static async getUserPosts(studentId, params = {}) {
+        const query = new URLSearchParams(params);
+        return this.request(`/posts/user/${studentId}?${query}`);
+    }
+
+    // Follow next_cursor until every page of a user's posts is loaded
+    static async getAllUserPosts(studentId) {
+        let posts = [];
+        let cursor = null;
+        do {
+            const data = await this.getUserPosts(studentId, cursor ? { cursor, limit: 100 } : { limit: 100 });
+            posts = posts.concat(data.posts || []);
+            cursor = data.next_cursor;
+        } while (cursor);
+        return { posts };
     }
 
     static async getPostDetails(postId) {
@@ -83,6 +83,9 @@ class SessionManager {
     // Force logout with redirect
     static logout(redirectUrl = '/signin') {
         this.clearSession();
+
+        // End the server-side session too (the token travels in an HttpOnly cookie)
+        fetch('/auth/logout', { method: 'POST', keepalive: true }).catch(() => {});
         
         // Clear any cached data
         if ('caches' in window) {
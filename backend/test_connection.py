@@ -1,11 +1,6 @@
-import mysql.connector
+from database import DB_BACKEND, db_connection
 
-conn = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="1234",
-    database="lost_found_system",
-    auth_plugin='caching_sha2_password'
-)
-
-print("Connected!" if conn.is_connected() else "Failed!")
\ No newline at end of file
+# Uses the same settings as the app (DB_BACKEND, DB_PATH or the DB_* variables)
+with db_connection() as conn:
+    conn.ping(reconnect=False)
+    print(f"Connected! ({DB_BACKEND})" if conn.is_connected() else "Failed!")
@@ -0,0 +1,144 @@
+"""Batched writers for users, posts and the rows that hang off them.
+
+The write-side counterpart of loaders.py. Each writer takes every row of a
+batch and stores it with one multi-row INSERT per table. mysql-connector
+rewrites executemany() on a plain INSERT ... VALUES into a single statement,
+so a batch costs one round trip per table instead of one per row. The API
+routes call these with a batch of one; bulk.py calls them per chunk.
+
+Child rows need the ids of their parents. InnoDB treats a multi-row INSERT
+... VALUES as a "simple insert" and reserves all of its auto-increment values
+in one step, so they are consecutive even with concurrent writers: the ids
+are lastrowid (the first one), lastrowid + step, ... where step is
+auto_increment_increment. SQLite has one writer at a time, which gives the
+same guarantee (see sqlite_backend.py).
+"""
+
+import blobs
+import places
+
+# Rows per INSERT statement; keeps statements well below max_allowed_packet
+CHUNK_SIZE = 500
+
+DEFAULT_PROFILE_PHOTO = "/static/pic/profile.png"
+
+USER_COLUMNS = ("full_name", "faculty", "class_year", "phone", "email", "password", "profile_photo_url", "created_at")
+POST_COLUMNS = ("student_id", "item_name", "item_status", "place", "description", "created_at")
+
+# Columns that fall back to the table default when a row leaves them empty
+_DEFAULTS = {"created_at": "CURRENT_TIMESTAMP"}
+
+_increment = None
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    """Lists of up to size items from any iterable, reading it lazily."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _auto_increment_step(db):
+    global _increment
+    if _increment is None:
+        row = await db.fetch_one("SELECT @@auto_increment_increment AS step")
+        _increment = int(row['step'])
+    return _increment
+
+
+async def _insert(db, table, id_column, columns, rows):
+    """Insert dict rows into table; returns their ids in row order.
+
+    Rows that carry id_column keep it (imports that preserve ids); the rest
+    get auto-increment values. At most two statements, so pass one chunk at a time.
+    """
+    ids = [row.get(id_column) for row in rows]
+    for explicit in (True, False):
+        group = [i for i, row in enumerate(rows) if (row.get(id_column) is not None) == explicit]
+        if not group:
+            continue
+        names = ((id_column,) if explicit else ()) + columns
+        values = ", ".join(f"COALESCE(%s, {_DEFAULTS[name]})" if name in _DEFAULTS else "%s" for name in names)
+        result = await db.executemany(
+            f"INSERT INTO {table} ({', '.join(names)}) VALUES ({values})",
+            [tuple(rows[i].get(name) for name in names) for i in group]
+        )
+        if not explicit:
+            step = await _auto_increment_step(db)
+            for n, i in enumerate(group):
+                ids[i] = result.lastrowid + n * step
+    return ids
+
+
+async def _insert_many(db, sql, rows):
+    """executemany in statements of up to CHUNK_SIZE rows; returns the new ids in row order."""
+    ids = []
+    step = await _auto_increment_step(db)
+    for chunk in chunked(rows):
+        result = await db.executemany(sql, chunk)
+        ids.extend(result.lastrowid + n * step for n in range(len(chunk)))
+    return ids
+
+
+async def insert_social_profiles(db, profiles_by_user):
+    """profiles_by_user: [(student_id, [(platform, profile_url), ...]), ...]. Returns the number stored."""
+    links = [(student_id, platform, url) for student_id, profiles in profiles_by_user for platform, url in profiles]
+    if not links:
+        return 0
+    contact_ids = await _insert_many(db, '''
+        INSERT INTO social_profiles (platform, profile_url) VALUES (%s, %s)
+    ''', [(platform, url) for _, platform, url in links])
+    for chunk in chunked(list(zip(links, contact_ids))):
+        await db.executemany('''
+            INSERT INTO user_social_profiles (student_id, contact_id) VALUES (%s, %s)
+        ''', [(student_id, contact_id) for (student_id, _, _), contact_id in chunk])
+    return len(links)
+
+
+async def insert_post_images(db, images_by_post):
+    """images_by_post: [(post_id, [image_url, ...]), ...] in display order. Returns the number stored.
+
+    Also counts the new references in the blob store.
+    """
+    rows = [(post_id, url, order) for post_id, urls in images_by_post for order, url in enumerate(urls)]
+    if not rows:
+        return 0
+    for chunk in chunked(rows):
+        await db.executemany('''
+            INSERT INTO post_images (post_id, image_url, image_order) VALUES (%s, %s, %s)
+        ''', chunk)
+    await blobs.retain(db, [url for _, url, _ in rows])
+    return len(rows)
+
+
+async def insert_users(db, users):
+    """Insert user dicts (USER_COLUMNS, an optional student_id and social_profiles); returns their ids.
+
+    `password` must already be hashed (see passwords.py).
+    """
+    rows = [dict(user, profile_photo_url=user.get('profile_photo_url') or DEFAULT_PROFILE_PHOTO) for user in users]
+    student_ids = await _insert(db, "users", "student_id", USER_COLUMNS, rows)
+    await insert_social_profiles(db, [
+        (student_id, [(p['platform'], p['profile_url']) for p in user.get('social_profiles') or []])
+        for student_id, user in zip(student_ids, users)
+    ])
+    await blobs.retain(db, [row['profile_photo_url'] for row in rows])
+    return student_ids
+
+
+async def insert_posts(db, posts):
+    """Insert post dicts (POST_COLUMNS, an optional post_id and images); returns their ids.
+
+    place_id is resolved from place through the place catalog (see places.py).
+    """
+    place_ids = await places.resolve(db, [post.get('place') for post in posts])
+    rows = [dict(post, item_status=post.get('item_status') or "lost", place_id=place_ids[post.get('place')])
+            for post in posts]
+    post_ids = await _insert(db, "posts", "post_id", POST_COLUMNS + ("place_id",), rows)
+    await insert_post_images(db, [(post_id, post.get('images') or []) for post_id, post in zip(post_ids, posts)])
+    return post_ids